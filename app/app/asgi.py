@@ -0,0 +1,19 @@
+"""
+ASGI config for app project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Read endpoints and media are served by async views (see ``app.asgi_urls``),
+so one worker process can multiplex many slow clients.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'app.asgi_urls')
+
+application = get_asgi_application()
@@ -0,0 +1,31 @@
+"""app URL Configuration when served over ASGI
+
+Routes the read paths to async views and falls back to ``app.urls`` for
+everything else. The async views keep the URL names of the sync ones.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from django.urls import include, path, re_path
+
+from core import views as core_views
+from app import urls
+
+# Namespaces replaced by their async URLconfs below.
+ASYNC_NAMESPACES = ('user', 'category')
+
+
+urlpatterns = [
+    path('api/user/', include('user.async_urls')),
+    path('api/category/', include('category.async_urls')),
+    re_path(
+        r'^%s(?!resize/)(?P<path>.*)$' %
+        re.escape(settings.MEDIA_URL.lstrip('/')),
+        core_views.serve_media,
+        name='media'
+    ),
+] + staticfiles_urlpatterns() + [
+    pattern for pattern in urls.urlpatterns
+    if getattr(pattern, 'namespace', None) not in ASYNC_NAMESPACES
+]
@@ -45,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +57,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'app.urls')
 
 TEMPLATES = [
     {
@@ -73,6 +76,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'app.wsgi.application'
+ASGI_APPLICATION = 'app.asgi.application'
 
 
 # Database
@@ -88,6 +92,96 @@ DATABASES = {
     }
 }
 
+# Catalog shards besides the default database, as comma separated
+# alias=HOST entries for PostgreSQL servers sharing the default
+# credentials, or alias=/path/name.sqlite3 for SQLite files. Only append
+# shards: a shard's position picks the id range of its rows.
+for shard in filter(None, os.environ.get('DB_SHARDS', '').split(',')):
+    alias, location = shard.split('=', 1)
+    if location.endswith('.sqlite3'):
+        DATABASES[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': location,
+        }
+    else:
+        DATABASES[alias] = dict(DATABASES['default'], HOST=location)
+
+SHARDS = list(DATABASES)
+DATABASE_ROUTERS = ['core.sharding.ShardRouter']
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'throttle': {
+        'BACKEND': os.environ.get(
+            'THROTTLE_CACHE_BACKEND', 'core.cache.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION', 'throttle'),
+    },
+}
+
+
+# Request throttling
+# Token buckets in THROTTLE_CACHE, which has to be shared by the worker
+# processes (memcached in docker-compose) for the limits to hold across
+# them. Views opt into per route limits with a throttle_scope.
+# Clients are told apart by REMOTE_ADDR, or with NUM_PROXIES reverse proxies
+# in front, by the address the outermost of them added to X-Forwarded-For.
+
+THROTTLE_CACHE = 'throttle'
+
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserThrottle',
+        'core.throttling.TokenThrottle',
+        'core.throttling.RouteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '300/min'),
+        'user': os.environ.get('THROTTLE_USER_RATE', '1200/min'),
+        'token': os.environ.get('THROTTLE_TOKEN_RATE', '1200/min'),
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '30/min'),
+        'register': os.environ.get('THROTTLE_REGISTER_RATE', '30/hour'),
+        'catalog': os.environ.get('THROTTLE_CATALOG_RATE', '600/min'),
+    },
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+# New passwords use PASSWORD_HASHER; the other hashers only verify older
+# hashes, which are upgraded on the next successful login.
+
+password_hashers = {
+    'pbkdf2_sha256': 'core.hashers.PBKDF2PasswordHasher',
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt_sha256': 'core.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    password_hashers.pop(os.environ.get('PASSWORD_HASHER', 'pbkdf2_sha256')),
+    *password_hashers.values(),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_HASHING = {
+    name: int(os.environ[name]) for name in (
+        'PBKDF2_ITERATIONS',
+        'ARGON2_TIME_COST',
+        'ARGON2_MEMORY_COST',
+        'ARGON2_PARALLELISM',
+        'BCRYPT_ROUNDS',
+    ) if name in os.environ
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -131,4 +225,85 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+# Partially received chunked uploads, moved into MEDIA_ROOT once complete.
+# Keep it on the same filesystem so completing an upload is a rename.
+CHUNKED_UPLOAD_ROOT = '/vol/web/chunks'
+CHUNKED_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+
+# Resized variants of media images, evicted least recently used first.
+THUMBNAILS = {
+    'ROOT': '/vol/web/thumbnails',
+    'MAX_BYTES': int(os.environ.get(
+        'THUMBNAIL_CACHE_MAX_BYTES', 1024 * 1024 * 1024
+    )),
+}
+
+# Requests sent together to api/batch/, safe ones optionally on threads.
+BATCH = {
+    'MAX_REQUESTS': 20,
+    'MAX_WORKERS': 4,
+}
+
+# Catalog changes posted to WebhookEndpoints by the deliver_webhooks worker.
+WEBHOOKS = {
+    'BATCH_SIZE': 500,
+    'TIMEOUT': 10,
+}
+
+AUTH_USER_MODEL = 'core.User'
+
+
+# Request instrumentation
+# Per-request query, DB, serializer and render costs are logged as JSON by
+# core.middleware.InstrumentationMiddleware and sent as Server-Timing.
+
+INSTRUMENTATION = {
+    'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 500)),
+    'SLOW_QUERY_MS': int(os.environ.get('SLOW_QUERY_MS', 100)),
+    'DUPLICATE_QUERY_THRESHOLD': 5,
+    'MAX_CAPTURED_QUERIES': 200,
+    # Requests over their route's query budget are logged, or fail in
+    # "strict" mode (used by CI). Timeouts are PostgreSQL statement_timeout
+    # values applied for the duration of the request. Sub-requests of
+    # api/batch/ get the limits of their own route.
+    'QUERY_BUDGETS': {
+        'category:category-list': 50,
+        'category:category-detail': 20,
+    },
+    'DEFAULT_QUERY_BUDGET': int(os.environ.get('QUERY_BUDGET', 100)),
+    'STATEMENT_TIMEOUTS_MS': {
+        'category:category-list': 3000,
+        'category:category-detail': 3000,
+    },
+    'DEFAULT_STATEMENT_TIMEOUT_MS': int(
+        os.environ.get('STATEMENT_TIMEOUT_MS', 10000)
+    ),
+    'QUERY_BUDGET_MODE': os.environ.get('QUERY_BUDGET_MODE', 'log'),
+}
+
+# Requests of staff users sending the X-Profile header ("cprofile" or
+# "sample", optionally with ", memory") are profiled with their SQL, which
+# needs the InstrumentationMiddleware. The zip lands in ROOT, downloadable
+# from api/profiles/<id>/.
+PROFILING = {
+    'HEADER': 'X-Profile',
+    'ROOT': '/vol/web/profiles',
+    'MAX_AGE': 7 * 24 * 60 * 60,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -18,8 +18,22 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core import views as core_views
+
 urlpatterns = [
+    path('metrics', core_views.metrics, name='metrics'),
+    path(
+        settings.MEDIA_URL.lstrip('/') +
+        'resize/<int:width>x<int:height>/<path:path>',
+        core_views.resize_image,
+        name='resize-image'
+    ),
     path('admin/', admin.site.urls),
+    path('api/batch/', core_views.BatchView.as_view(), name='batch'),
+    path(
+        'api/profiles/<uuid:profile_id>/', core_views.ProfileView.as_view(),
+        name='profile'
+    ),
     path('api/user/', include('user.urls')),
     path('api/category/', include('category.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from category import async_views, urls
+
+
+# Same namespace and names as category.urls, so route budgets, metrics and
+# throttles keyed by route apply to both servers.
+app_name = 'category'
+
+urlpatterns = [
+    path('categories/', async_views.category_list, name='category-list'),
+    path('categories/<int:pk>/', async_views.category_detail,
+         name='category-detail'),
+    path('products/', async_views.product_list, name='product-list'),
+] + urls.urlpatterns
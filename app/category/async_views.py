@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from rest_framework import exceptions
+
+from core import profiling, sharding
+from core.aio import authenticate, database_sync_to_async, error_response, \
+    throttle
+from core.models import Category, Product
+from category import serializers, views
+
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def read_only(fallback):
+    """Serve safe methods asynchronously and the rest with a sync view"""
+    view_class = fallback.cls
+    sync_view = fallback
+    fallback = sync_to_async(profiling.profiled(fallback))
+
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await fallback(request, *args, **kwargs)
+            try:
+                request.user, request.auth = await authenticate(request)
+                await throttle(request, view_class)
+                with sharding.use_shard(request.user.shard):
+                    return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        wrapper.csrf_exempt = True
+        # Batches call views synchronously, see core.batch.dispatch().
+        wrapper.sync_view = sync_view
+        return wrapper
+
+    return decorator
+
+
+@database_sync_to_async
+def list_categories(request):
+    queryset = views.filter_categories(
+        Category.objects.filter(user=request.user), request.GET
+    ).prefetch_related('products')
+    return serializers.CategorySerializer(
+        queryset, many=True, context={'request': request}
+    ).data
+
+
+@database_sync_to_async
+def retrieve_category(request, pk):
+    category = Category.objects.filter(user=request.user, pk=pk).first()
+    if category is None:
+        raise exceptions.NotFound()
+    return serializers.CategoryDetailSerializer(
+        category, context={'request': request}
+    ).data
+
+
+@database_sync_to_async
+def list_products(request):
+    queryset = views.filter_products(
+        Product.objects.filter(user=request.user), request.GET
+    ).order_by('-name')
+    return serializers.ProductSerializer(
+        queryset, many=True, context={'request': request}
+    ).data
+
+
+@read_only(views.CategoryViewSet.as_view({
+    'get': 'list', 'post': 'create'
+}))
+async def category_list(request):
+    """Return the categories of the authenticated user"""
+    return JsonResponse(await list_categories(request), safe=False)
+
+
+@read_only(views.CategoryViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+async def category_detail(request, pk):
+    """Return a category with its ordered products"""
+    return JsonResponse(await retrieve_category(request, pk))
+
+
+@read_only(views.ProductViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def product_list(request):
+    """Return the products of the authenticated user"""
+    return JsonResponse(await list_products(request), safe=False)
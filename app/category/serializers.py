@@ -1,16 +1,48 @@
-from rest_framework import serializers
+from django.utils.translation import gettext_lazy as _
 
-from core.models import Product, Category
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from core.images import METADATA_FIELDS
+from core.instrumentation import TimedRepresentationMixin
+from core.models import ChunkedUpload, Product, Category
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedRepresentationMixin,
+                        serializers.ModelSerializer):
     """Serializer for product objects"""
 
+    MAX_ATTRIBUTES = 50
+    MAX_ATTRIBUTE_NAME_LENGTH = 64
+
     class Meta:
         model = Product
-        fields = ('id', 'name', 'description')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'description', 'image', 'attributes') + \
+            METADATA_FIELDS
+        read_only_fields = ('id', 'image') + METADATA_FIELDS
+
+    def validate_attributes(self, value):
+        """Accept a flat object of string, number and boolean values"""
+        if not isinstance(value, dict):
+            raise serializers.ValidationError(_('Expected an object.'))
+        if len(value) > self.MAX_ATTRIBUTES:
+            raise serializers.ValidationError(
+                _('At most %d attributes are allowed.') % self.MAX_ATTRIBUTES
+            )
+        for name, item in value.items():
+            if not name or len(name) > self.MAX_ATTRIBUTE_NAME_LENGTH:
+                raise serializers.ValidationError(
+                    _('Attribute names must have 1 to %d characters.') %
+                    self.MAX_ATTRIBUTE_NAME_LENGTH
+                )
+            if item is None or isinstance(item, (dict, list)):
+                raise serializers.ValidationError(
+                    _('Attribute "%s" must be a string, number or boolean.')
+                    % name
+                )
+        return value
 
 
 # class CategorySerializer(serializers.ModelSerializer):
@@ -26,12 +58,101 @@ class ProductSerializer(serializers.ModelSerializer):
 #             'id', 'name', 'persian_title', 'parent_category'
 #         )
 #         read_only_fields = ('id',)
-class CategorySerializer(serializers.ModelSerializer):
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Resolve all submitted primary keys with a single query"""
+    default_error_messages = {
+        'does_not_exist': _('Invalid pks {pk_values} - '
+                            'objects do not exist.'),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, ValidationError):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__
+                )
+
+        objects = queryset.in_bulk(pks)
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', pk_values=', '.join(
+                f'"{pk}"' for pk in missing
+            ))
+        return [objects[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field limited to objects of the requesting user
+
+    With many=True all keys are looked up together by a
+    BatchedManyRelatedField.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None:
+            queryset = queryset.filter(user=request.user)
+        return queryset
+
+
+class ParentCategoryMixin:
+    """Validate parent categories and keep the user's tree acyclic
+
+    The cycle check only holds under the per-owner lock taken by
+    Category.objects.move(), so parent changes are saved through it.
+    """
+
+    def validate_parent_category(self, value):
+        """Validate parent is owned by the user"""
+        if value is None:
+            return value
+        request = self.context.get('request')
+        if request is not None and value.user_id != request.user.id:
+            raise serializers.ValidationError(
+                _('Invalid pk "%s" - object does not exist.') % value.pk,
+                code='does_not_exist'
+            )
+        return value
+
+    def move(self, instance, parent):
+        """Relocate the category using the locked, cycle-safe move"""
+        try:
+            return Category.objects.move(instance, parent)
+        except ValueError as exc:
+            raise serializers.ValidationError(
+                {'parent_category': [str(exc)]}, code='cycle'
+            )
+
+
+class CategorySerializer(TimedRepresentationMixin, ParentCategoryMixin,
+                         serializers.ModelSerializer):
     """Serialize a category"""
-    products = serializers.PrimaryKeyRelatedField(
+    products = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Product.objects.all()
     )
+
     class Meta:
         model = Category
         fields = (
@@ -39,15 +160,131 @@ class CategorySerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id',)
 
+    def create(self, validated_data):
+        """Create a category linking products in the submitted order"""
+        products = validated_data.pop('products', None)
+        category = super().create(validated_data)
+        if products is not None:
+            category.set_products(products)
+        return category
+
+    def update(self, instance, validated_data):
+        """Update a category, appending newly linked products in order"""
+        products = validated_data.pop('products', None)
+        if 'parent_category' in validated_data:
+            parent = validated_data.pop('parent_category')
+            if getattr(parent, 'pk', None) != instance.parent_category_id:
+                self.move(instance, parent)
+        category = super().update(instance, validated_data)
+        if products is not None:
+            category.set_products(products)
+        return category
+
+
 class CategoryDetailSerializer(CategorySerializer):
     """Serialize a category detail"""
-    products = ProductSerializer(many=True, read_only=True)
+    products = ProductSerializer(
+        many=True, read_only=True, source='ordered_products'
+    )
 
 
-# class ProductImageSerializer(serializers.ModelSerializer):
-#     """Serializer for uploading images to products"""
+class ProductReorderSerializer(serializers.Serializer):
+    """Serialize moving a product to a new position in a category"""
+    product = serializers.IntegerField()
+    after = serializers.IntegerField(required=False, allow_null=True)
 
-#     class Meta:
-#         model = Product
-#         fields = ('id', 'image')
-#         read_only_fields = ('id',)
\ No newline at end of file
+    def validate(self, attrs):
+        """Validate that the products are linked to the category"""
+        category = self.context['category']
+        ids = {attrs['product'], attrs.get('after')} - {None}
+        linked = set(
+            category.products.filter(id__in=ids).values_list('id', flat=True)
+        )
+        missing = sorted(ids - linked)
+        if missing:
+            raise serializers.ValidationError(
+                _('Products %s are not in this category') %
+                ', '.join(str(pk) for pk in missing),
+                code='does_not_exist'
+            )
+        if attrs['product'] == attrs.get('after'):
+            raise serializers.ValidationError(
+                _('A product cannot be placed after itself'),
+                code='invalid'
+            )
+        return attrs
+
+
+class CategoryMoveSerializer(ParentCategoryMixin,
+                             serializers.ModelSerializer):
+    """Serialize moving a category subtree under a new parent"""
+
+    class Meta:
+        model = Category
+        fields = ('id', 'parent_category')
+        read_only_fields = ('id',)
+        extra_kwargs = {
+            'parent_category': {'required': True, 'allow_null': True}
+        }
+
+    def update(self, instance, validated_data):
+        return self.move(instance, validated_data['parent_category'])
+
+
+class ProductImageSerializer(serializers.ModelSerializer):
+    """Serializer for uploading images to products"""
+
+    class Meta:
+        model = Product
+        fields = ('id', 'image') + METADATA_FIELDS
+        read_only_fields = ('id',) + METADATA_FIELDS
+
+    def update(self, instance, validated_data):
+        """Store the image along with its metadata"""
+        image = validated_data.get('image')
+        if image:
+            instance.set_image_metadata(image)
+        return super().update(instance, validated_data)
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    """Serialize a resumable product image upload"""
+    product = UserPrimaryKeyRelatedField(queryset=Product.objects.all())
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    image = serializers.ImageField(source='product.image', read_only=True)
+
+    class Meta:
+        model = ChunkedUpload
+        fields = (
+            'id', 'product', 'filename', 'size', 'checksum', 'offset',
+            'completed_at', 'image'
+        )
+        read_only_fields = ('id', 'offset', 'completed_at')
+
+    def validate_size(self, value):
+        """Validate the upload is not empty nor larger than allowed"""
+        if not 0 < value <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(_(
+                'Size must be between 1 and %d bytes.'
+            ) % settings.CHUNKED_UPLOAD_MAX_SIZE)
+        return value
+
+
+class CategoryQuerySerializer(serializers.Serializer):
+    """Serialize the filters and ordering of a category list request"""
+    ORDERINGS = {
+        'name': 'name',
+        '-name': '-name',
+        'persian_title': 'persian_title_normalized',
+        '-persian_title': '-persian_title_normalized',
+    }
+
+    persian_title = serializers.CharField(required=False)
+    persian_title_prefix = serializers.CharField(required=False)
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), required=False)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Serialize the cursor and page size of a sync request"""
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=500)
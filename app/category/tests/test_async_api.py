@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.models import Category, Product
+from core.tests.base import CatalogTransactionTestCase
+
+from category.serializers import CategorySerializer, \
+                                 CategoryDetailSerializer, ProductSerializer
+
+
+@sync_to_async
+def serialize(serializer_class, instance, **kwargs):
+    """Return serializer data as it comes back from a JSON response"""
+    return json.loads(json.dumps(serializer_class(instance, **kwargs).data))
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls')
+class AsyncReadApiTests(CatalogTransactionTestCase):
+    """Test the async read views served over ASGI"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        token = Token.objects.create(user=self.user)
+        # AsyncClient takes request headers by their raw ASGI names.
+        self.auth = {'authorization': f'Token {token.key}'}
+        self.client = AsyncClient()
+        self.category = Category.objects.create(
+            user=self.user, name='Spices', persian_title='p'
+        )
+        self.products = [
+            Product.objects.create(user=self.user, name=name)
+            for name in ('Cinnamon', 'Salt')
+        ]
+        self.category.set_products(reversed(self.products))
+
+    async def test_login_required(self):
+        """Test unauthenticated reads are rejected like the sync API"""
+        res = await AsyncClient().get(reverse('category:category-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    async def test_list_categories(self):
+        """Test listing categories asynchronously"""
+        res = await self.client.get(
+            reverse('category:category-list'), **self.auth
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), await serialize(
+            CategorySerializer, [self.category], many=True
+        ))
+        # Queries run on worker threads still count towards the request.
+        self.assertRegex(res['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    async def test_filter_categories(self):
+        """Test the persian title filters apply to async reads"""
+        res = await self.client.get(
+            reverse('category:category-list') + '?persian_title=q',
+            **self.auth
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), [])
+
+    async def test_retrieve_category(self):
+        """Test the category detail keeps the product order"""
+        res = await self.client.get(
+            reverse('category:category-detail', args=[self.category.id]),
+            **self.auth
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), await serialize(
+            CategoryDetailSerializer, self.category
+        ))
+        self.assertEqual(
+            [product['id'] for product in res.json()['products']],
+            [product.id for product in reversed(self.products)]
+        )
+
+    async def test_retrieve_other_users_category(self):
+        """Test categories of other users are not found"""
+        other = get_user_model()(email='other@yahoo.com')
+        category = Category(user=other, name='Other', persian_title='p')
+        await sync_to_async(other.save)()
+        await sync_to_async(category.save)()
+
+        res = await self.client.get(
+            reverse('category:category-detail', args=[category.id]),
+            **self.auth
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_list_products(self):
+        """Test listing products asynchronously"""
+        res = await self.client.get(reverse('category:product-list'),
+                                    **self.auth)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), await serialize(
+            ProductSerializer, self.products[::-1], many=True
+        ))
+
+    @override_settings(INSTRUMENTATION={
+        'QUERY_BUDGETS': {'category:category-list': 1},
+    })
+    async def test_route_budget_applies(self):
+        """Test async views get the query budget of their sync route"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            await self.client.get(
+                reverse('category:category-list'), **self.auth
+            )
+
+        records = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        exceeded, = [r for r in records
+                     if r['event'] == 'query_budget_exceeded']
+        self.assertEqual(exceeded['route'], 'category:category-list')
+        self.assertEqual(exceeded['budget'], 1)
+
+    async def test_writes_use_sync_views(self):
+        """Test writes to an async path are handled by the DRF viewset"""
+        res = await self.client.post(
+            reverse('category:category-list'),
+            {'name': 'Herbs', 'persian_title': 'p', 'products': []},
+            content_type='application/json',
+            **self.auth
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json()['name'], 'Herbs')
+
+    async def test_serve_media(self):
+        """Test media files are served with conditional GET support"""
+        with tempfile.TemporaryDirectory() as root, \
+                self.settings(MEDIA_ROOT=root):
+            os.makedirs(os.path.join(root, 'uploads'))
+            with open(os.path.join(root, 'uploads', 'a.txt'), 'w') as f:
+                f.write('hello')
+            url = reverse('media', args=['uploads/a.txt'])
+
+            res = await self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(b''.join(res.streaming_content), b'hello')
+            res.close()
+
+            res = await self.client.get(
+                url, **{'if-modified-since': res['Last-Modified']}
+            )
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            res = await self.client.get(reverse('media', args=['missing']))
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
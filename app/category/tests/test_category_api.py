@@ -1,16 +1,19 @@
 import tempfile
+from unittest.mock import patch
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Category, Product
+from core.models import Category, CategoryProduct, ChangeLog, Product
+from core.tests.base import CatalogTestCase
 
 from category.serializers import CategorySerializer, CategoryDetailSerializer
 
@@ -28,6 +31,21 @@ def detail_url(category_id):
     return reverse('category:category-detail', args=[category_id])
 
 
+def reorder_url(category_id):
+    """Return category product reorder URL"""
+    return reverse('category:category-reorder-products', args=[category_id])
+
+
+def facets_url(category_id):
+    """Return category attribute facets URL"""
+    return reverse('category:category-facets', args=[category_id])
+
+
+def move_url(category_id):
+    """Return category move URL"""
+    return reverse('category:category-move', args=[category_id])
+
+
 
 
 def sample_product(user, name='Cinnamon'):
@@ -47,7 +65,7 @@ def sample_category(user, **params):
     return Category.objects.create(user=user, **defaults)
 
 
-class PublicCategoryApiTests(TestCase):
+class PublicCategoryApiTests(CatalogTestCase):
     """Test unauthenticated category API access"""
 
     def setUp(self):
@@ -60,7 +78,7 @@ class PublicCategoryApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateCategoryApiTests(TestCase):
+class PrivateCategoryApiTests(CatalogTestCase):
     """Test unauthenticated category API access"""
 
     def setUp(self):
@@ -164,6 +182,46 @@ class PrivateCategoryApiTests(TestCase):
         self.assertIn(product1, products)
         self.assertIn(product2, products)
 
+    def test_create_category_products_query_count(self):
+        """Test submitted products are resolved with a constant query count"""
+        def create(count):
+            products = [
+                sample_product(user=self.user, name=f'Product {i}')
+                for i in range(count)
+            ]
+            payload = {
+                'name': 'Spices',
+                'persian_title': 'persian',
+                'products': [product.id for product in products]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(CATEGORIES_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(create(2), create(20))
+
+    def test_create_category_with_invalid_products(self):
+        """Test missing and other users' products are all reported"""
+        other = get_user_model().objects.create_user(
+            'other@yahoo.com', 'testpass'
+        )
+        foreign = sample_product(user=other)
+        own = sample_product(user=self.user)
+        payload = {
+            'name': 'Spices',
+            'persian_title': 'persian',
+            'products': [own.id, foreign.id, 999999]
+        }
+        res = self.client.post(CATEGORIES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        error, = res.data['products']
+        self.assertIn(f'"{foreign.id}"', error)
+        self.assertIn('"999999"', error)
+        self.assertNotIn(f'"{own.id}"', error)
+        self.assertFalse(Category.objects.filter(name='Spices').exists())
+
     def test_partial_update_category(self):
         """Test updating a category with patch"""
         category = sample_category(user=self.user)
@@ -197,6 +255,286 @@ class PrivateCategoryApiTests(TestCase):
         products = category.products.all()
         self.assertEqual(len(products), 0)
 
+    def test_move_category_subtree(self):
+        """Test moving a category carries its subtree along"""
+        root = sample_category(user=self.user, name='Root')
+        other = sample_category(user=self.user, name='Other')
+        child = sample_category(user=self.user, parent_category=root)
+        grandchild = sample_category(user=self.user, parent_category=child)
+
+        res = self.client.post(
+            move_url(child.id), {'parent_category': other.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        child.refresh_from_db()
+        grandchild.refresh_from_db()
+        self.assertEqual(child.parent_category, other)
+        self.assertEqual(grandchild.parent_category, child)
+
+    def test_move_category_to_root(self):
+        """Test moving a category to the top level"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user, parent_category=root)
+
+        res = self.client.post(
+            move_url(child.id), {'parent_category': None}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        child.refresh_from_db()
+        self.assertIsNone(child.parent_category)
+
+    def test_move_category_into_descendant_rejected(self):
+        """Test moving a category under its own descendant fails"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user, parent_category=root)
+        grandchild = sample_category(user=self.user, parent_category=child)
+
+        res = self.client.post(
+            move_url(root.id), {'parent_category': grandchild.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        root.refresh_from_db()
+        self.assertIsNone(root.parent_category)
+
+    def test_move_category_under_other_users_category_rejected(self):
+        """Test a category cannot be moved under another user's category"""
+        user2 = get_user_model().objects.create_user(
+            'other@londonappdev.com',
+            'password123'
+        )
+        foreign = sample_category(user=user2)
+        category = sample_category(user=self.user)
+
+        res = self.client.post(
+            move_url(category.id), {'parent_category': foreign.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_category_keeps_product_order(self):
+        """Test products are listed in the order they were submitted"""
+        products = [
+            sample_product(user=self.user, name=name)
+            for name in ('Prawns', 'Ginger', 'Lime')
+        ]
+        payload = {
+            'name': 'Thai prawn red curry',
+            'persian_title': 'persian',
+            'products': [products[2].id, products[0].id, products[1].id]
+        }
+        res = self.client.post(CATEGORIES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.get(detail_url(res.data['id']))
+        self.assertEqual(
+            [product['id'] for product in res.data['products']],
+            payload['products']
+        )
+
+    def test_reorder_category_products(self):
+        """Test moving a product only rewrites that product's position"""
+        category = sample_category(user=self.user)
+        products = [
+            sample_product(user=self.user, name=str(i)) for i in range(4)
+        ]
+        category.set_products(products)
+        positions = dict(
+            CategoryProduct.objects.values_list('product_id', 'position')
+        )
+
+        res = self.client.post(
+            reorder_url(category.id),
+            {'product': products[3].id, 'after': products[0].id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = [products[i].id for i in (0, 3, 1, 2)]
+        self.assertEqual(
+            [product['id'] for product in res.data['products']], expected
+        )
+        changed = [
+            product_id for product_id, position in
+            CategoryProduct.objects.values_list('product_id', 'position')
+            if positions[product_id] != position
+        ]
+        self.assertEqual(changed, [products[3].id])
+
+    def test_reorder_category_product_to_top(self):
+        """Test moving a product to the top of the category"""
+        category = sample_category(user=self.user)
+        products = [
+            sample_product(user=self.user, name=str(i)) for i in range(3)
+        ]
+        category.set_products(products)
+
+        res = self.client.post(
+            reorder_url(category.id), {'product': products[2].id},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(category.ordered_products()),
+            [products[2], products[0], products[1]]
+        )
+
+    @patch('core.ranking.MAX_LENGTH', 20)
+    def test_reorder_respaces_long_positions(self):
+        """Test positions are respaced before outgrowing the column"""
+        category = sample_category(user=self.user)
+        products = [
+            sample_product(user=self.user, name=str(i)) for i in range(4)
+        ]
+        category.set_products(products)
+
+        # Moving to the same spot over and over lengthens the new ranks.
+        for i in range(60):
+            moved = products[1 + i % 3]
+            res = self.client.post(
+                reorder_url(category.id),
+                {'product': moved.id, 'after': products[0].id}
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['products'][1]['id'], moved.id)
+
+        positions = CategoryProduct.objects.values_list('position', flat=True)
+        self.assertLessEqual(max(map(len, positions)), 20)
+        self.assertEqual(
+            list(category.ordered_products()),
+            [products[0], products[3], products[2], products[1]]
+        )
+
+    @patch('core.ranking.MAX_LENGTH', 0)
+    def test_reorder_respace_logged(self):
+        """Test a reorder that respaces the category reaches the change log"""
+        category = sample_category(user=self.user)
+        products = [
+            sample_product(user=self.user, name=str(i)) for i in range(3)
+        ]
+        category.set_products(products)
+        ChangeLog.objects.all().delete()
+
+        res = self.client.post(
+            reorder_url(category.id), {'product': products[2].id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        changes = ChangeLog.objects.values_list('model', 'object_id', 'action')
+        self.assertEqual(list(changes), [
+            (ChangeLog.CATEGORY, category.id, ChangeLog.UPDATE)
+        ])
+
+    def test_reorder_unlinked_product_rejected(self):
+        """Test reordering a product outside the category fails"""
+        category = sample_category(user=self.user)
+        category.products.add(sample_product(user=self.user))
+        other = sample_product(user=self.user, name='Other')
+
+        res = self.client.post(reorder_url(category.id), {'product': other.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_category_subtree(self):
+        """Test deleting a category removes its whole subtree"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user, parent_category=root)
+        sample_category(user=self.user, parent_category=child)
+        other = sample_category(user=self.user)
+
+        res = self.client.delete(detail_url(root.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Category.objects.all()), [other])
+
+    def test_partial_update_parent_cycle_rejected(self):
+        """Test patching parent_category cannot create a cycle"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user, parent_category=root)
+
+        res = self.client.patch(
+            detail_url(root.id), {'parent_category': child.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_partial_update_parent_uses_locked_move(self):
+        """Test patching parent_category moves through the locked path"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user)
+
+        with patch.object(Category.objects, 'move',
+                          wraps=Category.objects.move) as move:
+            res = self.client.patch(
+                detail_url(child.id), {'parent_category': root.id}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        move.assert_called_once()
+        child.refresh_from_db()
+        self.assertEqual(child.parent_category, root)
+
+    def test_category_facets(self):
+        """Test attribute value counts cover the category products only"""
+        category = sample_category(user=self.user)
+        attributes = (
+            {'color': 'red', 'size': 42},
+            {'color': 'red', 'size': 40},
+            {'color': 'blue', 'size': 42},
+        )
+        category.set_products([
+            Product.objects.create(
+                user=self.user, name='Shoe', attributes=attributes
+            )
+            for attributes in attributes
+        ])
+        Product.objects.create(
+            user=self.user, name='Hat', attributes={'color': 'green'}
+        )
+
+        res = self.client.get(facets_url(category.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'color': {'red': 2, 'blue': 1},
+            'size': {'42': 2, '40': 1},
+        })
+
+        res = self.client.get(facets_url(category.id), {'attr.color': 'red'})
+        self.assertEqual(res.data, {
+            'color': {'red': 2},
+            'size': {'40': 1, '42': 1},
+        })
+
+    def test_filter_categories_by_persian_title(self):
+        """Test persian title filters match Arabic and Persian variants"""
+        books = sample_category(user=self.user, persian_title='كتاب‌ها')
+        sample_category(user=self.user, persian_title='دفتر')
+
+        res = self.client.get(CATEGORIES_URL, {'persian_title': 'کتابها'})
+        self.assertEqual([row['id'] for row in res.data], [books.id])
+
+        res = self.client.get(
+            CATEGORIES_URL, {'persian_title_prefix': 'كتا'}
+        )
+        self.assertEqual([row['id'] for row in res.data], [books.id])
+
+    def test_order_categories_by_persian_title(self):
+        """Test sorting by persian title ignores variants and diacritics"""
+        second = sample_category(user=self.user, persian_title='بَ')
+        third = sample_category(user=self.user, persian_title='پ')
+        first = sample_category(user=self.user, persian_title='ا')
+
+        res = self.client.get(CATEGORIES_URL, {'ordering': '-persian_title'})
+
+        self.assertEqual(
+            [row['id'] for row in res.data], [third.id, second.id, first.id]
+        )
+
+        res = self.client.get(CATEGORIES_URL, {'ordering': 'title'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 # class CategoryImageUploadTests(TestCase):
 
@@ -5,12 +5,12 @@ from PIL import Image
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Product, Category
+from core.tests.base import CatalogTestCase
 
 from category.serializers import ProductSerializer
 
@@ -42,7 +42,7 @@ def sample_category(user, **params):
 
     return Category.objects.create(user=user, **defaults)
 
-class PublicProductsApiTests(TestCase):
+class PublicProductsApiTests(CatalogTestCase):
     """Test the publicly available products API"""
 
     def setUp(self):
@@ -55,7 +55,7 @@ class PublicProductsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateProductsApiTests(TestCase):
+class PrivateProductsApiTests(CatalogTestCase):
     """Test the private products API"""
 
     def setUp(self):
@@ -112,6 +112,68 @@ class PrivateProductsApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_product_with_attributes(self):
+        """Test products store free form attributes"""
+        payload = {
+            'name': 'Shoe', 'description': 'Running shoe',
+            'attributes': {'brand': 'Acme', 'size': 42, 'waterproof': True}
+        }
+
+        res = self.client.post(PRODUCTS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(pk=res.data['id'])
+        self.assertEqual(product.attributes, payload['attributes'])
+
+    def test_create_product_nested_attributes_invalid(self):
+        """Test attribute values must be scalars"""
+        payload = {
+            'name': 'Shoe', 'description': 'Running shoe',
+            'attributes': {'size': {'eu': 42}}
+        }
+
+        res = self.client.post(PRODUCTS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_products_by_attributes(self):
+        """Test attr.<name> filters match all names and any value"""
+        red = Product.objects.create(
+            user=self.user, name='Red', attributes={'color': 'red', 'size': 42}
+        )
+        Product.objects.create(
+            user=self.user, name='Small',
+            attributes={'color': 'red', 'size': 40}
+        )
+        blue = Product.objects.create(
+            user=self.user, name='Blue',
+            attributes={'color': 'blue', 'size': '42'}
+        )
+
+        res = self.client.get(PRODUCTS_URL, {
+            'attr.color': 'red', 'attr.size': '42'
+        })
+        self.assertEqual([row['id'] for row in res.data], [red.id])
+
+        res = self.client.get(PRODUCTS_URL, {
+            'attr.color': ['red', 'blue'], 'attr.size': '42'
+        })
+        self.assertEqual(
+            [row['id'] for row in res.data], [red.id, blue.id]
+        )
+
+    def test_filter_products_by_huge_number(self):
+        """Test numbers beyond the float range are matched, not a 500"""
+        huge = '9' * 400
+        product = Product.objects.create(
+            user=self.user, name='Huge', attributes={'size': huge}
+        )
+
+        res = self.client.get(PRODUCTS_URL, {'attr.size': huge})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in res.data], [product.id])
+
     # def test_view_product_detail(self):
     #     """Test viewing a category detail"""
     #     category = sample_category(user=self.user)
@@ -170,7 +232,7 @@ class PrivateProductsApiTests(TestCase):
 #         self.assertEqual(len(res.data), 1)
 
 
-class ProductImageUploadTests(TestCase):
+class ProductImageUploadTests(CatalogTestCase):
 
     def setUp(self):
         self.client = APIClient()
@@ -198,6 +260,26 @@ class ProductImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.product.image.path))
 
+    def test_upload_image_stores_metadata(self):
+        """Test the image dimensions and placeholder are stored on upload"""
+        url = image_upload_url(self.product.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (40, 20), 'blue').save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.image_width, self.product.image_height), (40, 20)
+        )
+        self.assertEqual(self.product.image_format, 'jpeg')
+        self.assertEqual(self.product.image_size, self.product.image.size)
+        self.assertTrue(
+            self.product.image_placeholder.startswith('data:image/jpeg')
+        )
+        self.assertEqual(res.data['image_color'], self.product.image_color)
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.product.id)
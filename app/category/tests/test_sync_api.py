@@ -0,0 +1,201 @@
+import threading
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Category, Product
+from core.tests.base import CatalogTestCase, CatalogTransactionTestCase
+
+
+SYNC_URL = reverse('category:sync')
+
+
+def sample_product(user, name='Cinnamon'):
+    """Create and return a sample product"""
+    return Product.objects.create(user=user, name=name, description='desc')
+
+
+def sample_category(user, **params):
+    """Create and return a sample category"""
+    defaults = {
+        'name': 'Sample category',
+        'persian_title': 'persian',
+    }
+    defaults.update(params)
+
+    return Category.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(CatalogTestCase):
+    """Test unauthenticated sync API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(CatalogTestCase):
+    """Test the authenticated sync API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=0, **params):
+        """Return the sync response after since"""
+        res = self.client.get(SYNC_URL, {'since': since, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_sync_returns_created_objects(self):
+        """Test created objects are returned with their data"""
+        product = sample_product(user=self.user)
+        category = sample_category(user=self.user)
+
+        data = self.sync()
+
+        changes = {(c['model'], c['id']): c for c in data['changes']}
+        self.assertEqual(changes[('product', product.id)]['action'], 'create')
+        self.assertEqual(
+            changes[('category', category.id)]['data']['name'],
+            category.name
+        )
+        self.assertFalse(data['has_more'])
+
+    def test_sync_only_returns_changes_after_cursor(self):
+        """Test a cursor skips changes the client already has"""
+        sample_product(user=self.user, name='Old')
+        cursor = self.sync()['cursor']
+        product = sample_product(user=self.user, name='New')
+
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            [(c['model'], c['id']) for c in data['changes']],
+            [('product', product.id)]
+        )
+        self.assertEqual(self.sync(data['cursor'])['changes'], [])
+
+    def test_sync_coalesces_and_returns_tombstones(self):
+        """Test repeated changes collapse and deletions leave tombstones"""
+        category = sample_category(user=self.user)
+        category.name = 'Renamed'
+        category.save()
+        cursor = self.sync()['cursor']
+        category_id = category.id
+        category.delete()
+
+        changes = self.sync(cursor)['changes']
+
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['id'], category_id)
+        self.assertEqual(changes[0]['action'], 'delete')
+        self.assertIsNone(changes[0]['data'])
+
+    def test_sync_records_link_changes(self):
+        """Test linking a product reports the category as updated"""
+        category = sample_category(user=self.user)
+        product = sample_product(user=self.user)
+        cursor = self.sync()['cursor']
+
+        category.products.add(product)
+
+        changes = self.sync(cursor)['changes']
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['model'], 'category')
+        self.assertEqual(changes[0]['data']['products'], [product.id])
+
+    def test_sync_records_bulk_deleted_subtrees(self):
+        """Test the set-based subtree delete leaves tombstones"""
+        root = sample_category(user=self.user)
+        child = sample_category(user=self.user, parent_category=root)
+        cursor = self.sync()['cursor']
+
+        Category.objects.delete_subtree(root)
+
+        changes = self.sync(cursor)['changes']
+        self.assertEqual(
+            {(c['id'], c['action']) for c in changes},
+            {(root.id, 'delete'), (child.id, 'delete')}
+        )
+
+    def test_sync_pages_with_limit(self):
+        """Test changes are paged and report when more remain"""
+        for i in range(3):
+            sample_product(user=self.user, name=str(i))
+
+        data = self.sync(limit=2)
+
+        self.assertEqual(len(data['changes']), 2)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(len(self.sync(data['cursor'])['changes']), 1)
+
+    def test_sync_limited_to_user(self):
+        """Test other users' changes are not returned"""
+        user2 = get_user_model().objects.create_user(
+            'other@londonappdev.com',
+            'password123'
+        )
+        sample_product(user=user2)
+
+        self.assertEqual(self.sync()['changes'], [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs concurrent writers')
+class ConcurrentSyncApiTests(CatalogTransactionTestCase):
+    """Test syncing while other transactions write changes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=0):
+        res = self.client.get(SYNC_URL, {'since': since})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_change_committed_late_not_skipped(self):
+        """Test a change committed after a newer one still reaches clients"""
+        inserted = threading.Event()
+        commit = threading.Event()
+
+        def write():
+            try:
+                with transaction.atomic():
+                    sample_product(user=self.user, name='Early')
+                    inserted.set()
+                    commit.wait(5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        inserted.wait(5)
+        late = sample_product(user=self.user, name='Late')
+        data = self.sync()
+        commit.set()
+        writer.join()
+
+        self.assertEqual([c['id'] for c in data['changes']], [late.id])
+        changes = self.sync(data['cursor'])['changes']
+        self.assertEqual(
+            [c['data']['name'] for c in changes], ['Early']
+        )
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChunkedUpload, Product
+from core.tests.base import CatalogTestCase
+
+
+UPLOADS_URL = reverse('category:chunkedupload-list')
+
+
+def upload_url(upload_id):
+    """Return chunked upload detail URL"""
+    return reverse('category:chunkedupload-detail', args=[upload_id])
+
+
+def sample_image():
+    """Return the bytes of a small JPEG image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class ChunkedUploadApiTests(CatalogTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(user=self.user, name='Salt')
+        self.data = sample_image()
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = self.settings(
+            MEDIA_ROOT=os.path.join(root.name, 'media'),
+            CHUNKED_UPLOAD_ROOT=os.path.join(root.name, 'chunks')
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_upload(self, checksum=None):
+        res = self.client.post(UPLOADS_URL, {
+            'product': self.product.id,
+            'filename': 'photo.jpg',
+            'size': len(self.data),
+            'checksum': checksum or hashlib.sha256(self.data).hexdigest(),
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def send(self, upload_id, offset, chunk):
+        return self.client.generic(
+            'PATCH', upload_url(upload_id), chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_upload_in_chunks(self):
+        """Test chunks are assembled and attached to the product"""
+        upload_id = self.create_upload()
+        half = len(self.data) // 2
+
+        res = self.send(upload_id, 0, self.data[:half])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Upload-Offset'], str(half))
+        self.assertIsNone(res.data['completed_at'])
+
+        res = self.client.get(upload_url(upload_id))
+        self.assertEqual(res.data['offset'], half)
+
+        res = self.send(upload_id, half, self.data[half:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(res.data['completed_at'])
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.image.name.endswith('.jpg'))
+        with self.product.image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(self.product.image_width, 64)
+        self.assertEqual(self.product.image_size, len(self.data))
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertFalse(os.path.exists(upload.path))
+
+    def test_offset_mismatch(self):
+        """Test a chunk at the wrong offset is rejected with the real one"""
+        upload_id = self.create_upload()
+        self.send(upload_id, 0, self.data[:10])
+
+        res = self.send(upload_id, 0, self.data[:10])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '10')
+
+    def test_chunk_past_size(self):
+        """Test bytes beyond the declared size are rejected"""
+        upload_id = self.create_upload()
+
+        res = self.send(upload_id, 0, self.data + b'extra')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res['Upload-Offset'], '0')
+
+    def test_checksum_mismatch(self):
+        """Test a corrupted upload is restarted and not attached"""
+        upload_id = self.create_upload(checksum='0' * 64)
+
+        res = self.send(upload_id, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res['Upload-Offset'], '0')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_upload_to_other_users_product(self):
+        """Test uploads can only target the user's own products"""
+        other = get_user_model().objects.create_user(
+            'other@yahoo.com', 'testpass'
+        )
+        self.product = Product.objects.create(user=other, name='Other')
+
+        res = self.client.post(UPLOADS_URL, {
+            'product': self.product.id,
+            'filename': 'photo.jpg',
+            'size': len(self.data),
+            'checksum': hashlib.sha256(self.data).hexdigest(),
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
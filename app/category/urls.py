@@ -7,9 +7,11 @@ from category import views
 router = DefaultRouter()
 router.register('products', views.ProductViewSet)
 router.register('categories', views.CategoryViewSet)
+router.register('uploads', views.ChunkedUploadViewSet)
 
 app_name = 'category'
 
 urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='sync'),
     path('', include(router.urls))
 ]
\ No newline at end of file
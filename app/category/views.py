@@ -1,17 +1,95 @@
 
+from contextlib import ExitStack
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
 from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 
-from core.models import Product, Category
+from core import sharding
+from core.models import Product, Category, CategoryProduct, ChangeLog, \
+                        ChunkedUpload, User
 from category import serializers
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+
+def filter_categories(queryset, query_params):
+    """Apply the persian title filters and ordering of a list request"""
+    query = serializers.CategoryQuerySerializer(data=query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    queryset = queryset.filter_persian_title(
+        params.get('persian_title'), params.get('persian_title_prefix')
+    )
+    if 'ordering' in params:
+        queryset = queryset.order_by(
+            query.ORDERINGS[params['ordering']], 'id'
+        )
+    return queryset
+
+
+def filter_products(queryset, query_params):
+    """Apply the attr.<name>=<value> filters of a request"""
+    attributes = {
+        key[len('attr.'):]: query_params.getlist(key)
+        for key in query_params
+        if key.startswith('attr.') and key != 'attr.'
+    }
+    if attributes:
+        queryset = queryset.filter_attributes(attributes)
+    return queryset
+
+
+class ShardedViewMixin:
+    """Serve the catalog of the user from their shard
+
+    Writes run in a transaction with the change log rows they add. The
+    change log lives on the default database, whose transaction commits
+    first when the shard is another one, so a failing shard commit can
+    leave a spurious change but never lose one.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        self.atomic_aliases = []
+        with ExitStack() as self.transactions:
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        """Roll back the writes of a request answered with an error"""
+        # The transactions would commit once the error became a response.
+        for alias in self.atomic_aliases:
+            transaction.set_rollback(True, using=alias)
+        return super().handle_exception(exc)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        shard = request.user.shard
+        self.transactions.enter_context(sharding.use_shard(shard))
+        if request.method not in SAFE_METHODS:
+            self.transactions.enter_context(transaction.atomic(using=shard))
+            self.atomic_aliases.append(shard)
+            if shard != DEFAULT_DB_ALIAS:
+                self.transactions.enter_context(transaction.atomic())
+                self.atomic_aliases.append(DEFAULT_DB_ALIAS)
+            # A move of the catalog waits for this write to commit, or the
+            # write sees the move, see UserManager.move_to_shard().
+            sharding.lock_catalog(shard, request.user.pk, shared=True)
+            if User.objects.values_list('shard', 'moving_to').get(
+                pk=request.user.pk
+            ) != (shard, ''):
+                raise sharding.ShardMoving()
+
+
+class BaseRecipeAttrViewSet(ShardedViewMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'catalog'
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
@@ -35,21 +113,59 @@ class ProductViewSet(BaseRecipeAttrViewSet):
     queryset = Product.objects.all()
     serializer_class = serializers.ProductSerializer
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        """Return the products of the user matching the attribute filters"""
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_products(queryset, self.request.query_params)
+        return queryset
+
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.action == 'upload_image':
+            return serializers.ProductImageSerializer
+
+        return self.serializer_class
+
+    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def upload_image(self, request, pk=None):
+        """Upload an image to a product"""
+        product = self.get_object()
+        serializer = self.get_serializer(product, data=request.data)
+
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class CategoryViewSet(ShardedViewMixin, viewsets.ModelViewSet):
     """Manage category in the database"""
     queryset = Category.objects.all()
     serializer_class = serializers.CategorySerializer    
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = 'catalog'
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(
+        queryset = self.queryset.filter(
             user=self.request.user
         )
+        if self.action == 'list':
+            queryset = filter_categories(queryset, self.request.query_params)
+        return queryset
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.CategoryDetailSerializer
+        elif self.action == 'move':
+            return serializers.CategoryMoveSerializer
+        elif self.action == 'reorder_products':
+            return serializers.ProductReorderSerializer
         # elif self.action == 'upload_image':
         #     return serializers.RecipeImageSerializer
 
@@ -57,5 +173,207 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Create a new category"""
         serializer.save(user=self.request.user)
-    
 
+    def perform_destroy(self, instance):
+        """Delete the category subtree with set-based batches"""
+        Category.objects.delete_subtree(instance)
+
+    @action(methods=['POST'], detail=True, url_path='move')
+    def move(self, request, pk=None):
+        """Move a category and its whole subtree under a new parent"""
+        category = self.get_object()
+        serializer = self.get_serializer(category, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(
+            serializers.CategorySerializer(category).data,
+            status=status.HTTP_200_OK
+        )
+
+    @action(methods=['GET'], detail=True, url_path='facets')
+    def facets(self, request, pk=None):
+        """Count the products of the category per attribute value"""
+        category = self.get_object()
+        products = filter_products(
+            category.ordered_products(), request.query_params
+        )
+
+        return Response(products.facets(), status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=True, url_path='products/reorder',
+            url_name='reorder-products')
+    def reorder_products(self, request, pk=None):
+        """Place a product right after another one within the category"""
+        category = self.get_object()
+        serializer = serializers.ProductReorderSerializer(
+            data=request.data,
+            context={'request': request, 'category': category}
+        )
+        serializer.is_valid(raise_exception=True)
+        CategoryProduct.objects.move_after(
+            category,
+            serializer.validated_data['product'],
+            serializer.validated_data.get('after')
+        )
+
+        return Response(
+            serializers.CategoryDetailSerializer(category).data,
+            status=status.HTTP_200_OK
+        )
+
+
+class ChunkedUploadViewSet(ShardedViewMixin,
+                           viewsets.GenericViewSet,
+                           mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin):
+    """Upload product images in resumable, offset addressed chunks
+
+    Clients create an upload with the file size and SHA-256, then PATCH
+    raw bytes with an Upload-Offset header. After a failure they GET the
+    upload and continue from the returned offset.
+    """
+    queryset = ChunkedUpload.objects.all()
+    serializer_class = serializers.ChunkedUploadSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """Return uploads of the current authenticated user only"""
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Create a new upload"""
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        """Abort an upload, removing the bytes received so far"""
+        instance.discard()
+        instance.delete()
+
+    def partial_update(self, request, pk=None):
+        """Append the request body at the given offset"""
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': 'A numeric Upload-Offset header is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        upload = self.get_object()
+
+        with transaction.atomic(using=upload._state.db):
+            try:
+                upload = self.get_queryset().select_for_update(
+                    nowait=True
+                ).get(pk=upload.pk)
+            except DatabaseError:
+                return Response(
+                    {'detail': 'Another chunk is being written.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if upload.completed_at is not None or offset != upload.offset:
+                return Response(
+                    {'detail': 'Upload-Offset does not match the upload.'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Upload-Offset': str(upload.offset)}
+                )
+            try:
+                upload.write_chunk(request)
+            except ValueError as exc:
+                return Response(
+                    {'detail': str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                    headers={'Upload-Offset': str(upload.offset)}
+                )
+
+            error = None
+            if upload.offset == upload.size:
+                if not upload.verify():
+                    error = 'Checksum mismatch, the upload was restarted.'
+                elif not upload.is_image():
+                    error = 'Upload a valid image, the upload was restarted.'
+                else:
+                    upload.attach()
+                if error:
+                    upload.discard()
+            upload.save(update_fields=['offset'])
+
+        if error:
+            return Response(
+                {'detail': error},
+                status=status.HTTP_400_BAD_REQUEST,
+                headers={'Upload-Offset': str(upload.offset)}
+            )
+        return Response(
+            self.get_serializer(upload).data,
+            headers={'Upload-Offset': str(upload.offset)}
+        )
+
+
+class SyncView(ShardedViewMixin, APIView):
+    """Return the user's catalog changes after a cursor"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    sources = {
+        ChangeLog.CATEGORY: (
+            Category.objects.prefetch_related('products'),
+            serializers.CategorySerializer
+        ),
+        ChangeLog.PRODUCT: (
+            Product.objects.all(),
+            serializers.ProductSerializer
+        ),
+    }
+
+    def get(self, request):
+        """Return changes newer than since, one entry per object"""
+        query = serializers.SyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data['since']
+        limit = query.validated_data['limit']
+
+        ChangeLog.objects.sequence()
+        changes = list(
+            ChangeLog.objects.filter(user=request.user, position__gt=since)
+            .order_by('position')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        # Only the newest change per object matters to a client catching up.
+        latest = {}
+        for change in changes:
+            key = (change.model, change.object_id)
+            latest.pop(key, None)
+            latest[key] = change
+
+        data = {}
+        for model, (queryset, serializer_class) in self.sources.items():
+            ids = [
+                object_id for (name, object_id), change in latest.items()
+                if name == model and change.action != ChangeLog.DELETE
+            ]
+            if ids:
+                objects = queryset.filter(user=request.user, id__in=ids)
+                data[model] = {
+                    obj.id: serializer_class(obj).data for obj in objects
+                }
+
+        results = []
+        for (model, object_id), change in latest.items():
+            payload = data.get(model, {}).get(object_id)
+            results.append({
+                'cursor': change.position,
+                'model': model,
+                'id': object_id,
+                'action': change.action if payload is not None
+                else ChangeLog.DELETE,
+                'data': payload,
+            })
+
+        return Response({
+            'cursor': changes[-1].position if changes else since,
+            'has_more': has_more,
+            'changes': results,
+        })
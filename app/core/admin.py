@@ -1,7 +1,57 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelectMultiple
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
-from core import models
+from core import models, persian, sharding
+
+
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(model, using):
+    """Return PostgreSQL's row estimate for the table of model
+
+    Partitioned tables have no rows of their own, their estimate is the
+    sum over their partitions, unknown while one was never analyzed.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT CASE WHEN parent.relkind = 'p' THEN (
+                SELECT CASE WHEN min(child.reltuples) < 0 THEN -1
+                            ELSE sum(child.reltuples) END
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = parent.oid
+            ) ELSE parent.reltuples END
+            FROM pg_class parent WHERE parent.oid = %s::regclass
+            """,
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else -1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using table statistics instead of COUNT(*) when unfiltered
+
+    Small tables, and tables never analyzed, are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql' and \
+                not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
 
 
 class UserAdmin(BaseUserAdmin):
@@ -22,6 +72,150 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Admin whose changelist stays fast on very large tables"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('user',)
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Pick the shard whose catalog rows the changelist shows"""
+    title = _('shard')
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.get_shards()]
+
+    def choices(self, changelist):
+        current = self.value() or DEFAULT_DB_ALIAS
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() in sharding.get_shards():
+            return queryset.using(self.value())
+        return queryset
+
+
+class ShardedModelAdmin(ScalableModelAdmin):
+    """Admin of a catalog model, whose rows live on their owner's shard
+
+    The changelist shows one shard at a time. Object pages find the shard
+    holding the object, or for new objects the shard of the chosen owner,
+    and run, rendering included, with catalog queries routed to it.
+    """
+    list_filter = (ShardFilter,)
+
+    def get_list_select_related(self, request):
+        # Users live on the default database, other shards can't join them.
+        shard = request.GET.get(ShardFilter.parameter_name, DEFAULT_DB_ALIAS)
+        if shard == DEFAULT_DB_ALIAS:
+            return self.list_select_related
+        return [name for name in self.list_select_related if name != 'user']
+
+    def get_shard(self, request, object_id=None):
+        if object_id is not None:
+            for alias in sharding.get_shards():
+                rows = self.model._default_manager.using(alias)
+                try:
+                    if rows.filter(pk=object_id).exists():
+                        return alias
+                except (ValueError, ValidationError):
+                    return None
+        try:
+            return sharding.shard_of(request.POST['user'])
+        except (KeyError, ValueError, models.User.DoesNotExist):
+            return None
+
+    def run_on_shard(self, view, request, object_id, *args, **kwargs):
+        with sharding.use_shard(self.get_shard(request, object_id)):
+            response = view(request, object_id, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+    def changeform_view(self, request, object_id=None, *args, **kwargs):
+        return self.run_on_shard(
+            super().changeform_view, request, object_id, *args, **kwargs
+        )
+
+    def delete_view(self, request, object_id, *args, **kwargs):
+        return self.run_on_shard(
+            super().delete_view, request, object_id, *args, **kwargs
+        )
+
+    def history_view(self, request, object_id, *args, **kwargs):
+        return self.run_on_shard(
+            super().history_view, request, object_id, *args, **kwargs
+        )
+
+
+class CategoryAdminForm(forms.ModelForm):
+    # The admin builds no form field for an M2M with an explicit through
+    # model; this one loads only the selected products and saves with set().
+    products = forms.ModelMultipleChoiceField(
+        queryset=models.Product.objects.none(),
+        required=False,
+        widget=AutocompleteSelectMultiple(
+            models.Category._meta.get_field('products'), admin.site
+        )
+    )
+
+    class Meta:
+        model = models.Category
+        fields = ('user', 'name', 'persian_title', 'parent_category',
+                  'products')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Links and parents belong to the owner of the category, the link
+        # table is even keyed by it.
+        try:
+            owner = int(self['user'].value())
+        except (TypeError, ValueError):
+            owner = None
+        self.fields['products'].queryset = \
+            models.Product.objects.filter(user_id=owner)
+        self.fields['parent_category'].queryset = \
+            models.Category.objects.filter(user_id=owner)
+
+
+class CategoryAdmin(ShardedModelAdmin):
+    form = CategoryAdminForm
+    list_display = ['id', 'name', 'persian_title', 'parent_category', 'user']
+    list_select_related = ['parent_category', 'user']
+    # Prefix searches are served by the pattern indexes, the persian title
+    # one through its normalized copy.
+    search_fields = ['^name', 'persian_title_normalized__startswith']
+    autocomplete_fields = ['parent_category']
+
+    def get_search_results(self, request, queryset, search_term):
+        return super().get_search_results(
+            request, queryset, persian.normalize(search_term)
+        )
+
+
+class ProductAdmin(ShardedModelAdmin):
+    list_display = ['id', 'name', 'user']
+    list_select_related = ['user']
+    search_fields = ['^name']
+
+
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ['url', 'is_active', 'cursor', 'failures',
+                    'next_attempt_at']
+    readonly_fields = ['failures', 'next_attempt_at', 'last_error',
+                       'leased_until']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Category)
-admin.site.register(models.Product)
+admin.site.register(models.Category, CategoryAdmin)
+admin.site.register(models.Product, ProductAdmin)
+admin.site.register(models.WebhookEndpoint, WebhookEndpointAdmin)
@@ -0,0 +1,58 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import profiling
+
+
+def database_sync_to_async(func):
+    """Run ORM code on a worker thread without blocking the event loop
+
+    Calls are not pinned to the single thread-sensitive thread, so the
+    queries of concurrent requests run side by side, each on the worker's
+    own connection. Stale connections are dropped around every call the
+    way request_started/request_finished do for sync views.
+    """
+    func = profiling.profiled(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+@database_sync_to_async
+def authenticate(request):
+    """Return the token user and token, or raise AuthenticationFailed"""
+    authentication = TokenAuthentication()
+    result = authentication.authenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result
+
+
+@database_sync_to_async
+def throttle(request, view_class):
+    """Apply the throttles of a DRF view, or raise Throttled"""
+    view_class().check_throttles(request)
+
+
+def error_response(exc):
+    """Return the JSON response DRF would send for an API exception"""
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = 'Token'
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
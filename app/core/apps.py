@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from core import instrumentation, receivers, sharding  # noqa: F401
+
+        connection_created.connect(instrumentation.install)
+        post_migrate.connect(sharding.reserve_id_range, sender=self)
@@ -0,0 +1,249 @@
+import io
+import json
+import random
+import re
+import statistics
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, \
+                               encode_multipart
+from django.urls import reverse
+
+from core.models import Category
+
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+BENCHMARK_EMAIL_DOMAIN = 'bench.example'
+
+QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+def benchmark_email(prefix, index):
+    """Return the email of a synthetic benchmark user"""
+    return f'{prefix}-{index}@{BENCHMARK_EMAIL_DOMAIN}'
+
+
+def sample_image():
+    """Return the bytes of a small JPEG used by the upload scenario"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 30, 30)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Response:
+    """Transport independent view of a benchmark response"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode()) if self.body else None
+
+    @property
+    def queries(self):
+        """Return the query count reported in Server-Timing, if any"""
+        match = QUERY_COUNT.search(self.headers.get('Server-Timing', ''))
+        return int(match.group(1)) if match else None
+
+
+class ClientTransport:
+    """Issue requests in process through the Django test client"""
+    name = 'client'
+
+    def __init__(self, host):
+        self.client = Client(HTTP_HOST=host)
+
+    def request(self, method, path, data=None, token=None, files=False):
+        extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        if method == 'GET':
+            res = self.client.get(path, data, **extra)
+        elif files:
+            res = self.client.post(path, data, **extra)
+        else:
+            res = self.client.post(
+                path, json.dumps(data), content_type='application/json',
+                **extra
+            )
+        return Response(res.status_code, dict(res.items()), res.content)
+
+
+class HttpTransport:
+    """Issue requests over HTTP to a running server"""
+    name = 'http'
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, data=None, token=None, files=False):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        body = None
+        url = self.base_url + path
+        if method == 'GET' and data:
+            url += '?' + urllib.parse.urlencode(data)
+        elif files:
+            body = encode_multipart(BOUNDARY, data)
+            headers['Content-Type'] = MULTIPART_CONTENT
+        elif data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(url, body, headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as res:
+                return Response(res.status, dict(res.headers), res.read())
+        except urllib.error.HTTPError as exc:
+            return Response(exc.code, dict(exc.headers), exc.read())
+
+
+class Benchmark:
+    """Timed API scenarios run against a generated catalog"""
+
+    def __init__(self, transport, email, seed=0):
+        self.transport = transport
+        self.email = email
+        self.random = random.Random(seed)
+        self.image = sample_image()
+        self.created_categories = []
+        self.uploaded_images = []
+        self.token = None
+
+    def setup(self):
+        """Authenticate and load the ids the scenarios pick from"""
+        res = self.token_auth()
+        if res.status != 200:
+            raise RuntimeError(f'Could not authenticate {self.email}')
+        self.token = res.json()['token']
+        self.category_ids = [
+            category['id'] for category in self.get(
+                reverse('category:category-list')
+            ).json()
+        ]
+        self.product_ids = [
+            product['id'] for product in self.get(
+                reverse('category:product-list')
+            ).json()
+        ]
+        if not self.category_ids or not self.product_ids:
+            raise RuntimeError(f'{self.email} has no catalog to benchmark')
+
+    def get(self, path, data=None):
+        return self.transport.request('GET', path, data, self.token)
+
+    def token_auth(self):
+        return self.transport.request('POST', reverse('user:token'), {
+            'email': self.email, 'password': BENCHMARK_PASSWORD
+        })
+
+    def category_list(self):
+        return self.get(reverse('category:category-list'))
+
+    def category_detail(self):
+        category_id = self.random.choice(self.category_ids)
+        return self.get(
+            reverse('category:category-detail', args=[category_id])
+        )
+
+    def product_list(self):
+        return self.get(reverse('category:product-list'))
+
+    def category_create(self):
+        products = self.random.sample(
+            self.product_ids, min(10, len(self.product_ids))
+        )
+        res = self.transport.request(
+            'POST', reverse('category:category-list'), {
+                'name': 'Benchmark category',
+                'persian_title': 'benchmark',
+                'products': products,
+            }, self.token
+        )
+        if res.status == 201:
+            self.created_categories.append(res.json()['id'])
+        return res
+
+    def image_upload(self):
+        product_id = self.random.choice(self.product_ids)
+        image = io.BytesIO(self.image)
+        image.name = 'benchmark.jpg'
+        res = self.transport.request(
+            'POST',
+            reverse('category:product-upload-image', args=[product_id]),
+            {'image': image}, self.token, files=True
+        )
+        if res.status == 200:
+            self.uploaded_images.append(res.json()['image'])
+        return res
+
+    SCENARIOS = (
+        'category_list', 'category_detail', 'product_list',
+        'category_create', 'token_auth', 'image_upload',
+    )
+
+    def run(self, scenario, iterations, warmup=1):
+        """Time a scenario and summarise its latencies in milliseconds"""
+        call = getattr(self, scenario)
+        for _ in range(warmup):
+            call()
+        latencies = []
+        queries = []
+        errors = 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            res = call()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if res.status >= 400:
+                errors += 1
+            if res.queries is not None:
+                queries.append(res.queries)
+        latencies.sort()
+        return {
+            'iterations': iterations,
+            'errors': errors,
+            'min_ms': round(latencies[0], 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(latencies[-1], 3),
+            'queries': max(queries) if queries else None,
+        }
+
+    def cleanup(self):
+        """Remove categories and local image files the scenarios created"""
+        for category in Category.objects.filter(
+                id__in=self.created_categories):
+            Category.objects.delete_subtree(category)
+        if isinstance(self.transport, ClientTransport):
+            for url in self.uploaded_images:
+                path = url.split(settings.MEDIA_URL, 1)[-1]
+                default_storage.delete(path)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of sorted values"""
+    index = max(0, int(round(percent / 100 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def compare(baseline, current, threshold=0.1):
+    """Yield the median latency change of each scenario against baseline
+
+    Items are (scenario, baseline p50, current p50, relative change,
+    regressed), where regressed means the change exceeds threshold.
+    """
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms']
+        yield name, before['p50_ms'], result['p50_ms'], change, \
+            change > threshold
@@ -0,0 +1,33 @@
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+
+from core import metrics
+
+
+_missing = object()
+
+
+class InstrumentedCacheMixin:
+    """Count hits and misses of get() and get_many() for the metrics
+
+    Backends using it set ``metrics_name``, the cache label in the metrics.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        metrics.observe_cache_lookup(self.metrics_name, value is not _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            metrics.observe_cache_lookup(self.metrics_name, key in found)
+        return found
+
+
+class LocMemCache(InstrumentedCacheMixin, BaseLocMemCache):
+    """Local memory cache reporting its hit ratio"""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.metrics_name = name or 'default'
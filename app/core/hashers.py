@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+DEFAULTS = {
+    'PBKDF2_ITERATIONS': hashers.PBKDF2PasswordHasher.iterations,
+    'ARGON2_TIME_COST': hashers.Argon2PasswordHasher.time_cost,
+    'ARGON2_MEMORY_COST': hashers.Argon2PasswordHasher.memory_cost,
+    'ARGON2_PARALLELISM': hashers.Argon2PasswordHasher.parallelism,
+    'BCRYPT_ROUNDS': hashers.BCryptSHA256PasswordHasher.rounds,
+}
+
+
+def get_setting(name):
+    """Return a password hashing setting, falling back to its default"""
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, DEFAULTS[name])
+
+
+# The work factors are read on every use, so changing them only requires
+# a restart: existing hashes are upgraded by must_update() on next login.
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with a configurable iteration count"""
+
+    @property
+    def iterations(self):
+        return get_setting('PBKDF2_ITERATIONS')
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 with configurable time, memory and parallelism costs"""
+
+    @property
+    def time_cost(self):
+        return get_setting('ARGON2_TIME_COST')
+
+    @property
+    def memory_cost(self):
+        return get_setting('ARGON2_MEMORY_COST')
+
+    @property
+    def parallelism(self):
+        return get_setting('ARGON2_PARALLELISM')
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt-SHA256 with a configurable number of rounds"""
+
+    @property
+    def rounds(self):
+        return get_setting('BCRYPT_ROUNDS')
+
+
+def make_passwords(passwords, processes=None):
+    """Hash many passwords in parallel across worker processes"""
+    passwords = list(passwords)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(passwords) < 2:
+        return [hashers.make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (processes * 4))
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(
+            hashers.make_password, passwords, chunksize=chunksize
+        ))
@@ -0,0 +1,54 @@
+import base64
+import io
+
+from PIL import Image
+
+
+PLACEHOLDER_SIZE = 16
+METADATA_FIELDS = (
+    'image_width', 'image_height', 'image_format', 'image_size',
+    'image_placeholder', 'image_color',
+)
+
+
+def image_metadata(f):
+    """Return the Product image metadata fields of an image file
+
+    Dimensions and format come from the header alone; JPEGs are decoded
+    at a fraction of their size for the placeholder and dominant color.
+    """
+    f.seek(0, io.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    with Image.open(f) as image:
+        width, height = image.size
+        image_format = image.format
+        image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        small = image.convert('RGB')
+    f.seek(0)
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_format': (image_format or '').lower(),
+        'image_size': size,
+        'image_placeholder': placeholder(small),
+        'image_color': dominant_color(small),
+    }
+
+
+def placeholder(image):
+    """Return a tiny JPEG data URI clients can blur while loading"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=50)
+    encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def dominant_color(image):
+    """Return the most common color of an image as #rrggbb"""
+    quantized = image.quantize(colors=4)
+    count, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
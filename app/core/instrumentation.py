@@ -0,0 +1,272 @@
+import contextvars
+import hashlib
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+
+
+DEFAULTS = {
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_QUERY_MS': 100,
+    'DUPLICATE_QUERY_THRESHOLD': 5,
+    'MAX_CAPTURED_QUERIES': 200,
+    # {route: limit}, routes being URL names like "category:category-list".
+    'QUERY_BUDGETS': {},
+    'DEFAULT_QUERY_BUDGET': None,
+    'STATEMENT_TIMEOUTS_MS': {},
+    'DEFAULT_STATEMENT_TIMEOUT_MS': None,
+    'QUERY_BUDGET_MODE': 'log',
+}
+LOG = 'log'
+STRICT = 'strict'
+# SQLSTATE of statements cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+
+DJANGO_PACKAGE = os.sep + 'django' + os.sep
+SKIPPED_FRAMES = (
+    os.path.join('core', 'instrumentation.py'),
+    os.path.join('core', 'middleware.py'),
+)
+
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised by the query over the budget of a route in strict mode"""
+
+
+def get_setting(name):
+    """Return an instrumentation setting, falling back to its default"""
+    return getattr(settings, 'INSTRUMENTATION', {}).get(name, DEFAULTS[name])
+
+
+def query_origin():
+    """Return the innermost frame outside Django that issued the query"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if not frame.filename.endswith(SKIPPED_FRAMES) and \
+                DJANGO_PACKAGE not in frame.filename:
+            return f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class RequestMetrics:
+    """Costs accumulated while serving a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.spans = {}
+        self.queries = []
+        self.slow_queries = []
+        self.duplicates = {}
+        # core.profiling.Session of a profiled request, getting every query.
+        self.profile = None
+        self.query_budget = None
+        self.statement_timeout = None
+        self.budget_exceeded = False
+        # Budget violations of sub-requests, with their route.
+        self.sub_budgets_exceeded = []
+        self._sub_query_count = 0
+        self.timeouts = []
+        self._counts = {}
+        self._open = {}
+        self._slow_query = get_setting('SLOW_QUERY_MS') / 1000
+        self._duplicate_threshold = get_setting('DUPLICATE_QUERY_THRESHOLD')
+        self._max_captured = get_setting('MAX_CAPTURED_QUERIES')
+        self._strict = get_setting('QUERY_BUDGET_MODE') == STRICT
+        self._timed_connections = set()
+        # Sub-requests of a concurrent batch merge from worker threads.
+        self._merge_lock = threading.Lock()
+
+    def apply_limits(self, route):
+        """Set the query budget and statement timeout of the resolved route"""
+        self.query_budget = get_setting('QUERY_BUDGETS').get(
+            route, get_setting('DEFAULT_QUERY_BUDGET')
+        )
+        self.statement_timeout = get_setting('STATEMENT_TIMEOUTS_MS').get(
+            route, get_setting('DEFAULT_STATEMENT_TIMEOUT_MS')
+        )
+
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper timing and classifying every query"""
+        # Queries of sub-requests count against their own budgets only.
+        if self.query_budget is not None and \
+                self.query_count - self._sub_query_count >= self.query_budget:
+            self.budget_exceeded = True
+            if self._strict:
+                raise QueryBudgetExceeded(
+                    f'More than {self.query_budget} queries, next: {sql}'
+                )
+        self.set_statement_timeout(context['connection'], context['cursor'])
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except DatabaseError as exc:
+            if getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED:
+                self.timeouts.append({'sql': sql, 'origin': query_origin()})
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.db_time += duration
+            if len(self.queries) < self._max_captured:
+                self.queries.append((sql, duration))
+            if self.profile is not None:
+                self.profile.record_query(sql, params, many, duration)
+            # The SQL template repeats with different params on N+1 access
+            # patterns, so counting templates is enough to spot them.
+            count = self._counts.get(sql, 0) + 1
+            self._counts[sql] = count
+            if count == self._duplicate_threshold:
+                self.duplicates[sql] = query_origin()
+            if duration >= self._slow_query:
+                self.slow_queries.append({
+                    'sql': sql,
+                    'ms': round(duration * 1000, 2),
+                    'origin': query_origin(),
+                })
+
+    def set_statement_timeout(self, connection, cursor):
+        """Apply the timeout of the request on its first query of connection
+
+        The setting outlives the request on persistent connections, so a
+        connection left with a timeout is reset by the next request.
+        """
+        if connection.vendor != 'postgresql' or \
+                id(connection) in self._timed_connections:
+            return
+        self._timed_connections.add(id(connection))
+        applied = getattr(connection, 'statement_timeout', None)
+        if self.statement_timeout is None and applied is None:
+            return
+        # The raw cursor skips the execute wrappers, so it isn't counted.
+        if self.statement_timeout is None:
+            cursor.cursor.execute('SET statement_timeout TO DEFAULT')
+        else:
+            cursor.cursor.execute(
+                'SET statement_timeout = %s', [int(self.statement_timeout)]
+            )
+        connection.statement_timeout = self.statement_timeout
+
+    def merge(self, other, route):
+        """Add the costs of a finished sub-request of route"""
+        with self._merge_lock:
+            self.query_count += other.query_count
+            self._sub_query_count += other.query_count
+            self.db_time += other.db_time
+            for name, duration in other.spans.items():
+                self.add_span(name, duration)
+            room = max(self._max_captured - len(self.queries), 0)
+            self.queries += other.queries[:room]
+            self.slow_queries += other.slow_queries
+            for sql, count in other._counts.items():
+                self._counts[sql] = self._counts.get(sql, 0) + count
+            for sql, origin in other.duplicates.items():
+                self.duplicates.setdefault(sql, origin)
+            if other.budget_exceeded:
+                self.sub_budgets_exceeded.append({
+                    'route': route,
+                    'budget': other.query_budget,
+                    'queries': other.query_count,
+                })
+            self.timeouts += [
+                dict(timeout, route=route, timeout_ms=other.statement_timeout)
+                for timeout in other.timeouts
+            ]
+            # Connections now carry the timeout of the sub-request.
+            self._timed_connections -= other._timed_connections
+
+    def add_span(self, name, duration):
+        """Add time spent in a named span"""
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def duplicate_counts(self):
+        """Return {sql: (count, origin)} of queries flagged as N+1"""
+        return {
+            sql: (self._counts[sql], origin)
+            for sql, origin in self.duplicates.items()
+        }
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper reporting to the current request, if any"""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """Wrap every query of a new connection, whichever thread opened it
+
+    Async views run their queries on worker threads with connections of
+    their own; the request's metrics reach them through the copied context.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed(name):
+    """Attribute the enclosed time to a span of the current request
+
+    Nested use of the same span (e.g. nested serializers) is only counted
+    once, at the outermost level.
+    """
+    metrics = current.get()
+    if metrics is None or metrics._open.get(name):
+        yield
+        return
+    metrics._open[name] = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._open[name] = False
+        metrics.add_span(name, time.perf_counter() - start)
+
+
+@contextmanager
+def sub_request(route):
+    """Collect the metrics of a sub-request, e.g. of a batch, on their own
+
+    Sub-requests skip the middleware, so this applies the query budget
+    and statement timeout of their route. Their costs are added to the
+    current request once done.
+    """
+    metrics = current.get()
+    if metrics is None:
+        yield None
+        return
+    sub_metrics = RequestMetrics()
+    sub_metrics.profile = metrics.profile
+    sub_metrics.apply_limits(route)
+    token = current.set(sub_metrics)
+    try:
+        yield sub_metrics
+    finally:
+        current.reset(token)
+        metrics.merge(sub_metrics, route)
+
+
+def fingerprint(sql):
+    """Return a short stable id for a SQL template"""
+    return hashlib.md5(sql.encode()).hexdigest()[:12]
+
+
+class TimedRepresentationMixin:
+    """Attribute serializer to_representation time to the serializer span"""
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
@@ -0,0 +1,84 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import sharding
+from core.images import METADATA_FIELDS, image_metadata
+from core.models import Product
+from core.signals import bulk_updated
+
+
+def read_metadata(name):
+    """Return the metadata of a stored product image, None if unreadable"""
+    storage = Product._meta.get_field('image').storage
+    try:
+        with storage.open(name, 'rb') as f:
+            return image_metadata(f)
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to compute image metadata of existing products"""
+    help = 'Fill dimensions, placeholder and color of product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of products updated per transaction'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of images decoded concurrently'
+        )
+
+    def handle(self, *args, **options):
+        updated = failed = 0
+        with ProcessPoolExecutor(options['processes']) as executor:
+            for alias in sharding.get_shards():
+                # Filled rows drop out of this filter, so reruns resume.
+                pending = Product.objects.using(alias).exclude(
+                    image=''
+                ).filter(
+                    image__isnull=False, image_width__isnull=True
+                ).only('id', 'user_id', 'image').order_by('pk')
+                last_pk = 0
+                while True:
+                    products = list(
+                        pending.filter(pk__gt=last_pk)[:options['batch_size']]
+                    )
+                    if not products:
+                        break
+                    last_pk = products[-1].pk
+                    results = executor.map(
+                        read_metadata,
+                        [product.image.name for product in products]
+                    )
+                    changed = []
+                    for product, metadata in zip(products, results):
+                        if metadata is None:
+                            failed += 1
+                            continue
+                        for field, value in metadata.items():
+                            setattr(product, field, value)
+                        changed.append(product)
+                    # The change log lives on the default database.
+                    with transaction.atomic(using=alias), \
+                            transaction.atomic():
+                        Product.objects.using(alias).bulk_update(
+                            changed, METADATA_FIELDS
+                        )
+                        bulk_updated.send(
+                            sender=Product,
+                            ids=[product.pk for product in changed],
+                            user_ids=[product.user_id for product in changed],
+                            using=alias
+                        )
+                    updated += len(changed)
+                    self.stdout.write(f'Updated {updated} products...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} products, {failed} unreadable images'
+        ))
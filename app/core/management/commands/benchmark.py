@@ -0,0 +1,107 @@
+import json
+import platform
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmark import Benchmark, ClientTransport, HttpTransport, \
+                           benchmark_email, compare
+
+
+class Command(BaseCommand):
+    """Django command to time API scenarios against a generated catalog"""
+    help = 'Run timed API scenarios and save the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=Benchmark.SCENARIOS,
+            help='Scenario to run, may be repeated (default: all)'
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--user', default=None,
+            help='Email of the benchmark user (default: first generated)'
+        )
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Run against a live server instead of the test client'
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header used with the test client'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', default=None,
+            help='Earlier results to report median changes against'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Relative median slowdown reported as a regression'
+        )
+
+    def handle(self, *args, **options):
+        if options['base_url']:
+            transport = HttpTransport(options['base_url'])
+        else:
+            transport = ClientTransport(options['host'])
+        email = options['user'] or benchmark_email('bench', 0)
+        benchmark = Benchmark(transport, email, seed=options['seed'])
+        try:
+            benchmark.setup()
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        results = {}
+        try:
+            for scenario in options['scenario'] or Benchmark.SCENARIOS:
+                results[scenario] = benchmark.run(
+                    scenario, options['iterations'], options['warmup']
+                )
+                self.stdout.write(
+                    f'{scenario:16} p50 {results[scenario]["p50_ms"]:9.2f} ms'
+                    f'  p95 {results[scenario]["p95_ms"]:9.2f} ms'
+                )
+        finally:
+            benchmark.cleanup()
+
+        report = {
+            'commit': self.commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'transport': transport.name,
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'user': email,
+            'categories': len(benchmark.category_ids),
+            'products': len(benchmark.product_ids),
+            'scenarios': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved results to {options["output"]}'
+        ))
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                changes = compare(
+                    json.load(baseline), report, options['threshold']
+                )
+                for name, before, after, change, regressed in changes:
+                    line = (f'{name:16} {before:9.2f} -> {after:9.2f} ms '
+                            f'({change:+.1%})')
+                    style = self.style.ERROR if regressed else str
+                    self.stdout.write(style(line))
+
+    def commit(self):
+        """Return the current git commit, if the tree is a checkout"""
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sharding
+from core.models import Category, BULK_DELETE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Django command to delete large category trees or users in batches"""
+    help = 'Delete a category subtree or a user with their whole catalog'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            '--category', type=int,
+            help='Id of the category whose subtree should be deleted'
+        )
+        group.add_argument(
+            '--user',
+            help='Email of the user to delete along with their catalog'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BULK_DELETE_BATCH_SIZE,
+            help='Number of rows removed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['category'] is None and not options['user']:
+            raise CommandError('Pass either --category or --user')
+        if options['category'] is not None:
+            # The category is on the shard of its owner, whichever it is.
+            for alias in sharding.get_shards():
+                category = Category.objects.using(alias).filter(
+                    pk=options['category']
+                ).first()
+                if category is not None:
+                    break
+            else:
+                raise CommandError('Category does not exist')
+            deleted = Category.objects.db_manager(alias).delete_subtree(
+                category, batch_size
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Deleted {deleted} categories')
+            )
+            return
+
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User does not exist')
+        User.objects.delete_with_catalog(user, batch_size)
+        self.stdout.write(self.style.SUCCESS('Deleted user and catalog'))
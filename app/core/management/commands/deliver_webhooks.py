@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core import webhooks
+from core.models import ChangeLog, WebhookEndpoint
+
+
+class Command(BaseCommand):
+    """Django command posting catalog changes to the webhook endpoints"""
+    help = 'Deliver the change log to webhook endpoints in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Make one pass over the endpoints instead of running on'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Seconds to sleep when there is nothing to deliver'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = self.deliver_due()
+            if options['once']:
+                break
+            if not delivered:
+                time.sleep(options['interval'])
+
+    def deliver_due(self):
+        """Give every endpoint due for delivery one batch"""
+        delivered = 0
+        due = WebhookEndpoint.objects.filter(is_active=True).filter(
+            Q(next_attempt_at__isnull=True) |
+            Q(next_attempt_at__lte=timezone.now())
+        ).values_list('pk', flat=True)
+        ChangeLog.objects.sequence()
+        for pk in due:
+            # Workers running side by side skip endpoints in delivery.
+            endpoint = webhooks.claim(pk)
+            if endpoint is None:
+                continue
+            try:
+                count = webhooks.deliver(endpoint)
+            except webhooks.DeliveryError as exc:
+                delay = webhooks.retry_later(endpoint, exc)
+                self.stderr.write(
+                    f'{endpoint.url} failed: {exc}, '
+                    f'retrying in {delay:.0f} seconds'
+                )
+                continue
+            if count:
+                self.stdout.write(f'Delivered {count} changes to {endpoint}')
+            delivered += count
+        return delivered
@@ -0,0 +1,131 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sharding
+from core.benchmark import BENCHMARK_PASSWORD, benchmark_email
+from core.models import Category, CategoryProduct, Product
+
+
+class Command(BaseCommand):
+    """Django command to generate a synthetic catalog for benchmarks"""
+    help = 'Generate synthetic users, category trees and products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--products', type=int, default=1000,
+            help='Products per user'
+        )
+        parser.add_argument(
+            '--roots', type=int, default=5,
+            help='Top level categories per user'
+        )
+        parser.add_argument(
+            '--depth', type=int, default=3,
+            help='Levels in each category tree'
+        )
+        parser.add_argument(
+            '--fanout', type=int, default=5,
+            help='Children of each non-leaf category'
+        )
+        parser.add_argument(
+            '--links', type=int, default=20,
+            help='Products linked to each category'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Prefix of the generated user emails'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete previously generated users with this prefix first'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        User = get_user_model()
+        emails = [
+            benchmark_email(options['prefix'], index)
+            for index in range(options['users'])
+        ]
+        existing = User.objects.filter(email__in=emails)
+        if options['clear']:
+            for user in existing:
+                User.objects.delete_with_catalog(user)
+        elif existing.exists():
+            raise CommandError(
+                'Benchmark users already exist, pass --clear to replace them'
+            )
+
+        # Hashing once keeps generation from being dominated by PBKDF2.
+        password = make_password(BENCHMARK_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(email=email, name=email, password=password,
+                  shard=sharding.pick_shard(email))
+             for email in emails],
+            batch_size=options['batch_size']
+        )
+        for user in users:
+            with sharding.use_shard(user.shard):
+                self.generate_user_catalog(user)
+            self.stdout.write(f'Generated catalog for {user.email}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users'
+        ))
+
+    def generate_user_catalog(self, user):
+        """Create products, category trees and links for a user"""
+        options = self.options
+        batch_size = options['batch_size']
+        product_ids = []
+        for start in range(0, options['products'], batch_size):
+            count = min(batch_size, options['products'] - start)
+            product_ids.extend(product.id for product in (
+                Product.objects.bulk_create([
+                    Product(
+                        user=user,
+                        name=f'Product {start + index}',
+                        description='Synthetic benchmark product'
+                    )
+                    for index in range(count)
+                ])
+            ))
+
+        category_ids = []
+        parents = [None] * options['roots']
+        for level in range(options['depth']):
+            created = []
+            for start in range(0, len(parents), batch_size):
+                created.extend(Category.objects.bulk_create([
+                    Category(
+                        user=user,
+                        name=f'Category {level}.{start + index}',
+                        persian_title=f'دسته {level}.{start + index}',
+                        parent_category_id=parent
+                    )
+                    for index, parent in
+                    enumerate(parents[start:start + batch_size])
+                ]))
+            ids = [category.id for category in created]
+            category_ids.extend(ids)
+            parents = [pk for pk in ids for _ in range(options['fanout'])]
+
+        links = min(options['links'], len(product_ids))
+        batch = []
+        for category_id in category_ids:
+            batch.extend(
+                CategoryProduct(
+                    category_id=category_id, product_id=pk, user=user
+                )
+                for pk in self.random.sample(product_ids, links)
+            )
+            if len(batch) >= batch_size:
+                CategoryProduct.objects.bulk_create(batch)
+                batch = []
+        CategoryProduct.objects.bulk_create(batch)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import sharding
+from core.models import Category
+
+
+class Command(BaseCommand):
+    """Django command filling the normalized persian title of categories"""
+    help = 'Compute persian_title_normalized of existing categories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of categories updated per transaction'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every category, e.g. after the normalization '
+                 'changed, instead of only unfilled ones'
+        )
+
+    def handle(self, *args, **options):
+        updated = 0
+        for alias in sharding.get_shards():
+            categories = Category.objects.using(alias).only(
+                'id', 'persian_title', 'persian_title_normalized'
+            ).order_by('pk')
+            if not options['all']:
+                # Filled rows drop out of this filter, so reruns resume.
+                categories = categories.filter(
+                    persian_title_normalized=''
+                ).exclude(persian_title='')
+            last_pk = 0
+            while True:
+                batch = list(
+                    categories.filter(pk__gt=last_pk)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                changed = []
+                for category in batch:
+                    normalized = category.persian_title_normalized
+                    category.normalize_persian_title()
+                    if category.persian_title_normalized != normalized:
+                        changed.append(category)
+                with transaction.atomic(using=alias):
+                    Category.objects.using(alias).bulk_update(
+                        changed, ['persian_title_normalized']
+                    )
+                updated += len(changed)
+                self.stdout.write(f'Updated {updated} categories...')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated {updated} categories')
+        )
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    """Django command hash partitioning the catalog tables by owner"""
+    help = 'Hash partition the product and link tables by user_id in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to convert, e.g. a shard'
+        )
+        parser.add_argument(
+            '--partitions', type=int, default=16,
+            help='Number of hash partitions of each table'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of rows copied per transaction'
+        )
+        parser.add_argument(
+            '--no-swap', action='store_false', dest='swap',
+            help='Only copy the rows, the copies are kept in sync until '
+                 'the command is run again'
+        )
+        parser.add_argument(
+            '--drop-old', action='store_true',
+            help='Drop the unpartitioned tables after the swap'
+        )
+
+    def handle(self, *args, **options):
+        if options['partitions'] < 2:
+            raise CommandError('--partitions must be at least 2')
+        connection = connections[options['database']]
+        try:
+            partitioning.check_support(connection)
+        except NotSupportedError as exc:
+            raise CommandError(exc)
+
+        if all(partitioning.is_partitioned(connection, table)
+               for table in partitioning.TABLES):
+            self.stdout.write('The tables are partitioned already')
+        else:
+            self.convert(connection, options)
+        if options['drop_old']:
+            partitioning.drop_unpartitioned(connection)
+            self.stdout.write('Dropped the unpartitioned tables')
+
+    def convert(self, connection, options):
+        """Copy the tables to partitioned ones and swap them in"""
+        for table in partitioning.TABLES:
+            if partitioning.create_shadow(
+                connection, table, options['partitions']
+            ):
+                self.stdout.write(
+                    f'Created {partitioning.shadow(table)} with '
+                    f'{options["partitions"]} partitions'
+                )
+
+        # Run after the trigger filling in owners of new links is in place.
+        filled = sum(partitioning.backfill_owners(
+            connection, options['batch_size']
+        ))
+        self.stdout.write(f'Filled in the owner of {filled} links')
+
+        for table in partitioning.TABLES:
+            copied = 0
+            for count in partitioning.copy_rows(
+                connection, table, options['batch_size']
+            ):
+                copied += count
+                self.stdout.write(f'{table}: {copied} rows copied')
+
+        if not options['swap']:
+            return
+        try:
+            partitioning.swap(connection)
+        except partitioning.PartitioningError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            'Swapped in the partitioned tables, the old ones are kept as '
+            '<table>_unpartitioned'
+        ))
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sharding
+
+
+class Command(BaseCommand):
+    """Django command moving users' catalogs to their shard"""
+    help = 'Move catalogs of users placed on another shard than they hash to'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='emails', metavar='EMAIL',
+            help='Only move this user, can be repeated'
+        )
+        parser.add_argument(
+            '--to', dest='target',
+            help='Shard to move the given users to, instead of their own'
+        )
+        parser.add_argument(
+            '--drain', type=float, default=5,
+            help='Seconds running reads get to finish before a move '
+                 'deletes the old rows, and writes on shards other than '
+                 'PostgreSQL before the copy'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows copied per query'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the users that would be moved'
+        )
+
+    def handle(self, *args, **options):
+        shards = sharding.get_shards()
+        target = options['target']
+        if target is not None and target not in shards:
+            raise CommandError(f'Unknown shard "{target}"')
+        if target is not None and not options['emails']:
+            raise CommandError('--to needs the users to move with --user')
+
+        moved = 0
+        for user in self.users(options['emails']):
+            destination = target or sharding.pick_shard(user.email)
+            if user.shard == destination:
+                continue
+            if options['dry_run']:
+                self.stdout.write(
+                    f'Would move {user.email} from {user.shard} '
+                    f'to {destination}'
+                )
+                continue
+            source = user.shard
+            rows = get_user_model().objects.move_to_shard(
+                user, destination, drain=options['drain'],
+                batch_size=options['batch_size']
+            )
+            moved += 1
+            self.stdout.write(
+                f'Moved {user.email} from {source} to {destination} '
+                f'({rows} rows)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} users'))
+
+    def users(self, emails):
+        """Yield the users to check, in batches of primary keys"""
+        users = get_user_model().objects.order_by('pk')
+        if emails:
+            users = users.filter(email__in=emails)
+            missing = set(emails) - set(users.values_list('email', flat=True))
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(missing)}')
+        last_pk = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:1000])
+            if not batch:
+                break
+            yield from batch
+            last_pk = batch[-1].pk
@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import sharding
+from core.models import PRODUCT_IMAGE_DIR, Product, sharded_path
+from core.signals import bulk_updated
+
+
+class Command(BaseCommand):
+    """Django command to move flat product images into sharded directories"""
+    help = 'Move product images to uploads/product/ab/cd/ and update rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of products moved and updated per transaction'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Number of files moved concurrently'
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Product._meta.get_field('image').storage
+        moved = missing = 0
+        with ThreadPoolExecutor(options['workers']) as executor:
+            for alias in sharding.get_shards():
+                # Migrated rows drop out of this filter, so an interrupted
+                # run simply resumes with whatever is still flat.
+                flat = Product.objects.using(alias).filter(
+                    image__regex=f'^{PRODUCT_IMAGE_DIR}[^/]+$'
+                ).only('id', 'user_id', 'image').order_by('pk')
+                last_pk = 0
+                while True:
+                    products = list(
+                        flat.filter(pk__gt=last_pk)[:options['batch_size']]
+                    )
+                    if not products:
+                        break
+                    last_pk = products[-1].pk
+                    names = list(executor.map(
+                        self.move,
+                        [product.image.name for product in products]
+                    ))
+                    updated = []
+                    for product, name in zip(products, names):
+                        if name is None:
+                            missing += 1
+                            continue
+                        product.image.name = name
+                        updated.append(product)
+                    # The change log lives on the default database.
+                    with transaction.atomic(using=alias), \
+                            transaction.atomic():
+                        Product.objects.using(alias).bulk_update(
+                            updated, ['image']
+                        )
+                        # Synced clients hold the old URLs, gone now.
+                        bulk_updated.send(
+                            sender=Product,
+                            ids=[product.pk for product in updated],
+                            user_ids=[product.user_id for product in updated],
+                            using=alias
+                        )
+                    moved += len(updated)
+                    self.stdout.write(f'Moved {moved} images...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} images, {missing} missing'
+        ))
+
+    def move(self, name):
+        """Move a file to its sharded path and return it, None if missing"""
+        storage = self.storage
+        target = sharded_path(PRODUCT_IMAGE_DIR, os.path.basename(name))
+        if not storage.exists(name):
+            # Moved by a run that stopped before updating the row.
+            return target if storage.exists(target) else None
+        if isinstance(storage, FileSystemStorage):
+            path = storage.path(target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(storage.path(name), path)
+        else:
+            with storage.open(name) as f:
+                storage.save(target, f)
+            storage.delete(name)
+        return target
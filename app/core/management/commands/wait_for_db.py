@@ -1,19 +1,125 @@
+import random
 import time
 
-from django.db import connections
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+
+
+class NotReady(Exception):
+    """A dependency answered but is not ready to serve the app yet"""
 
 
 class Command(BaseCommand):
-    """Django command to pause database until get database"""
+    """Django command to pause execution until the database is available"""
+    help = 'Wait for the database, and optionally other backends, to be ready'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Alias of the database to wait for'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait overall before giving up'
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.1,
+            help='Upper bound of the first retry delay in seconds'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound of any retry delay in seconds'
+        )
+        parser.add_argument(
+            '--migrations', action='store_true',
+            help='Also wait until all migrations are applied'
+        )
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Also check that the configured caches are reachable'
+        )
+        parser.add_argument(
+            '--storage', action='store_true',
+            help='Also check that the default file storage is reachable'
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write("Waiting for database ...")
-        db_conn = None
-        while not db_conn:
+        self.options = options
+        self.deadline = time.monotonic() + options['timeout']
+        connection = connections[options['database']]
+
+        self.wait('Database', lambda: self.check_database(connection),
+                  (OperationalError,))
+        if options['migrations']:
+            self.wait('Migrations', lambda: self.check_migrations(connection),
+                      (OperationalError,))
+        if options['cache']:
+            self.wait('Cache', self.check_cache, (Exception,))
+        if options['storage']:
+            self.wait('Storage', self.check_storage, (Exception,))
+
+    def wait(self, name, check, errors):
+        """Run check until it passes, backing off exponentially with jitter"""
+        self.stdout.write(f'Waiting for {name.lower()} ...')
+        attempt = 0
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS('Database available!'))
+                check()
+                break
+            except (NotReady, *errors) as exc:
+                error = exc
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise CommandError(
+                    f'{name} unavailable after {self.options["timeout"]}s: '
+                    f'{error}'
+                )
+            # Full jitter keeps containers started together from retrying
+            # in lockstep.
+            delay = random.uniform(0, min(
+                self.options['max_delay'],
+                self.options['initial_delay'] * 2 ** attempt
+            ))
+            delay = min(delay, remaining)
+            self.stdout.write(
+                f'{name} unavailable, waiting {delay:.2f} seconds...'
+            )
+            time.sleep(delay)
+            attempt += 1
+        self.stdout.write(self.style.SUCCESS(f'{name} available!'))
+
+    def check_database(self, connection):
+        """Run a trivial query, dropping the connection if it failed"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except OperationalError:
+            # A restarted server leaves a dead connection behind; drop it so
+            # the next attempt reconnects.
+            if not connection.in_atomic_block:
+                connection.close()
+            raise
+
+    def check_migrations(self, connection):
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if plan:
+            raise NotReady(f'{len(plan)} unapplied migrations')
+
+    def check_cache(self):
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            key = f'wait_for_db:{random.getrandbits(32)}'
+            cache.set(key, 1, timeout=10)
+            if cache.get(key) != 1:
+                raise NotReady(f'cache "{alias}" did not store a value')
+            cache.delete(key)
+
+    def check_storage(self):
+        if not default_storage.exists(''):
+            raise NotReady('media root does not exist')
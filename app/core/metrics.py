@@ -0,0 +1,70 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, \
+                              Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+
+# With PROMETHEUS_MULTIPROC_DIR set, every worker process writes its samples
+# to memory-mapped files in that directory and the collector sums them, so
+# any worker can answer a scrape for the whole server.
+MULTIPROCESS = bool(
+    os.environ.get('PROMETHEUS_MULTIPROC_DIR') or
+    os.environ.get('prometheus_multiproc_dir')
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ['route', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests served by route and status',
+    ['route', 'method', 'status']
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being served',
+    multiprocess_mode='livesum'
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request',
+    'SQL queries issued per request by route',
+    ['route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+DB_TIME = Counter(
+    'db_query_seconds_total',
+    'Time spent in SQL queries by route',
+    ['route']
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total',
+    'Cache lookups by cache alias and result',
+    ['cache', 'result']
+)
+
+
+def observe_request(route, method, status, request_metrics):
+    """Record the cost of a finished request"""
+    REQUEST_LATENCY.labels(route, method).observe(request_metrics.total_time)
+    REQUESTS.labels(route, method, str(status)).inc()
+    DB_QUERIES.labels(route).observe(request_metrics.query_count)
+    DB_TIME.labels(route).inc(request_metrics.db_time)
+
+
+def observe_cache_lookup(cache, hit):
+    """Record a cache hit or miss"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def render():
+    """Return the exposition text aggregated across worker processes"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+
+from core import aio, instrumentation, metrics as prometheus, profiling
+
+
+logger = logging.getLogger('core.instrumentation')
+
+
+UNRESOLVED = '<unresolved>'
+
+
+def route_name(request):
+    """Return the URL name of the resolved view
+
+    Unresolved requests, e.g. 404s, share one name so that random paths
+    don't grow the metric labels and throttle buckets without bound.
+    """
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+class InstrumentationMiddleware:
+    """Measure the query, DB, serializer and render cost of each request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django keep the middleware chain async under ASGI.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    def start(self):
+        """Start collecting the metrics of a request"""
+        metrics = instrumentation.RequestMetrics()
+        prometheus.REQUESTS_IN_FLIGHT.inc()
+        return metrics, instrumentation.current.set(metrics)
+
+    def finish(self, token):
+        instrumentation.current.reset(token)
+        prometheus.REQUESTS_IN_FLIGHT.dec()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Apply the query budget and statement timeout of the route"""
+        metrics = instrumentation.current.get()
+        if metrics is not None:
+            metrics.apply_limits(route_name(request))
+
+    def process_template_response(self, request, response):
+        """Time the deferred rendering of DRF and template responses"""
+        metrics = instrumentation.current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: metrics.add_span(
+                    'render', time.perf_counter() - start
+                )
+            )
+        return response
+
+    def report(self, request, response, metrics):
+        """Emit Server-Timing headers and structured log records"""
+        total = metrics.total_time
+        serializer = metrics.spans.get('serializer', 0.0)
+        render = metrics.spans.get('render', 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};'
+            f'desc="{metrics.query_count} queries"',
+            f'serializer;dur={serializer * 1000:.2f}',
+            f'render;dur={render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        record = {
+            'event': 'request',
+            'method': request.method,
+            'route': route_name(request),
+            'status': response.status_code,
+            'queries': metrics.query_count,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'serializer_ms': round(serializer * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        logger.info(json.dumps(record))
+        prometheus.observe_request(
+            record['route'], request.method, response.status_code, metrics
+        )
+
+        if total * 1000 >= instrumentation.get_setting('SLOW_REQUEST_MS'):
+            logger.warning(json.dumps(dict(
+                record,
+                event='slow_request',
+                sql=[
+                    {'sql': sql, 'ms': round(duration * 1000, 2)}
+                    for sql, duration in metrics.queries
+                ],
+            )))
+        for slow in metrics.slow_queries:
+            logger.warning(json.dumps(dict(
+                slow, event='slow_query', route=record['route']
+            )))
+        for sql, (count, origin) in metrics.duplicate_counts().items():
+            logger.warning(json.dumps({
+                'event': 'duplicate_query',
+                'route': record['route'],
+                'fingerprint': instrumentation.fingerprint(sql),
+                'count': count,
+                'sql': sql,
+                'origin': origin,
+            }))
+        exceeded = list(metrics.sub_budgets_exceeded)
+        if metrics.budget_exceeded:
+            exceeded.insert(0, {
+                'route': record['route'],
+                'budget': metrics.query_budget,
+                'queries': metrics.query_count,
+            })
+        for violation in exceeded:
+            logger.warning(json.dumps({
+                'event': 'query_budget_exceeded',
+                **violation,
+                'mode': instrumentation.get_setting('QUERY_BUDGET_MODE'),
+            }))
+        for timeout in metrics.timeouts:
+            logger.warning(json.dumps({
+                'event': 'statement_timeout',
+                'route': record['route'],
+                'timeout_ms': metrics.statement_timeout,
+                **timeout,
+            }))
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff users sending the profiling header
+
+    The profile and the SQL of the request are saved as a zip linked by
+    the X-Profile-Url header. Other requests only cost a header lookup.
+    Under ASGI the work of async views is profiled on their worker threads.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = profiling.header_key()
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        value = request.META.get(self.header)
+        if value is None or profiling.staff_user(request) is None:
+            return self.get_response(request)
+
+        session, token = self.start(request, value)
+        try:
+            with session.thread():
+                response = self.get_response(request)
+        finally:
+            self.finish(session, token)
+        return self.attach(request, response, session.save(response))
+
+    async def __acall__(self, request):
+        value = request.META.get(self.header)
+        if value is None or await aio.database_sync_to_async(
+            profiling.staff_user
+        )(request) is None:
+            return await self.get_response(request)
+
+        session, token = self.start(request, value)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(session, token)
+        profile_id = await sync_to_async(
+            session.save, thread_sensitive=False
+        )(response)
+        return self.attach(request, response, profile_id)
+
+    def start(self, request, value):
+        """Start profiling request as asked by the header value"""
+        session = profiling.Session(request, *profiling.parse_header(value))
+        metrics = instrumentation.current.get()
+        if metrics is not None:
+            metrics.profile = session
+        session.start()
+        return session, profiling.current.set(session)
+
+    def finish(self, session, token):
+        profiling.current.reset(token)
+        session.stop()
+        metrics = instrumentation.current.get()
+        if metrics is not None:
+            metrics.profile = None
+
+    def attach(self, request, response, profile_id):
+        response['X-Profile-Id'] = str(profile_id)
+        response['X-Profile-Url'] = request.build_absolute_uri(
+            reverse('profile', args=[profile_id])
+        )
+        return response
+
+
+class RateLimitMiddleware:
+    """Send the RateLimit headers of the most limiting throttle bucket"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        results = getattr(request, 'rate_limits', None)
+        if results:
+            result = min(results, key=lambda result: result.remaining)
+            response['RateLimit-Limit'] = str(result.limit)
+            response['RateLimit-Remaining'] = str(result.remaining)
+            response['RateLimit-Reset'] = str(math.ceil(result.reset))
+        return response
@@ -0,0 +1,63 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+import core.ranking
+
+
+def rank_existing_links(apps, schema_editor):
+    """Give pre-existing links distinct ranks that keep their id order"""
+    CategoryProduct = apps.get_model('core', 'CategoryProduct')
+    links = CategoryProduct.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        batch = list(links.filter(id__gt=last_id).order_by('id')[:1000])
+        if not batch:
+            break
+        for link in batch:
+            link.position = core.ranking.rank_for_id(link.id)
+        links.bulk_update(batch, ['position'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_product_image'),
+    ]
+
+    operations = [
+        # The auto-created core_category_products table is reused as is, so
+        # only Django's view of it changes here.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='CategoryProduct',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Category')),
+                        ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Product')),
+                    ],
+                    options={
+                        'db_table': 'core_category_products',
+                        'ordering': ('position', 'id'),
+                        'unique_together': {('category', 'product')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='category',
+                    name='products',
+                    field=models.ManyToManyField(through='core.CategoryProduct', to='core.Product'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='categoryproduct',
+            name='position',
+            field=models.CharField(default=core.ranking.append_rank, max_length=255),
+        ),
+        migrations.RunPython(rank_existing_links, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='categoryproduct',
+            index=models.Index(fields=['category', 'position'], name='core_catprod_position_idx'),
+        ),
+    ]
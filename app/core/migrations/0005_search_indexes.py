@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# Admin prefix searches compile to UPPER(column) LIKE 'TERM%'; the
+# pattern_ops operator class lets a btree serve them under any collation.
+INDEXES = (
+    ('core_category_name_upper_idx', 'core_category', 'name'),
+    ('core_category_persian_upper_idx', 'core_category', 'persian_title'),
+    ('core_product_name_upper_idx', 'core_product', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'(UPPER({column}) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoryproduct',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='categoryproduct',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.product'),
+        ),
+    ]
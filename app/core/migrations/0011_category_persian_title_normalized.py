@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+# Persian title searches moved to persian_title_normalized.
+def drop_upper_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS core_category_persian_upper_idx'
+    )
+
+
+def create_upper_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_category_persian_upper_idx '
+        'ON core_category (UPPER(persian_title) text_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_categoryproduct_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='persian_title_normalized',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'persian_title_normalized'], name='core_category_persian_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['persian_title_normalized'], name='core_category_persian_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(drop_upper_index, create_upper_index),
+    ]
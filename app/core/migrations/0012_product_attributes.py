@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+# jsonb_path_ops serves the @> containment filters with a smaller index
+# than the default operator class. SQLite shards filter without one.
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_product_attributes_idx '
+        'ON core_product USING gin (attributes jsonb_path_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_product_attributes_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_category_persian_title_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='attributes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
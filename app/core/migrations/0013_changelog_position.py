@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+def position_existing_changes(apps, schema_editor):
+    # Cursors handed out so far are ids, which stay valid as positions.
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeLog.objects.using(schema_editor.connection.alias).update(
+        position=models.F('id')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_attributes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='core_changelog_user_idx',
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='position',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            position_existing_changes, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='changelog',
+            name='position',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['user', 'position'], name='core_changelog_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(condition=models.Q(('position__isnull', True)), fields=['id'], name='core_changelog_unsequenced_idx'),
+        ),
+    ]
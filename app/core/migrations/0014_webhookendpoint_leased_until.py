@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_changelog_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookendpoint',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,37 @@
+import hashlib
+import json
+import math
+import secrets
+import time
 import uuid
 import os
-from django.db import models
+from django.db import models, connections, router, transaction
+from django.db.models import Q
+from django.db.models.fields.json import KeyTransform
+from django.db.models.signals import m2m_changed
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                        PermissionsMixin
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from PIL import Image
+
+from core import persian, ranking, sharding
+from core.hashers import make_passwords
+from core.images import METADATA_FIELDS, image_metadata
+from core.signals import bulk_deleted, bulk_updated
+
+
+BULK_DELETE_BATCH_SIZE = 1000
+BULK_CREATE_BATCH_SIZE = 1000
+PRODUCT_IMAGE_DIR = 'uploads/product/'
+
+
+def sharded_path(directory, filename):
+    """Return directory/ab/cd/filename, sharded on the filename hash"""
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return os.path.join(directory, digest[:2], digest[2:4], filename)
 
 
 def product_image_file_path(instance, filename):
@@ -11,7 +39,33 @@ def product_image_file_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
 
-    return os.path.join('uploads/product/', filename)
+    return sharded_path(PRODUCT_IMAGE_DIR, filename)
+
+
+def _delete_rows(using, model, column, ids):
+    """Delete rows of model whose column is in ids with one statement"""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(column)} IN ({placeholders})',
+            list(ids)
+        )
+        return cursor.rowcount
+
+
+def _delete_catalog(using, user_id):
+    """Delete the catalog rows of a user without sending signals"""
+    with transaction.atomic(using=using):
+        for model, owner in reversed(CATALOG_MODELS):
+            # _raw_delete() is a single DELETE, skipping the collector and
+            # with it the change log, the rows still exist on another shard.
+            model.objects.using(using).filter(
+                **{owner: user_id}
+            )._raw_delete(using)
+
 
 # Create your models here.
 class UserManager(BaseUserManager):
@@ -19,7 +73,9 @@ class UserManager(BaseUserManager):
         """Creates and save new user"""
         if not email:
             raise ValueError('User must have an email address')
-        user = self.model(email=self.normalize_email(email), **extra_fields)
+        email = self.normalize_email(email)
+        extra_fields.setdefault('shard', sharding.pick_shard(email))
+        user = self.model(email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
@@ -32,47 +88,762 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def bulk_create_users(self, users, processes=None,
+                          batch_size=BULK_CREATE_BATCH_SIZE):
+        """Create users from (email, password, name) rows in bulk
+
+        Emails that are already taken are skipped. Hashing dominates the
+        cost of provisioning, so passwords are hashed across processes.
+        """
+        rows = {}
+        for email, password, name in users:
+            if not email:
+                raise ValueError('User must have an email address')
+            rows.setdefault(self.normalize_email(email), (password, name))
+
+        emails = list(rows)
+        existing = set()
+        for start in range(0, len(emails), batch_size):
+            existing.update(self.filter(
+                email__in=emails[start:start + batch_size]
+            ).values_list('email', flat=True))
+        emails = [email for email in emails if email not in existing]
+
+        passwords = make_passwords(
+            [rows[email][0] for email in emails], processes
+        )
+        return self.bulk_create([
+            self.model(
+                email=email, name=rows[email][1], password=password,
+                shard=sharding.pick_shard(email)
+            )
+            for email, password in zip(emails, passwords)
+        ], batch_size=batch_size)
+
+    def delete_with_catalog(self, user, batch_size=BULK_DELETE_BATCH_SIZE):
+        """Delete a user, removing their catalog in set-based batches"""
+        using = user.shard
+        Category.objects.db_manager(using).delete_trees(
+            'user_id = %s', [user.pk], batch_size=batch_size
+        )
+        through = Category.products.through
+        products = Product.objects.using(using).filter(user_id=user.pk)
+        while True:
+            with transaction.atomic(using=using):
+                ids = list(
+                    products.order_by('pk').values_list('pk', flat=True)
+                    [:batch_size]
+                )
+                if not ids:
+                    break
+                _delete_rows(using, through, 'product_id', ids)
+                _delete_rows(using, Product, 'id', ids)
+                bulk_deleted.send(
+                    sender=Product, ids=ids, user_ids=[user.pk] * len(ids),
+                    using=using
+                )
+        # Only a handful of rows still reference the user at this point, so
+        # the regular collector is cheap for whatever remains.
+        user.delete(using=self.db)
+
+    def move_to_shard(self, user, target, drain=0,
+                      batch_size=BULK_CREATE_BATCH_SIZE):
+        """Move the catalog of a user to another shard while online
+
+        Writes of the user are refused while the rows are copied, reads
+        are served by the old shard until the user is switched over. drain
+        is the time requests started before each step need to finish,
+        writes are waited for exactly on PostgreSQL shards. Returns the
+        number of rows moved.
+        """
+        source = user.shard
+        if source == target:
+            return 0
+        self.filter(pk=user.pk).update(moving_to=target)
+        # Writes check moving_to after taking the catalog lock shared, so
+        # those that missed it are in flight and hold the lock.
+        with transaction.atomic(using=source):
+            fenced = sharding.lock_catalog(source, user.pk)
+        if not fenced:
+            time.sleep(drain)
+        try:
+            with transaction.atomic(using=target):
+                # Leftovers of an interrupted move are copied again.
+                _delete_catalog(target, user.pk)
+                moved = 0
+                for model, owner in CATALOG_MODELS:
+                    rows = model.objects.using(source).filter(
+                        **{owner: user.pk}
+                    ).order_by('pk')
+                    copied = 0
+                    last = None
+                    while True:
+                        batch = rows if last is None else \
+                            rows.filter(pk__gt=last)
+                        batch = list(batch[:batch_size])
+                        if not batch:
+                            break
+                        model.objects.using(target).bulk_create(batch)
+                        copied += len(batch)
+                        last = batch[-1].pk
+                    if copied != rows.count():
+                        raise RuntimeError(
+                            f'{model.__name__} rows changed during the move'
+                        )
+                    moved += copied
+        except Exception:
+            self.filter(pk=user.pk).update(moving_to='')
+            raise
+
+        self.filter(pk=user.pk).update(shard=target, moving_to='')
+        user.shard, user.moving_to = target, ''
+        time.sleep(drain)
+        _delete_catalog(source, user.pk)
+        return moved
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length=255, unique=True)
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Database alias holding the user's catalog, see core.sharding.
+    shard = models.CharField(max_length=64, default='default')
+    # Set while rebalance_shards copies the catalog, writes are refused.
+    moving_to = models.CharField(max_length=64, blank=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
+
+class CategoryQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Fill in the normalized persian titles"""
+        objs = list(objs)
+        for obj in objs:
+            obj.normalize_persian_title()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def filter_persian_title(self, title=None, prefix=None):
+        """Match persian titles exactly or by prefix, whatever variants"""
+        queryset = self
+        if title is not None:
+            queryset = queryset.filter(
+                persian_title_normalized=persian.normalize(title)
+            )
+        if prefix is not None:
+            queryset = queryset.filter(
+                persian_title_normalized__startswith=persian.normalize(prefix)
+            )
+        return queryset
+
+
+class CategoryManager(models.Manager.from_queryset(CategoryQuerySet)):
+    def creates_cycle(self, category, parent):
+        """Return True if placing category under parent would form a cycle"""
+        if parent is None:
+            return False
+        if parent.pk == category.pk:
+            return True
+        # Walk up from the new parent in a single recursive query; UNION
+        # (rather than UNION ALL) keeps it terminating on corrupt trees.
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH RECURSIVE ancestors(id, parent_category_id) AS (
+                    SELECT id, parent_category_id FROM {table}
+                    WHERE id = %s
+                    UNION
+                    SELECT c.id, c.parent_category_id FROM {table} c
+                    INNER JOIN ancestors a ON c.id = a.parent_category_id
+                )
+                SELECT 1 FROM ancestors WHERE id = %s
+                ''',
+                [parent.pk, category.pk]
+            )
+            return cursor.fetchone() is not None
+
+    def move(self, category, parent):
+        """Move category, and with it its whole subtree, under parent"""
+        users = router.db_for_write(User)
+        with transaction.atomic(using=self.db), \
+                transaction.atomic(using=users):
+            # Moves are serialized per owner so two concurrent moves can
+            # not each pass the cycle check and together form a loop.
+            owners = User.objects.db_manager(users).select_for_update()
+            owners.only('pk').get(pk=category.user_id)
+            if parent is not None and parent.user_id != category.user_id:
+                raise ValueError('Cannot move category under another user')
+            if self.creates_cycle(category, parent):
+                raise ValueError(
+                    'Cannot move category into its own subtree'
+                )
+            # Descendants reference their parent by id, so relocating the
+            # subtree is a single row update regardless of its size.
+            category.parent_category = parent
+            category.save(using=self.db, update_fields=['parent_category'])
+        return category
+
+    def subtree_rows(self, where, params):
+        """Return (id, user_id) rows of the matching trees, deepest first"""
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH RECURSIVE subtree(id, user_id, depth) AS (
+                    SELECT id, user_id, 0 FROM {table} WHERE {where}
+                    UNION
+                    SELECT c.id, c.user_id, s.depth + 1 FROM {table} c
+                    INNER JOIN subtree s ON c.parent_category_id = s.id
+                )
+                SELECT id, user_id FROM subtree
+                GROUP BY id, user_id
+                ORDER BY MAX(depth) DESC, id
+                ''',
+                params
+            )
+            return cursor.fetchall()
+
+    def delete_trees(self, where, params, batch_size=BULK_DELETE_BATCH_SIZE):
+        """Delete the trees rooted at matching rows in set-based batches"""
+        using = self.db
+        rows = self.subtree_rows(where, params)
+        through = self.model.products.through
+        # Deepest rows go first, so every committed batch leaves no child
+        # pointing at an already deleted parent.
+        for start in range(0, len(rows), batch_size):
+            ids, user_ids = zip(*rows[start:start + batch_size])
+            with transaction.atomic(using=using):
+                _delete_rows(using, through, 'category_id', ids)
+                _delete_rows(using, self.model, 'id', ids)
+                bulk_deleted.send(
+                    sender=self.model, ids=list(ids),
+                    user_ids=list(user_ids), using=using
+                )
+        return len(rows)
+
+    def delete_subtree(self, category, batch_size=BULK_DELETE_BATCH_SIZE):
+        """Delete category with all its descendants and product links"""
+        return self.delete_trees('id = %s', [category.pk], batch_size)
+
+
 class Category(models.Model):
     """Category object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False
     )
     name = models.CharField(max_length=255)
     persian_title = models.CharField(max_length=255)
+    # persian_title in the form it is matched and sorted by.
+    persian_title_normalized = models.CharField(
+        max_length=255, editable=False, default=''
+    )
     parent_category = models.ForeignKey(
         'self'
         ,null=True, blank=True,
         on_delete=models.CASCADE
     )
-    products = models.ManyToManyField('Product')
-    
+    products = models.ManyToManyField('Product', through='CategoryProduct')
+
+    objects = CategoryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'persian_title_normalized'],
+                name='core_category_persian_idx'
+            ),
+            # Serves prefix matches under any database collation, also
+            # across users in the admin.
+            models.Index(
+                fields=['persian_title_normalized'],
+                name='core_category_persian_like_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalize_persian_title()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'persian_title' in update_fields:
+            kwargs['update_fields'] = {
+                *update_fields, 'persian_title_normalized'
+            }
+        super().save(*args, **kwargs)
+
+    def normalize_persian_title(self):
+        self.persian_title_normalized = persian.normalize(self.persian_title)
+
+    def ordered_products(self):
+        """Return linked products in their merchandised order"""
+        # The owner lets partitioned tables scan one partition each.
+        return self.products.filter(
+            user_id=self.user_id, categoryproduct__user_id=self.user_id
+        ).order_by('categoryproduct__position', 'categoryproduct__id')
+
+    def set_products(self, products):
+        """Link exactly products, appending new ones in the given order"""
+        wanted = list(dict.fromkeys(product.pk for product in products))
+        links = CategoryProduct.objects.filter(
+            user_id=self.user_id, category=self
+        )
+        links.exclude(product_id__in=wanted).delete()
+        existing = set(
+            links.filter(product_id__in=wanted)
+            .values_list('product_id', flat=True)
+        )
+        added = [pk for pk in wanted if pk not in existing]
+        CategoryProduct.objects.bulk_create([
+            CategoryProduct(category=self, product_id=pk, user_id=self.user_id)
+            for pk in added
+        ])
+        # bulk_create skips the signal the related manager would have sent.
+        if added:
+            m2m_changed.send(
+                sender=CategoryProduct, instance=self, action='post_add',
+                reverse=False, model=Product, pk_set=set(added),
+                using=self._state.db
+            )
+
+
+def attribute_values(value):
+    """Return the JSON values a query string attribute value matches"""
+    values = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return values
+    # Integers too large for a float can't be passed to isfinite().
+    if isinstance(parsed, float) and not math.isfinite(parsed):
+        return values
+    if isinstance(parsed, (bool, int, float)):
+        values.append(parsed)
+    return values
+
+
+class ProductQuerySet(models.QuerySet):
+    def filter_attributes(self, attributes):
+        """Keep products having one of the given values of every attribute
+
+        attributes maps names to values as sent in a query string, which
+        also match the numbers and booleans they spell.
+        """
+        queryset = self
+        # Containment is served by the GIN index, SQLite shards lack it.
+        contains = connections[self.db].features.supports_json_field_contains
+        for index, (name, values) in enumerate(attributes.items()):
+            candidates = [
+                candidate for value in values
+                for candidate in attribute_values(value)
+            ]
+            if contains:
+                condition = Q()
+                for candidate in candidates:
+                    condition |= Q(attributes__contains={name: candidate})
+            else:
+                alias = f'attribute_{index}'
+                queryset = queryset.alias(
+                    **{alias: KeyTransform(name, 'attributes')}
+                )
+                condition = Q(**{f'{alias}__in': candidates})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def facets(self):
+        """Return the product count per value of every attribute
+
+        Counted in one aggregate query over the matching products, values
+        of an attribute come most frequent first.
+        """
+        sql, params = self.order_by().values('attributes').query \
+            .sql_with_params()
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql':
+            pairs = 'jsonb_each_text(product.attributes) AS attr(key, value)'
+        else:
+            pairs = 'json_each(product.attributes) AS attr'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                SELECT attr.key, attr.value, COUNT(*)
+                FROM ({sql}) AS product CROSS JOIN {pairs}
+                GROUP BY attr.key, attr.value
+                ORDER BY attr.key, COUNT(*) DESC, attr.value
+                ''',
+                params
+            )
+            rows = cursor.fetchall()
+        facets = {}
+        for name, value, count in rows:
+            facets.setdefault(name, {})[str(value)] = count
+        return facets
+
+
 class Product(models.Model):
     """Product existing in a category"""
     name = models.CharField(max_length=255)
     description = models.CharField(max_length=2000)
+    # Flat name to value pairs, e.g. {"brand": "Acme", "size": 42}.
+    attributes = models.JSONField(default=dict, blank=True)
     image = models.ImageField(null=True, upload_to=product_image_file_path)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=16, null=True, blank=True)
+    image_size = models.PositiveBigIntegerField(null=True, blank=True)
+    image_placeholder = models.TextField(null=True, blank=True)
+    image_color = models.CharField(max_length=7, null=True, blank=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False
     )
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def set_image_metadata(self, f):
+        """Fill the image metadata fields from the image file f"""
+        for field, value in image_metadata(f).items():
+            setattr(self, field, value)
+
+
+class CategoryProductQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Fill in the owner of links created without one"""
+        objs = list(objs)
+        # Related managers, like category.products.add(), create links
+        # from the two foreign keys only.
+        missing = {obj.category_id for obj in objs if obj.user_id is None}
+        if missing:
+            owners = dict(
+                Category.objects.using(self.db).filter(pk__in=missing)
+                .values_list('pk', 'user_id')
+            )
+            for obj in objs:
+                if obj.user_id is None:
+                    obj.user_id = owners.get(obj.category_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class CategoryProductManager(
+        models.Manager.from_queryset(CategoryProductQuerySet)):
+    def move_after(self, category, product_id, after_id=None):
+        """Place a product right after another one, or first if None"""
+        with transaction.atomic(using=self.db):
+            links = self.filter(user_id=category.user_id, category=category)
+            link = links.select_for_update().get(product_id=product_id)
+            others = links.exclude(pk=link.pk).order_by('position', 'id')
+            before = None
+            if after_id is not None:
+                before, before_id = links.values_list('position', 'id').get(
+                    product_id=after_id
+                )
+                others = others.filter(
+                    Q(position__gt=before) |
+                    Q(position=before, id__gt=before_id)
+                )
+            after = others.values_list('position', flat=True).first()
+            # Only the moved link is written, whatever the category size.
+            link.position = ranking.rank_between(before, after)
+            if len(link.position) <= ranking.MAX_LENGTH:
+                link.save(update_fields=['position'])
+                return link
+
+            # Ranks grew too long at this spot, respace the whole category.
+            ids = list(
+                links.exclude(pk=link.pk).select_for_update()
+                .order_by('position', 'id').values_list('id', flat=True)
+            )
+            ids.insert(ids.index(before_id) + 1 if before else 0, link.pk)
+            respaced = [
+                CategoryProduct(pk=pk, position=position)
+                for pk, position in zip(ids, ranking.spaced_ranks(len(ids)))
+            ]
+            links.bulk_update(respaced, ['position'], batch_size=1000)
+            bulk_updated.send(
+                sender=Category, ids=[category.pk],
+                user_ids=[category.user_id], using=self.db
+            )
+            link.position = respaced[ids.index(link.pk)].position
+        return link
+
+
+class CategoryProduct(models.Model):
+    """Product placed at a sortable position within a category"""
+    category = models.ForeignKey('Category', on_delete=models.CASCADE)
+    # Partitioned tables are referenced by (product_id, user_id), see the
+    # partition_tables command.
+    product = models.ForeignKey(
+        'Product', on_delete=models.CASCADE, db_constraint=False
+    )
+    # Owner of the category, the partition key of the link table.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        null=True,
+        editable=False
+    )
+    position = models.CharField(
+        max_length=255, default=ranking.append_rank
+    )
+
+    objects = CategoryProductManager()
+
+    class Meta:
+        db_table = 'core_category_products'
+        ordering = ('position', 'id')
+        unique_together = (('category', 'product'),)
+        indexes = [
+            models.Index(
+                fields=['category', 'position'],
+                name='core_catprod_position_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.category_id}:{self.product_id}@{self.position}'
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.category.user_id
+        super().save(*args, **kwargs)
+
+
+# Advisory lock key serializing the change log sequencers on PostgreSQL.
+CHANGELOG_SEQUENCE_LOCK = 0x636c6f67
+
+
+class ChangeLogManager(models.Manager):
+    def sequence(self):
+        """Give committed changes their positions, in commit order
+
+        Ids are taken when rows are inserted, so a transaction still in
+        flight can commit a lower id after a reader saw a higher one.
+        Positions are only handed out to changes visible, i.e. committed,
+        by one sequencer at a time, so a reader past a position never
+        misses a change committed later. Returns False if another
+        sequencer is running, which covers the changes committed so far.
+        """
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT pg_try_advisory_xact_lock(%s)',
+                    [CHANGELOG_SEQUENCE_LOCK]
+                )
+                if not cursor.fetchone()[0]:
+                    return False
+            # Other databases serialize writers, the update included.
+            cursor.execute("""
+                UPDATE core_changelog SET position = numbered.position
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY id) + (
+                        SELECT COALESCE(MAX(position), 0) FROM core_changelog
+                    ) AS position
+                    FROM core_changelog WHERE position IS NULL
+                ) AS numbered
+                WHERE core_changelog.id = numbered.id
+            """)
+        return True
+
+
+class ChangeLog(models.Model):
+    """Change to a catalog object, replayed by clients to stay in sync
+
+    Readers page through the changes by position, see
+    ChangeLogManager.sequence().
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    )
+    CATEGORY = 'category'
+    PRODUCT = 'product'
+    MODEL_CHOICES = (
+        (CATEGORY, 'Category'),
+        (PRODUCT, 'Product'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    position = models.BigIntegerField(
+        null=True, unique=True, editable=False
+    )
+
+    objects = ChangeLogManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'position'], name='core_changelog_user_idx'
+            ),
+            models.Index(
+                fields=['id'], name='core_changelog_unsequenced_idx',
+                condition=Q(position__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.action} {self.model}:{self.object_id}'
+
+
+def latest_change_id():
+    """Return the position of the newest change, the cursor of new webhooks"""
+    ChangeLog.objects.sequence()
+    return ChangeLog.objects.aggregate(
+        latest=models.Max('position')
+    )['latest'] or 0
+
+
+def webhook_secret():
+    """Return a new random signing secret"""
+    return secrets.token_hex(32)
+
+
+class WebhookEndpoint(models.Model):
+    """Downstream URL notified of the catalog changes in the change log
+
+    cursor is the last change delivered, so the change log doubles as the
+    outbox and endpoints registered later only get newer changes.
+    """
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, default=webhook_secret)
+    is_active = models.BooleanField(default=True)
+    cursor = models.BigIntegerField(default=latest_change_id)
+    failures = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # Set while a deliver_webhooks worker posts to the endpoint.
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.url
+
+
+class ChunkedUpload(models.Model):
+    """Product image uploaded in resumable, offset addressed chunks"""
+    CHUNK_READ_SIZE = 64 * 1024
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False
+    )
+    product = models.ForeignKey(
+        'Product', on_delete=models.CASCADE, db_constraint=False
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.filename} {self.offset}/{self.size}'
+
+    @property
+    def path(self):
+        """Return where the received bytes are kept until completion"""
+        return os.path.join(settings.CHUNKED_UPLOAD_ROOT, f'{self.id}.part')
+
+    def write_chunk(self, stream):
+        """Append stream at the current offset and return the new offset
+
+        The chunk is copied in small blocks, so it is never held in memory
+        as a whole. Bytes past the declared size are rejected.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            # Drop bytes of an earlier chunk that failed before the offset
+            # was recorded.
+            f.truncate(self.offset)
+            remaining = self.size - self.offset
+            while True:
+                block = stream.read(min(self.CHUNK_READ_SIZE, remaining + 1))
+                if not block:
+                    break
+                if len(block) > remaining:
+                    f.truncate(self.offset)
+                    raise ValueError('Chunk exceeds the declared upload size')
+                f.write(block)
+                remaining -= len(block)
+            self.offset = f.tell()
+        return self.offset
+
+    def verify(self):
+        """Return True if the received file matches the declared checksum"""
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(self.CHUNK_READ_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest() == self.checksum.lower()
+
+    def is_image(self):
+        """Return True if the received file is an image Pillow can read"""
+        try:
+            with Image.open(self.path) as image:
+                image.verify()
+        except Exception:
+            return False
+        return True
+
+    def attach(self):
+        """Move the completed file into media storage as the product image"""
+        with open(self.path, 'rb') as f:
+            self.product.set_image_metadata(f)
+        field = Product._meta.get_field('image')
+        name = field.generate_filename(self.product, self.filename)
+        storage = field.storage
+        if isinstance(storage, FileSystemStorage):
+            name = storage.get_available_name(name)
+            target = storage.path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self.path, target)
+        else:
+            with open(self.path, 'rb') as f:
+                name = storage.save(name, File(f))
+            os.remove(self.path)
+        self.product.image = name
+        self.product.save(update_fields=['image', *METADATA_FIELDS])
+        self.completed_at = timezone.now()
+        self.save(update_fields=['completed_at'])
+
+    def discard(self):
+        """Remove the received bytes and restart from offset zero"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.offset = 0
+
 
+# Sharded catalog models and their owner lookup, parents first.
+CATALOG_MODELS = (
+    (Product, 'user_id'),
+    (Category, 'user_id'),
+    (CategoryProduct, 'category__user_id'),
+    (ChunkedUpload, 'user_id'),
+)
@@ -0,0 +1,366 @@
+from django.db import NotSupportedError, transaction
+
+
+# Catalog tables hash partitioned by owner, so user scoped queries scan a
+# single partition. The link table carries the owner of its category.
+TABLES = ('core_product', 'core_category_products')
+KEY = 'user_id'
+# Foreign keys to a partitioned table have to include its partition key.
+REFERENCES = (
+    ('core_category_products', 'product_id', 'core_product'),
+    ('core_chunkedupload', 'product_id', 'core_product'),
+)
+MIN_VERSION = 120000
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def check_support(connection):
+    """Raise NotSupportedError if connection can't partition the tables"""
+    if connection.vendor != 'postgresql':
+        raise NotSupportedError('Partitioning needs PostgreSQL')
+    # Foreign keys referencing partitioned tables came with PostgreSQL 12.
+    if connection.pg_version < MIN_VERSION:
+        raise NotSupportedError('Partitioning needs PostgreSQL 12 or newer')
+
+
+def is_partitioned(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [table]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def shadow(table):
+    """Return the name of the partitioned copy of table"""
+    return f'{table}_partitioned'
+
+
+def renamed(name, suffix):
+    """Return name with suffix, within the identifier length limit"""
+    return f'{name[:62 - len(suffix)]}_{suffix}'
+
+
+def _rows(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def _names(cursor, table):
+    """Return the constraints and the other indexes of table"""
+    constraints = [row[0] for row in _rows(
+        cursor,
+        'SELECT conname FROM pg_constraint '
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')",
+        [table]
+    )]
+    indexes = [row[0] for row in _rows(
+        cursor,
+        'SELECT index.relname FROM pg_index '
+        'JOIN pg_class index ON index.oid = indexrelid '
+        'WHERE indrelid = %s::regclass AND NOT EXISTS ('
+        'SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)',
+        [table]
+    )]
+    return constraints, indexes
+
+
+def backfill_owners(connection, batch_size):
+    """Copy the owner of categories to their links, yield rows per batch"""
+    quote = connection.ops.quote_name
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            ids = [row[0] for row in _rows(
+                cursor,
+                'SELECT id FROM core_category_products '
+                f'WHERE {quote(KEY)} IS NULL AND id > %s '
+                'ORDER BY id LIMIT %s',
+                [last_id, batch_size]
+            )]
+            if not ids:
+                return
+            cursor.execute(
+                f'UPDATE core_category_products AS link '
+                f'SET {quote(KEY)} = category.user_id '
+                'FROM core_category AS category '
+                'WHERE category.id = link.category_id AND link.id = ANY(%s)',
+                [ids]
+            )
+        last_id = ids[-1]
+        yield len(ids)
+
+
+def create_shadow(connection, table, partitions):
+    """Create the partitioned copy of table, kept in sync by triggers
+
+    Everything is created in one transaction, so an existing copy is
+    complete. Returns False if it existed already.
+    """
+    quote = connection.ops.quote_name
+    new = shadow(table)
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        if _rows(cursor, 'SELECT to_regclass(%s)', [new])[0][0]:
+            return False
+        cursor.execute(
+            f'CREATE TABLE {quote(new)} (LIKE {quote(table)} '
+            'INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+            f'PARTITION BY HASH ({quote(KEY)})'
+        )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                f'PARTITION OF {quote(new)} '
+                f'FOR VALUES WITH (MODULUS {partitions:d}, '
+                f'REMAINDER {remainder:d})'
+            )
+        copy_indexes(cursor, quote, table, new)
+
+        columns = [row[0] for row in _rows(
+            cursor,
+            'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass '
+            'AND attnum > 0 AND NOT attisdropped ORDER BY attnum',
+            [table]
+        )]
+        updates = ', '.join(
+            f'{quote(column)} = EXCLUDED.{quote(column)}'
+            for column in columns if column not in ('id', KEY)
+        )
+        # Rows written while the table is copied reach the copy through
+        # the trigger, the copy skips rows already there.
+        cursor.execute(
+            f'CREATE FUNCTION {quote(f"{table}_sync")}() '
+            'RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+            "IF TG_OP <> 'INSERT' THEN "
+            f'DELETE FROM {quote(new)} WHERE id = OLD.id '
+            f'AND {quote(KEY)} = OLD.{quote(KEY)} '
+            f'AND (TG_OP = \'DELETE\' OR {quote(KEY)} <> NEW.{quote(KEY)}); '
+            'END IF; '
+            "IF TG_OP = 'DELETE' THEN RETURN OLD; END IF; "
+            f'INSERT INTO {quote(new)} SELECT (NEW).* '
+            f'ON CONFLICT (id, {quote(KEY)}) DO UPDATE SET {updates}; '
+            'RETURN NEW; END $$'
+        )
+        cursor.execute(
+            f'CREATE TRIGGER {quote(f"{table}_sync")} '
+            f'AFTER INSERT OR UPDATE OR DELETE ON {quote(table)} '
+            f'FOR EACH ROW EXECUTE PROCEDURE {quote(f"{table}_sync")}()'
+        )
+        if table == 'core_category_products':
+            # Links written by code unaware of the owner still get one.
+            cursor.execute(
+                'CREATE FUNCTION core_category_products_owner() '
+                'RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+                f'IF NEW.{quote(KEY)} IS NULL THEN '
+                f'NEW.{quote(KEY)} := (SELECT user_id FROM core_category '
+                'WHERE id = NEW.category_id); END IF; '
+                'RETURN NEW; END $$'
+            )
+            cursor.execute(
+                'CREATE TRIGGER core_category_products_owner '
+                'BEFORE INSERT OR UPDATE ON core_category_products '
+                'FOR EACH ROW EXECUTE PROCEDURE '
+                'core_category_products_owner()'
+            )
+    return True
+
+
+def copy_indexes(cursor, quote, table, new):
+    """Create the indexes and constraints of table on new, renamed
+
+    Unique keys get the partition key added, which keeps them unique as
+    every row has a single owner. Foreign keys to partitioned tables are
+    added when the tables are swapped.
+    """
+    for name, kind, definition in _rows(
+        cursor,
+        'SELECT conname, contype, pg_get_constraintdef(oid) '
+        'FROM pg_constraint WHERE conrelid = %s::regclass '
+        "AND contype IN ('p', 'u', 'f') "
+        'AND confrelid <> ALL(%s::regclass[])',
+        [table, list(TABLES)]
+    ):
+        if kind in ('p', 'u'):
+            definition = f'{definition[:-1]}, {quote(KEY)})'
+        cursor.execute(
+            f'ALTER TABLE {quote(new)} ADD CONSTRAINT '
+            f'{quote(renamed(name, "p"))} {definition}'
+        )
+    for name in _names(cursor, table)[1]:
+        definition = _rows(
+            cursor, 'SELECT pg_get_indexdef(%s::regclass)', [name]
+        )[0][0]
+        if definition.startswith('CREATE UNIQUE'):
+            raise NotSupportedError(f'Unique index {name} lacks the owner')
+        cursor.execute(
+            f'CREATE INDEX {quote(renamed(name, "p"))} '
+            f'ON {quote(new)} USING {definition.split(" USING ", 1)[1]}'
+        )
+
+
+def copy_rows(connection, table, batch_size):
+    """Copy table to its partitioned copy in id order, yield rows per batch
+
+    The last copied id is kept in the comment of the copy, so an
+    interrupted copy resumes where it stopped.
+    """
+    quote = connection.ops.quote_name
+    new = shadow(table)
+    with connection.cursor() as cursor:
+        last_id = int(_rows(
+            cursor, 'SELECT obj_description(%s::regclass, %s)',
+            [new, 'pg_class']
+        )[0][0] or 0)
+    while True:
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            count, batch_last = _rows(
+                cursor,
+                f'WITH batch AS (SELECT * FROM {quote(table)} '
+                'WHERE id > %s ORDER BY id LIMIT %s), '
+                f'copied AS (INSERT INTO {quote(new)} SELECT * FROM batch '
+                'ON CONFLICT DO NOTHING) '
+                'SELECT COUNT(*), MAX(id) FROM batch',
+                [last_id, batch_size]
+            )[0]
+            if not count:
+                return
+            cursor.execute(
+                f"COMMENT ON TABLE {quote(new)} IS '{int(batch_last):d}'"
+            )
+        last_id = batch_last
+        yield count
+
+
+def drop_deleted(cursor, quote, table):
+    """Delete the rows of the copy of table that are gone from table
+
+    A row deleted while its batch was copied is deleted from the copy by
+    the trigger before the batch inserts it there.
+    """
+    new = shadow(table)
+    cursor.execute(
+        f'DELETE FROM {quote(new)} AS new WHERE NOT EXISTS '
+        f'(SELECT FROM {quote(table)} AS old '
+        f'WHERE old.id = new.id AND old.{KEY} = new.{KEY})'
+    )
+
+
+def swap(connection):
+    """Replace the tables with their partitioned copies in one transaction
+
+    The old tables are kept as <table>_unpartitioned.
+    """
+    quote = connection.ops.quote_name
+    referencing = sorted({table for table, _, _ in REFERENCES} - set(TABLES))
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        # Deferred checks still pending would block the ALTER TABLEs.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            'LOCK TABLE ' +
+            ', '.join(quote(table) for table in (*TABLES, *referencing)) +
+            ' IN ACCESS EXCLUSIVE MODE'
+        )
+        for table in TABLES:
+            drop_deleted(cursor, quote, table)
+            old, new = _rows(
+                cursor,
+                f'SELECT (SELECT COUNT(*) FROM {quote(table)}), '
+                f'(SELECT COUNT(*) FROM {quote(shadow(table))})'
+            )[0]
+            if old != new:
+                raise PartitioningError(
+                    f'{shadow(table)} has {new} rows instead of {old}, '
+                    'copy the rows again'
+                )
+
+        for table, name in _rows(
+            cursor,
+            'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+            'WHERE confrelid = ANY(%s::regclass[])',
+            [list(TABLES)]
+        ):
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(name)}'
+            )
+        cursor.execute(
+            'DROP TRIGGER IF EXISTS core_category_products_owner '
+            'ON core_category_products'
+        )
+        cursor.execute(
+            'DROP FUNCTION IF EXISTS core_category_products_owner()'
+        )
+
+        for table in TABLES:
+            new = shadow(table)
+            old = renamed(table, 'unpartitioned')
+            cursor.execute(f'DROP TRIGGER {quote(f"{table}_sync")} '
+                           f'ON {quote(table)}')
+            cursor.execute(f'DROP FUNCTION {quote(f"{table}_sync")}()')
+            sequence = _rows(
+                cursor, 'SELECT pg_get_serial_sequence(%s, %s)', [table, 'id']
+            )[0][0]
+            # Old names move aside, so migrations find the new ones.
+            constraints, indexes = _names(cursor, table)
+            for name in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} RENAME CONSTRAINT '
+                    f'{quote(name)} TO {quote(renamed(name, "old"))}'
+                )
+            for name in indexes:
+                cursor.execute(
+                    f'ALTER INDEX {quote(name)} '
+                    f'RENAME TO {quote(renamed(name, "old"))}'
+                )
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}'
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(new)} RENAME TO {quote(table)}'
+            )
+            cursor.execute(f'COMMENT ON TABLE {quote(table)} IS NULL')
+            for name in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} RENAME CONSTRAINT '
+                    f'{quote(renamed(name, "p"))} TO {quote(name)}'
+                )
+            for name in indexes:
+                cursor.execute(
+                    f'ALTER INDEX {quote(renamed(name, "p"))} '
+                    f'RENAME TO {quote(name)}'
+                )
+            if sequence:
+                cursor.execute(
+                    f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id'
+                )
+
+        for table, column, target in REFERENCES:
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ADD CONSTRAINT '
+                f'{quote(renamed(f"{table}_{column}_{KEY}", "fk"))} '
+                f'FOREIGN KEY ({quote(column)}, {quote(KEY)}) '
+                f'REFERENCES {quote(target)} (id, {quote(KEY)}) '
+                'DEFERRABLE INITIALLY DEFERRED'
+            )
+    for table in TABLES:
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {quote(table)}')
+
+
+def drop_unpartitioned(connection):
+    """Drop the tables left by swap()"""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for table in reversed(TABLES):
+            cursor.execute(
+                'DROP TABLE IF EXISTS '
+                f'{quote(renamed(table, "unpartitioned"))}'
+            )
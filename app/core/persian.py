@@ -0,0 +1,33 @@
+import re
+
+
+# Arabic code points typed for their Persian look-alikes, and the digits of
+# both scripts, mapped to one form.
+_VARIANTS = {
+    'ي': 'ی',
+    'ى': 'ی',
+    'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    'ؤ': 'و',
+}
+_VARIANTS.update(zip('٠١٢٣٤٥٦٧٨٩', '0123456789'))
+_VARIANTS.update(zip('۰۱۲۳۴۵۶۷۸۹', '0123456789'))
+# Dropped: diacritics, tatweel and zero width joiners and direction marks,
+# so words written with and without a ZWNJ compare equal.
+_IGNORED = (
+    [chr(code) for code in range(0x064B, 0x0660)] +
+    ['\u0670', '\u0640', '\u200c', '\u200d', '\u200e', '\u200f', '\ufeff']
+)
+TRANSLATION = str.maketrans({**_VARIANTS, **dict.fromkeys(_IGNORED)})
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Return text in the form persian titles are matched and sorted by"""
+    return _SPACES.sub(' ', text.translate(TRANSLATION)).strip().casefold()
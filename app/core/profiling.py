@@ -0,0 +1,267 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+DEFAULTS = {
+    'HEADER': 'X-Profile',
+    'ROOT': '/vol/web/profiles',
+    'MAX_AGE': 7 * 24 * 60 * 60,
+    'SAMPLE_INTERVAL_MS': 5,
+    'TOP_FUNCTIONS': 50,
+    'TOP_ALLOCATIONS': 25,
+}
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+MEMORY = 'memory'
+
+current = contextvars.ContextVar('profile', default=None)
+# tracemalloc is process wide, so one request tracks memory at a time.
+_memory_lock = threading.Lock()
+
+
+def get_setting(name):
+    """Return a profiling setting, falling back to its default"""
+    return getattr(settings, 'PROFILING', {}).get(name, DEFAULTS[name])
+
+
+def header_key():
+    """Return the request.META key of the profiling header"""
+    return 'HTTP_' + get_setting('HEADER').upper().replace('-', '_')
+
+
+def staff_user(request):
+    """Return the token user of request if they are staff, else None"""
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    if result is None or not result[0].is_staff:
+        return None
+    return result[0]
+
+
+def parse_header(value):
+    """Return the profiler and whether to track memory from the header
+
+    e.g. "sample, memory", the profiler defaults to cProfile.
+    """
+    options = {option.strip().lower() for option in value.split(',')}
+    mode = SAMPLE if SAMPLE in options else CPROFILE
+    return mode, MEMORY in options
+
+
+def artifact_path(profile_id):
+    return os.path.join(get_setting('ROOT'), f'{profile_id}.zip')
+
+
+def profiled(func):
+    """Profile func on the thread running it when its request is profiled
+
+    Async views run their work on worker threads, which the profiler of
+    the request thread doesn't see.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = current.get()
+        if session is None:
+            return func(*args, **kwargs)
+        with session.thread():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class Sampler:
+    """Sample the stacks of registered threads at a fixed interval"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    @contextmanager
+    def thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame):
+        """Return the stack of frame in the collapsed flame graph format"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f'{code.co_name} '
+                f'({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            )
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+class Session:
+    """Profile of a single request, saved as a zip artifact"""
+
+    def __init__(self, request, mode, memory):
+        self.id = uuid.uuid4()
+        self.request = request
+        self.mode = mode
+        self.memory = memory
+        self.profiles = []
+        self.sampler = None
+        self.queries = []
+        self.started = self.finished = None
+        self._local = threading.local()
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == SAMPLE:
+            self.sampler = Sampler(get_setting('SAMPLE_INTERVAL_MS') / 1000)
+            self.sampler.start()
+        # Skipped while another request tracks memory.
+        self.memory = self.memory and _memory_lock.acquire(blocking=False)
+        if self.memory:
+            self._was_tracing = tracemalloc.is_tracing()
+            if not self._was_tracing:
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self.finished = time.perf_counter()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.memory:
+            self._allocations = tracemalloc.take_snapshot().compare_to(
+                self._snapshot, 'lineno'
+            )
+            if not self._was_tracing:
+                tracemalloc.stop()
+            _memory_lock.release()
+
+    @contextmanager
+    def thread(self):
+        """Profile the enclosed code on the current thread"""
+        if getattr(self._local, 'active', False):
+            # A nested profiler would replace the enclosing one.
+            yield
+            return
+        self._local.active = True
+        try:
+            if self.sampler is not None:
+                with self.sampler.thread():
+                    yield
+                return
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self.profiles.append(profile)
+        finally:
+            self._local.active = False
+
+    def record_query(self, sql, params, many, duration):
+        self.queries.append({
+            'sql': sql,
+            'params': params,
+            'many': many,
+            'ms': round(duration * 1000, 3),
+        })
+
+    def save(self, response):
+        """Write the artifact and return its id"""
+        files = {
+            'request.json': json.dumps({
+                'method': self.request.method,
+                'path': self.request.get_full_path(),
+                'status': response.status_code,
+                'profiler': self.mode,
+                'total_ms': round((self.finished - self.started) * 1000, 2),
+                'queries': len(self.queries),
+                'db_ms': round(sum(q['ms'] for q in self.queries), 3),
+            }, indent=2),
+            'sql.json': json.dumps(self.queries, indent=2, default=str),
+        }
+        top = get_setting('TOP_FUNCTIONS')
+        if self.mode == SAMPLE:
+            files['profile.collapsed'] = ''.join(
+                f'{stack} {count}\n'
+                for stack, count in self.sampler.stacks.most_common()
+            )
+        elif self.profiles:
+            stats = pstats.Stats(*self.profiles, stream=io.StringIO())
+            # Loadable with pstats or snakeviz, like cProfile -o output.
+            files['profile.prof'] = marshal.dumps(stats.stats)
+            stats.sort_stats('cumulative').print_stats(top)
+            files['profile.txt'] = stats.stream.getvalue()
+        if self.memory:
+            files['memory.txt'] = ''.join(
+                f'{stat}\n'
+                for stat in self._allocations[:get_setting('TOP_ALLOCATIONS')]
+            )
+
+        root = get_setting('ROOT')
+        os.makedirs(root, exist_ok=True)
+        prune(root)
+        path = artifact_path(self.id)
+        with zipfile.ZipFile(path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as f:
+            for name, content in files.items():
+                f.writestr(name, content)
+        os.replace(path + '.tmp', path)
+        return self.id
+
+
+def prune(root):
+    """Remove artifacts older than MAX_AGE"""
+    expired = time.time() - get_setting('MAX_AGE')
+    for entry in os.scandir(root):
+        try:
+            if entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+
+
+# Ranks are strings over these digits compared lexicographically, so a new
+# rank can always be made between two neighbours without touching any other
+# row. Ranks never end in the lowest digit, which keeps room below each one.
+RANK_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+RANK_BASE = len(RANK_DIGITS)
+# Inserts at the same spot make ranks longer; past this length the ranks of
+# the list are respaced. Well below the 255 characters of the column.
+MAX_LENGTH = 128
+
+_lock = threading.Lock()
+_last_micros = 0
+
+
+def encode(number, width):
+    """Encode a non-negative integer as a fixed width rank string"""
+    digits = []
+    while number:
+        number, digit = divmod(number, RANK_BASE)
+        digits.append(RANK_DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(width, RANK_DIGITS[0])
+
+
+def rank_for_id(pk):
+    """Return a rank ordering pre-existing rows by id before new ones"""
+    return f'l{encode(pk, 11)}i'
+
+
+def _next_micros():
+    """Return a strictly increasing microsecond timestamp"""
+    global _last_micros
+    with _lock:
+        _last_micros = max(int(time.time() * 1e6), _last_micros + 1)
+        return _last_micros
+
+
+def _tail():
+    """Return a random suffix so ranks from different processes never tie"""
+    return encode(random.randrange(RANK_BASE ** 3), 3) + 'i'
+
+
+def append_rank():
+    """Return a rank sorting after every rank appended before it"""
+    return f't{encode(_next_micros(), 11)}{_tail()}'
+
+
+def prepend_rank():
+    """Return a rank sorting before every rank prepended before it"""
+    return f'd{encode(RANK_BASE ** 11 - _next_micros(), 11)}{_tail()}'
+
+
+def spaced_ranks(count):
+    """Return count short, evenly spaced ranks in increasing order
+
+    They sort after prepended and before appended ranks.
+    """
+    step = RANK_BASE ** 2
+    return [f'm{encode((i + 1) * step, 11)}i' for i in range(count)]
+
+
+def rank_between(before, after):
+    """Return a rank sorting strictly between before and after
+
+    Either bound may be None, meaning the start or the end of the list.
+    """
+    # Moves to either end use time based ranks, so repeatedly moving items
+    # to the top or bottom does not make ranks grow longer.
+    if before is None and after is not None:
+        rank = prepend_rank()
+        if rank < after:
+            return rank
+    if after is None and before is not None:
+        rank = append_rank()
+        if rank > before:
+            return rank
+    before = before or ''
+    if after is not None and after <= before:
+        # Tied neighbours leave no gap; fall back to right after before.
+        after = None
+    return _midpoint(before, after)
+
+
+def _midpoint(before, after):
+    """Return the shortest rank between before and after (None is the end)"""
+    if after is not None:
+        prefix = 0
+        while prefix < len(after) and \
+                (before[prefix:prefix + 1] or RANK_DIGITS[0]) == \
+                after[prefix]:
+            prefix += 1
+        if prefix:
+            return after[:prefix] + _midpoint(
+                before[prefix:], after[prefix:]
+            )
+    low = RANK_DIGITS.index(before[0]) if before else 0
+    high = RANK_DIGITS.index(after[0]) if after is not None else RANK_BASE
+    if high - low > 1:
+        return RANK_DIGITS[(low + high) // 2]
+    if after is not None and len(after) > 1:
+        return after[0]
+    return RANK_DIGITS[low] + _midpoint(before[1:], None)
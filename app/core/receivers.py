@@ -0,0 +1,139 @@
+import os
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+                                     pre_delete
+from django.dispatch import receiver
+
+from core.models import Category, CategoryProduct, ChangeLog, \
+    ChunkedUpload, Product, User
+from core.signals import bulk_deleted, bulk_updated
+
+
+MODEL_NAMES = {
+    Category: ChangeLog.CATEGORY,
+    Product: ChangeLog.PRODUCT,
+}
+
+
+def _log(using, model, action, pairs):
+    """Record an action for (object_id, user_id) pairs in one insert
+
+    The change log is not sharded, so it goes to the default database
+    whichever shard using is.
+    """
+    ChangeLog.objects.bulk_create([
+        ChangeLog(
+            user_id=user_id, model=model, object_id=object_id, action=action
+        )
+        for object_id, user_id in pairs
+    ])
+
+
+def _log_category_updates(using, category_ids):
+    """Record categories whose product links changed"""
+    pairs = Category.objects.using(using).filter(
+        id__in=category_ids
+    ).values_list('id', 'user_id')
+    _log(using, ChangeLog.CATEGORY, ChangeLog.UPDATE, pairs)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def log_saved(sender, instance, created, using, raw=False, **kwargs):
+    """Record a created or updated catalog object"""
+    if raw:
+        return
+    action = ChangeLog.CREATE if created else ChangeLog.UPDATE
+    _log(using, MODEL_NAMES[sender], action, [(instance.pk, instance.user_id)])
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def log_deleted(sender, instance, using, **kwargs):
+    """Record a tombstone for a deleted catalog object"""
+    _log(
+        using, MODEL_NAMES[sender], ChangeLog.DELETE,
+        [(instance.pk, instance.user_id)]
+    )
+
+
+@receiver(bulk_deleted, sender=Category)
+@receiver(bulk_deleted, sender=Product)
+def log_bulk_deleted(sender, ids, user_ids, using, **kwargs):
+    """Record tombstones for a batch removed by the set-based delete path"""
+    _log(using, MODEL_NAMES[sender], ChangeLog.DELETE, zip(ids, user_ids))
+
+
+@receiver(bulk_updated, sender=Category)
+@receiver(bulk_updated, sender=Product)
+def log_bulk_updated(sender, ids, user_ids, using, **kwargs):
+    """Record updates of a batch written without post_save"""
+    _log(using, MODEL_NAMES[sender], ChangeLog.UPDATE, zip(ids, user_ids))
+
+
+@receiver(pre_delete, sender=Product)
+def log_product_unlinked(sender, instance, using, **kwargs):
+    """Record categories about to lose a product being deleted"""
+    _log_category_updates(
+        using,
+        CategoryProduct.objects.using(using).filter(
+            product_id=instance.pk
+        ).values('category_id')
+    )
+
+
+@receiver(post_save, sender=CategoryProduct)
+def log_link_saved(sender, instance, using, raw=False, **kwargs):
+    """Record a category whose product link was added or repositioned"""
+    if not raw:
+        _log_category_updates(using, [instance.category_id])
+
+
+@receiver(m2m_changed, sender=CategoryProduct)
+def log_links_changed(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """Record categories whose product links were added or removed"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _log_category_updates(using, [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _log_category_updates(using, pk_set)
+    elif action == 'pre_clear':
+        # The affected categories are only known before the links go.
+        _log_category_updates(
+            using,
+            CategoryProduct.objects.using(using).filter(
+                product_id=instance.pk
+            ).values('category_id')
+        )
+
+
+@receiver(post_delete, sender=ChunkedUpload)
+def remove_upload_file(sender, instance, using, **kwargs):
+    """Remove the received bytes of a deleted upload once committed"""
+    # The collector clears the primary key the path is named after.
+    path = instance.path
+
+    def remove():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    transaction.on_commit(remove, using=using)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_catalog(sender, instance, using, **kwargs):
+    """Delete the catalog of a user kept on another shard"""
+    if instance.shard != using:
+        ChunkedUpload.objects.using(instance.shard).filter(
+            user_id=instance.pk
+        ).delete()
+        Category.objects.using(instance.shard).filter(
+            user_id=instance.pk
+        ).delete()
+        Product.objects.using(instance.shard).filter(
+            user_id=instance.pk
+        ).delete()
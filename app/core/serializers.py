@@ -0,0 +1,36 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from core import batch
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializer for a request in a batch"""
+    method = serializers.ChoiceField(
+        choices=('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+    )
+    url = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_url(self, value):
+        """Only allow API routes, and not nested batches"""
+        if not value.startswith('/api/') or \
+                value.startswith(reverse('batch')):
+            raise serializers.ValidationError(
+                'Only API routes can be batched.'
+            )
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for a batch of requests"""
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    concurrent = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        limit = batch.get_setting('MAX_REQUESTS')
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'Ensure there are at most {limit} requests.'
+            )
+        return value
@@ -0,0 +1,151 @@
+import contextvars
+import hashlib
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+from rest_framework import exceptions, status
+
+
+# Models stored on the shard of their owner, everything else lives on the
+# default database. Shards carry the full schema, unused tables stay empty.
+SHARDED_MODELS = ('category', 'product', 'categoryproduct', 'chunkedupload')
+# Shards allocate AutoField ids from disjoint ranges, so rows keep their id
+# when their owner moves to another shard.
+MAX_SHARDS = 16
+ID_RANGE = 2 ** 31 // MAX_SHARDS
+
+# Advisory lock class of the catalogs of users, see lock_catalog().
+CATALOG_LOCK = 0x63617467
+
+current = contextvars.ContextVar('shard', default=None)
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your catalog is being moved, try again shortly.'
+    default_code = 'shard_moving'
+
+
+def get_shards():
+    """Return the database aliases holding catalog data, default first"""
+    return getattr(settings, 'SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def pick_shard(email):
+    """Return the shard a user belongs on
+
+    Rendezvous hashing only moves the users of one shard in every
+    len(shards) when a shard is added.
+    """
+    email = email.lower().encode()
+    return max(
+        get_shards(),
+        key=lambda alias: hashlib.md5(alias.encode() + b':' + email).digest()
+    )
+
+
+def is_sharded(model):
+    return (model._meta.app_label == 'core' and
+            model._meta.model_name in SHARDED_MODELS)
+
+
+def shard_of(user_id):
+    """Return the shard of a user by id"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    return User.objects.values_list('shard', flat=True).get(pk=user_id)
+
+
+def lock_catalog(alias, user_id, shared=False):
+    """Lock the catalog of a user on shard alias until the transaction ends
+
+    Writes take the lock shared, moves exclusively to wait for the writes
+    in flight. Returns False on databases without advisory locks.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+    function = 'pg_advisory_xact_lock_shared' if shared else \
+        'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(%s, %s)', [CATALOG_LOCK, user_id])
+    return True
+
+
+@contextmanager
+def use_shard(alias):
+    """Route catalog queries without an instance to alias"""
+    token = current.set(alias)
+    try:
+        yield alias
+    finally:
+        current.reset(token)
+
+
+class ShardRouter:
+    """Route catalog models to the shard of their owner
+
+    The shard comes from the instance a query starts from, then from
+    use_shard(), set by the API views for the requesting user, then from
+    the owner of a new instance. Other queries go to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            # Even when reached from a sharded instance, like category.user.
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None:
+            if not is_sharded(type(instance)):
+                # Related managers of a user, like user.category_set.
+                return getattr(instance, 'shard', None)
+            if instance._state.db is not None:
+                return instance._state.db
+        shard = current.get()
+        if shard is None and getattr(instance, 'user_id', None) is not None:
+            shard = shard_of(instance.user_id)
+        return shard
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not (is_sharded(type(obj1)) and is_sharded(type(obj2))):
+            return True
+        return obj1._state.db == obj2._state.db
+
+
+def reserve_id_range(using, **kwargs):
+    """Start the id sequences of a shard in its own range"""
+    if using not in get_shards():
+        return
+    start = get_shards().index(using) * ID_RANGE
+    if not start:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    for model in apps.get_app_config('core').get_models():
+        pk = model._meta.pk
+        if not is_sharded(model) or not isinstance(pk, models.AutoField):
+            continue
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT MAX({quote(pk.column)}) FROM {quote(table)}'
+            )
+            if (cursor.fetchone()[0] or 0) >= start:
+                continue
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT setval(pg_get_serial_sequence(%s, %s), %s, false)',
+                    [table, pk.column, start]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'DELETE FROM sqlite_sequence WHERE name = %s', [table]
+                )
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, start - 1]
+                )
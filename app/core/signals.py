@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+
+# Sent once per batch by the set-based delete paths in place of the
+# per-instance pre_delete/post_delete signals, which would require loading
+# every row. Receivers get ``ids`` (the deleted primary keys), ``user_ids``
+# (the owner of each deleted row, in the same order) and ``using``.
+bulk_deleted = Signal()
+
+# Sent once per batch by paths writing rows with bulk_update(), which sends
+# no post_save. Receivers get ``ids`` (the updated primary keys),
+# ``user_ids`` (the owner of each row, in the same order) and ``using``.
+bulk_updated = Signal()
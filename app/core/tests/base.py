@@ -0,0 +1,17 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase, TransactionTestCase, override_settings
+
+
+# Users hash to the default database only, so the catalog tests can query
+# without a shard whatever DB_SHARDS holds. test_sharding covers the rest.
+single_shard = override_settings(SHARDS=[DEFAULT_DB_ALIAS])
+
+
+@single_shard
+class CatalogTestCase(TestCase):
+    databases = '__all__'
+
+
+@single_shard
+class CatalogTransactionTestCase(TransactionTestCase):
+    databases = '__all__'
@@ -1,9 +1,17 @@
-from django.test import TestCase, Client
+from unittest.mock import patch
+
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator
+from core.models import Category, Product
+from core.tests.base import CatalogTestCase
+
 
-class AdminSiteTest(TestCase):
+class AdminSiteTest(CatalogTestCase):
     def setUp(self):
         self.client = Client()
         self.admin_user = get_user_model().objects.create_superuser(
@@ -38,3 +46,123 @@ class AdminSiteTest(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+class CatalogAdminTests(CatalogTestCase):
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="amin_mohammadi05@yahoo.com",
+            password="password123"
+        )
+        self.client.force_login(self.admin_user)
+
+    def create_categories(self, count):
+        parent = Category.objects.create(
+            user=self.admin_user, name='Root', persian_title='p'
+        )
+        for i in range(count):
+            parent = Category.objects.create(
+                user=self.admin_user, name=f'Category {i}', persian_title='p',
+                parent_category=parent
+            )
+        return parent
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(queries)
+
+    def test_category_changelist_query_count(self):
+        """Test the changelist query count does not grow with rows"""
+        url = reverse('admin:core_category_changelist')
+        self.create_categories(2)
+        few = self.count_queries(url)
+        self.create_categories(10)
+
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_category_change_page_lists_linked_products_only(self):
+        """Test the change form does not render every product"""
+        category = self.create_categories(1)
+        linked = Product.objects.create(user=self.admin_user, name='Linked')
+        unlinked = Product.objects.create(user=self.admin_user, name='Other')
+        category.set_products([linked])
+        url = reverse('admin:core_category_change', args=[category.id])
+        self.client.get(url)
+        few = self.count_queries(url)
+        category.set_products([linked] + [
+            Product.objects.create(user=self.admin_user, name=f'P{i}')
+            for i in range(10)
+        ])
+
+        self.assertEqual(self.count_queries(url), few)
+        res = self.client.get(url)
+        self.assertContains(res, f'<option value="{linked.id}" selected>')
+        self.assertNotContains(res, f'<option value="{unlinked.id}"')
+
+    def test_category_change_saves_products(self):
+        """Test saving the change form links the selected products"""
+        category = self.create_categories(0)
+        product = Product.objects.create(user=self.admin_user, name='Salt')
+        url = reverse('admin:core_category_change', args=[category.id])
+
+        res = self.client.post(url, {
+            'user': self.admin_user.id,
+            'name': 'Spices',
+            'persian_title': 'p',
+            'parent_category': '',
+            'products': [product.id],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(category.ordered_products()), [product])
+
+    def test_category_change_rejects_other_users_products(self):
+        """Test the change form only links products of the owner"""
+        category = self.create_categories(0)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        product = Product.objects.create(user=other, name='Salt')
+        url = reverse('admin:core_category_change', args=[category.id])
+
+        res = self.client.post(url, {
+            'user': self.admin_user.id,
+            'name': 'Spices',
+            'persian_title': 'p',
+            'parent_category': '',
+            'products': [product.id],
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('products', res.context['adminform'].form.errors)
+        self.assertFalse(category.products.exists())
+
+    def test_product_search_by_prefix(self):
+        """Test products are searched by name prefix"""
+        Product.objects.create(user=self.admin_user, name='Cinnamon')
+        Product.objects.create(user=self.admin_user, name='Sea salt')
+        url = reverse('admin:core_product_changelist')
+
+        res = self.client.get(url, {'q': 'cinn'})
+
+        self.assertContains(res, 'Cinnamon')
+        self.assertNotContains(res, 'Sea salt')
+
+    @patch('core.admin.ESTIMATED_COUNT_THRESHOLD', 1)
+    def test_estimated_count_paginator(self):
+        """Test unfiltered changelists use the planner row estimate"""
+        for i in range(3):
+            Product.objects.create(user=self.admin_user, name=f'P{i}')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_product')
+
+        paginator = EstimatedCountPaginator(Product.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+
+        filtered = Product.objects.filter(name='P1')
+        self.assertEqual(EstimatedCountPaginator(filtered, 10).count, 1)
@@ -0,0 +1,212 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from category.views import CategoryViewSet
+from core.models import Category, Product
+from core.tests.base import CatalogTestCase, CatalogTransactionTestCase
+
+
+BATCH_URL = reverse('batch')
+ME_URL = reverse('user:me')
+CATEGORIES_URL = reverse('category:category-list')
+PRODUCTS_URL = reverse('category:product-list')
+MILK = {'name': 'Milk', 'description': 'Whole milk'}
+
+
+def detail_url(category_id):
+    return reverse('category:category-detail', args=[category_id])
+
+
+class BatchSetupMixin:
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123',
+            name='amin'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.product = Product.objects.create(user=self.user, name='Tea')
+        self.category = Category.objects.create(
+            user=self.user, name='Drinks', persian_title='p'
+        )
+
+    def home_screen(self):
+        return [
+            {'method': 'GET', 'url': ME_URL},
+            {'method': 'GET', 'url': CATEGORIES_URL},
+            {'method': 'GET', 'url': detail_url(self.category.id)},
+            {'method': 'GET', 'url': PRODUCTS_URL + '?assigned_only=0'},
+        ]
+
+
+class BatchApiTests(BatchSetupMixin, CatalogTestCase):
+    """Test the batch endpoint"""
+
+    def test_batch_requires_authentication(self):
+        """Test that authentication is required for batches"""
+        res = APIClient().post(BATCH_URL, {
+            'requests': [{'method': 'GET', 'url': ME_URL}]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_batch_matches_separate_requests(self):
+        """Test each result is what the request would return on its own"""
+        requests = self.home_screen()
+        expected = [self.client.get(request['url']) for request in requests]
+
+        res = self.client.post(
+            BATCH_URL, {'requests': requests}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), len(requests))
+        for result, response in zip(res.json(), expected):
+            self.assertEqual(result['status'], response.status_code)
+            self.assertEqual(result['body'], response.json())
+
+    def test_batch_authenticates_once(self):
+        """Test the token is looked up once for the whole batch"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                BATCH_URL, {'requests': self.home_screen()}, format='json'
+            )
+
+        token_queries = [query for query in queries.captured_queries
+                         if 'authtoken_token' in query['sql']]
+        self.assertEqual(len(token_queries), 1)
+
+    def test_batch_writes_in_order(self):
+        """Test writes run in order, with errors reported per request"""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'url': PRODUCTS_URL, 'body': MILK},
+            {'method': 'POST', 'url': PRODUCTS_URL, 'body': {'name': ''}},
+            {'method': 'GET', 'url': PRODUCTS_URL},
+            {'method': 'GET', 'url': '/api/missing/'},
+        ]}, format='json')
+
+        statuses = [result['status'] for result in res.data]
+        self.assertEqual(statuses, [201, 400, 200, 404])
+        self.assertEqual(
+            [product['name'] for product in res.data[2]['body']],
+            ['Tea', 'Milk']
+        )
+
+    def test_batch_rejects_other_routes(self):
+        """Test only API routes can be batched, and not batches"""
+        for url in ('/admin/', '/metrics', BATCH_URL):
+            res = self.client.post(BATCH_URL, {
+                'requests': [{'method': 'GET', 'url': url}]
+            }, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH={'MAX_REQUESTS': 2})
+    def test_batch_size_limited(self):
+        """Test batches over MAX_REQUESTS are rejected"""
+        res = self.client.post(
+            BATCH_URL, {'requests': self.home_screen()}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INSTRUMENTATION={
+        'DEFAULT_QUERY_BUDGET': 10,
+        'QUERY_BUDGET_MODE': 'strict',
+    })
+    def test_sub_requests_budgeted_separately(self):
+        """Test each sub-request gets a budget instead of the whole batch"""
+        res = self.client.post(
+            BATCH_URL, {'requests': self.home_screen() * 5}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual({result['status'] for result in res.data}, {200})
+
+    @override_settings(INSTRUMENTATION={
+        'QUERY_BUDGETS': {'category:category-list': 1},
+    })
+    def test_sub_request_budget_logged(self):
+        """Test sub-requests over the budget of their route are logged"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            self.client.post(
+                BATCH_URL, {'requests': self.home_screen()}, format='json'
+            )
+
+        records = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        exceeded, = [r for r in records
+                     if r['event'] == 'query_budget_exceeded']
+        self.assertEqual(exceeded['route'], 'category:category-list')
+        self.assertEqual(exceeded['budget'], 1)
+
+    @override_settings(ROOT_URLCONF='app.asgi_urls', INSTRUMENTATION={
+        'QUERY_BUDGETS': {'category:category-list': 1},
+    })
+    def test_batch_under_asgi_urlconf(self):
+        """Test sub-requests of async routes run with their route limits"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            res = self.client.post(
+                BATCH_URL, {'requests': self.home_screen()}, format='json'
+            )
+
+        self.assertEqual([result['status'] for result in res.data],
+                         [200, 200, 200, 200])
+        self.assertEqual(res.data[1]['body'][0]['id'], self.category.id)
+        records = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        exceeded, = [r for r in records
+                     if r['event'] == 'query_budget_exceeded']
+        self.assertEqual(exceeded['route'], 'category:category-list')
+
+
+class ConcurrentBatchApiTests(BatchSetupMixin, CatalogTransactionTestCase):
+    """Test batches with concurrent sub-requests"""
+
+    def test_concurrent_batch(self):
+        """Test concurrent results keep the order of the requests"""
+        requests = self.home_screen()
+        requests.insert(2, {
+            'method': 'POST', 'url': PRODUCTS_URL, 'body': MILK
+        })
+        requests.append({'method': 'GET', 'url': PRODUCTS_URL})
+
+        res = self.client.post(BATCH_URL, {
+            'requests': requests, 'concurrent': True
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in res.data],
+            [200, 200, 201, 200, 200, 200]
+        )
+        self.assertEqual(res.data[0]['body']['email'], self.user.email)
+        self.assertEqual(res.data[3]['body']['name'], 'Drinks')
+        self.assertEqual(
+            [product['name'] for product in res.data[5]['body']],
+            ['Tea', 'Milk']
+        )
+
+    def test_failed_sub_request(self):
+        """Test a sub-request raising fails alone with a server error"""
+        with patch.object(CategoryViewSet, 'retrieve',
+                          side_effect=RuntimeError), \
+                self.assertLogs('core.batch', 'ERROR'):
+            res = self.client.post(BATCH_URL, {
+                'requests': self.home_screen(), 'concurrent': True
+            }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in res.data], [200, 200, 500, 200]
+        )
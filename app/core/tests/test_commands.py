@@ -1,22 +1,298 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+
+from core.benchmark import Benchmark
+from core.models import PRODUCT_IMAGE_DIR, Category, CategoryProduct, \
+                        ChangeLog, Product, sharded_path
+from core.tests.base import CatalogTestCase
 
 
-class CommandTests(TestCase):
-    def test_wait_for_db_ready(self):
+ENSURE_CONNECTION = \
+    'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+
+
+class CommandTests(CatalogTestCase):
+    @patch('time.sleep')
+    def test_wait_for_db_ready(self, ts):
         """Test waiting for db when db is ready"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
+        with patch(ENSURE_CONNECTION) as ec:
+            call_command('wait_for_db', stdout=StringIO())
+
+            self.assertEqual(ec.call_count, 1)
+        ts.assert_not_called()
 
-            self.assertEqual(gi.call_count, 1)
-    
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Test wait for DB"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', '--max-delay', '0.5',
+                         stdout=StringIO())
+
+            self.assertEqual(ec.call_count, 6)
+        self.assertEqual(ts.call_count, 5)
+        for (delay,), _ in ts.call_args_list:
+            self.assertLessEqual(delay, 0.5)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test giving up once the timeout has passed"""
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError('down')):
+            with self.assertRaisesMessage(CommandError, 'down'):
+                call_command('wait_for_db', '--timeout', '0',
+                             stdout=StringIO())
+        ts.assert_not_called()
+
+    def test_wait_for_backends(self):
+        """Test checking migrations, cache and storage"""
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as root, \
+                self.settings(MEDIA_ROOT=root):
+            call_command('wait_for_db', '--migrations', '--cache',
+                         '--storage', stdout=out)
+
+        for name in ('Database', 'Migrations', 'Cache', 'Storage'):
+            self.assertIn(f'{name} available!', out.getvalue())
+
+    @patch('django.db.migrations.executor.MigrationExecutor.migration_plan')
+    def test_wait_for_migrations(self, plan):
+        """Test unapplied migrations keep the command waiting"""
+        plan.return_value = [('migration', False)]
+
+        with self.assertRaisesMessage(CommandError, '1 unapplied'):
+            call_command('wait_for_db', '--migrations', '--timeout', '0',
+                         stdout=StringIO())
+
+
+class ProvisionUsersCommandTests(CatalogTestCase):
+    def test_provision_users(self):
+        """Test creating users from a CSV file"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('email,password,name\n'
+                    'one@bench.example,pass123,One\n'
+                    'two@bench.example,pass456,Two\n')
+            f.flush()
+            out = StringIO()
+            call_command('provision_users', f.name, '--processes', '1',
+                         stdout=out)
+
+        self.assertIn('Created 2 users, skipped 0', out.getvalue())
+        user = get_user_model().objects.get(email='two@bench.example')
+        self.assertTrue(user.check_password('pass456'))
+
+    def test_provision_users_missing_columns(self):
+        """Test the CSV must have email and password columns"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('email,name\none@bench.example,One\n')
+            f.flush()
+            with self.assertRaisesMessage(CommandError, 'password'):
+                call_command('provision_users', f.name)
+
+
+class ShardMediaCommandTests(CatalogTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123'
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = media.name
+        settings = self.settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def product_with_image(self, name, write=True):
+        if write:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(name)
+        return Product.objects.create(user=self.user, name='P', image=name)
+
+    def test_shard_media(self):
+        """Test flat images are moved and their rows rewritten"""
+        flat = self.product_with_image('uploads/product/a.jpg')
+        missing = self.product_with_image('uploads/product/b.jpg', False)
+        sharded = sharded_path(PRODUCT_IMAGE_DIR, 'c.jpg')
+        done = self.product_with_image(sharded)
+        # A previous run moved this file but stopped before the update.
+        moved = self.product_with_image('uploads/product/d.jpg', False)
+        self.product_with_image(sharded_path(PRODUCT_IMAGE_DIR, 'd.jpg'))
+
+        out = StringIO()
+        call_command('shard_media', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Moved 2 images, 1 missing', out.getvalue())
+        for product in (flat, missing, done, moved):
+            product.refresh_from_db()
+        self.assertEqual(
+            flat.image.name, sharded_path(PRODUCT_IMAGE_DIR, 'a.jpg')
+        )
+        self.assertTrue(os.path.exists(flat.image.path))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, 'uploads/product/a.jpg'))
+        )
+        self.assertEqual(missing.image.name, 'uploads/product/b.jpg')
+        self.assertEqual(done.image.name, sharded)
+        self.assertEqual(
+            moved.image.name, sharded_path(PRODUCT_IMAGE_DIR, 'd.jpg')
+        )
+        self.assertEqual(
+            set(ChangeLog.objects.filter(
+                model=ChangeLog.PRODUCT, action=ChangeLog.UPDATE
+            ).values_list('object_id', flat=True)),
+            {flat.pk, moved.pk}
+        )
+
+
+class BackfillImageMetadataCommandTests(CatalogTestCase):
+    def test_backfill_image_metadata(self):
+        """Test metadata is computed for images that lack it"""
+        user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123'
+        )
+        with tempfile.TemporaryDirectory() as root, \
+                self.settings(MEDIA_ROOT=root):
+            Image.new('RGB', (30, 10), 'red').save(
+                os.path.join(root, 'a.png'), format='PNG'
+            )
+            product = Product.objects.create(
+                user=user, name='P', image='a.png'
+            )
+            broken = Product.objects.create(
+                user=user, name='B', image='missing.png'
+            )
+            out = StringIO()
+            call_command('backfill_image_metadata', '--processes', '2',
+                         stdout=out)
+
+        self.assertIn('Updated 1 products, 1 unreadable', out.getvalue())
+        product.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((product.image_width, product.image_height),
+                         (30, 10))
+        self.assertEqual(product.image_format, 'png')
+        self.assertEqual(product.image_color, '#ff0000')
+        self.assertIsNone(broken.image_width)
+        self.assertEqual(
+            list(ChangeLog.objects.filter(
+                model=ChangeLog.PRODUCT, action=ChangeLog.UPDATE
+            ).values_list('object_id', flat=True)),
+            [product.pk]
+        )
+
+
+class NormalizePersianTitlesCommandTests(CatalogTestCase):
+    def test_normalize_persian_titles(self):
+        """Test categories saved before the shadow column get it filled"""
+        user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123'
+        )
+        for title in ('كتاب', 'دفتر', 'قلم'):
+            Category.objects.create(user=user, name='C', persian_title=title)
+        Category.objects.update(persian_title_normalized='')
+
+        out = StringIO()
+        call_command('normalize_persian_titles', '--batch-size', '2',
+                     stdout=out)
+
+        self.assertIn('Updated 3 categories', out.getvalue())
+        self.assertEqual(
+            set(Category.objects.values_list(
+                'persian_title_normalized', flat=True
+            )),
+            {'کتاب', 'دفتر', 'قلم'}
+        )
+
+
+class BulkDeleteCommandTests(CatalogTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+
+    def test_bulk_delete_category(self):
+        """Test deleting a category subtree from the command line"""
+        root = Category.objects.create(user=self.user, name='R')
+        Category.objects.create(
+            user=self.user, name='C', parent_category=root
+        )
+
+        call_command('bulk_delete', category=root.id, batch_size=1)
+
+        self.assertFalse(Category.objects.exists())
+
+    def test_bulk_delete_user(self):
+        """Test deleting a user and their catalog from the command line"""
+        Product.objects.create(user=self.user, name='P')
+
+        call_command('bulk_delete', user=self.user.email)
+
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Product.objects.exists())
+
+    def test_bulk_delete_missing_category(self):
+        """Test deleting an unknown category fails"""
+        with self.assertRaises(CommandError):
+            call_command('bulk_delete', category=0)
+
+
+class BenchmarkCommandTests(CatalogTestCase):
+    def test_generate_catalog(self):
+        """Test generating a synthetic catalog at a given scale"""
+        call_command(
+            'generate_catalog', users=2, products=10, roots=2, depth=2,
+            fanout=3, links=4, stdout=open(os.devnull, 'w')
+        )
+
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Category.objects.count(), 2 * (2 + 2 * 3))
+        self.assertEqual(
+            Category.objects.filter(parent_category__isnull=False).count(),
+            2 * 2 * 3
+        )
+        self.assertEqual(CategoryProduct.objects.count(), 2 * 8 * 4)
+
+    def test_generate_catalog_refuses_existing_users(self):
+        """Test generating twice requires clearing the old catalog"""
+        options = {'users': 1, 'products': 1, 'stdout': open(os.devnull, 'w')}
+        call_command('generate_catalog', **options)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_catalog', **options)
+        call_command('generate_catalog', clear=True, **options)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_benchmark_saves_results(self):
+        """Test every scenario runs and results are saved as JSON"""
+        call_command(
+            'generate_catalog', users=1, products=20, roots=2, depth=2,
+            fanout=2, links=3, stdout=open(os.devnull, 'w')
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'results.json')
+            call_command(
+                'benchmark', iterations=2, warmup=0, host='testserver',
+                output=output, stdout=open(os.devnull, 'w')
+            )
+            with open(output) as results:
+                report = json.load(results)
 
+        self.assertEqual(set(report['scenarios']), set(Benchmark.SCENARIOS))
+        for result in report['scenarios'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['max_ms'])
+        # Categories created by the benchmark are removed afterwards.
+        self.assertEqual(Category.objects.count(), 2 + 2 * 2)
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.tests.base import CatalogTestCase
+
+
+METRICS_URL = reverse('metrics')
+CATEGORIES_URL = reverse('category:category-list')
+
+
+class MetricsTests(CatalogTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        """Return the metrics exposition text"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 200)
+        return res.content.decode()
+
+    def test_request_latency_by_route(self):
+        """Test latency and query counts are exposed per route"""
+        self.client.get(CATEGORIES_URL)
+
+        text = self.scrape()
+
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="category:category-list"}',
+            text
+        )
+        self.assertIn(
+            'db_queries_per_request_count{route="category:category-list"}',
+            text
+        )
+        self.assertIn('http_requests_in_flight', text)
+
+    def test_cache_lookups_counted(self):
+        """Test cache hits and misses are exposed"""
+        cache.set('metrics-test', 1)
+        cache.get('metrics-test')
+        cache.get('metrics-test-missing')
+
+        text = self.scrape()
+
+        self.assertIn(
+            'cache_lookups_total{cache="default",result="hit"}', text
+        )
+        self.assertIn(
+            'cache_lookups_total{cache="default",result="miss"}', text
+        )
+
+    def test_unresolved_paths_share_a_route(self):
+        """Test 404 paths don't each get a route label"""
+        self.client.get('/no-such-page-1f3a/')
+
+        text = self.scrape()
+
+        self.assertIn('route="<unresolved>"', text)
+        self.assertNotIn('no-such-page-1f3a', text)
@@ -0,0 +1,172 @@
+import json
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.models import Category
+from core.tests.base import CatalogTestCase
+
+
+CATEGORIES_URL = reverse('category:category-list')
+
+
+class InstrumentationMiddlewareTests(CatalogTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Category.objects.create(
+                user=self.user, name=f'Category {i}', persian_title='p'
+            )
+
+    def logged(self, logs, event):
+        """Return the logged records of an event"""
+        records = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        return [record for record in records if record['event'] == event]
+
+    def test_server_timing_header(self):
+        """Test the request cost is reported in Server-Timing"""
+        res = self.client.get(CATEGORIES_URL)
+
+        timing = res['Server-Timing']
+        for metric in ('db;dur=', 'serializer;dur=', 'render;dur=',
+                       'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_request_logged(self):
+        """Test each request emits a structured log record"""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            self.client.get(CATEGORIES_URL)
+
+        record, = self.logged(logs, 'request')
+        self.assertEqual(record['route'], 'category:category-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+
+    @override_settings(INSTRUMENTATION={'DUPLICATE_QUERY_THRESHOLD': 3})
+    def test_duplicate_queries_flagged(self):
+        """Test a query repeated per row is reported as N+1"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            self.client.get(CATEGORIES_URL)
+
+        duplicate, = self.logged(logs, 'duplicate_query')
+        self.assertEqual(duplicate['count'], 3)
+        self.assertIn('core_product', duplicate['sql'])
+
+    @override_settings(INSTRUMENTATION={
+        'SLOW_REQUEST_MS': 0, 'SLOW_QUERY_MS': 0
+    })
+    def test_slow_requests_and_queries_logged(self):
+        """Test slow requests log their SQL and slow queries their origin"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            self.client.get(CATEGORIES_URL)
+
+        slow, = self.logged(logs, 'slow_request')
+        self.assertEqual(len(slow['sql']), slow['queries'])
+        self.assertTrue(self.logged(logs, 'slow_query'))
+
+
+class QueryBudgetTests(CatalogTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            Category.objects.create(
+                user=self.user, name=f'Category {i}', persian_title='p'
+            )
+
+    @override_settings(INSTRUMENTATION={
+        'QUERY_BUDGETS': {'category:category-list': 2},
+    })
+    def test_budget_violation_logged(self):
+        """Test requests over their route's query budget are logged"""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            res = self.client.get(CATEGORIES_URL)
+
+        self.assertEqual(res.status_code, 200)
+        records = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        exceeded, = [r for r in records
+                     if r['event'] == 'query_budget_exceeded']
+        self.assertEqual(exceeded['budget'], 2)
+        self.assertGreater(exceeded['queries'], 2)
+
+    @override_settings(INSTRUMENTATION={
+        'QUERY_BUDGETS': {'category:category-list': 2},
+        'QUERY_BUDGET_MODE': 'strict',
+    })
+    def test_strict_budget_fails_request(self):
+        """Test strict mode stops the request at the query over budget"""
+        with self.assertRaises(instrumentation.QueryBudgetExceeded):
+            self.client.get(CATEGORIES_URL)
+
+    @override_settings(INSTRUMENTATION={
+        'DEFAULT_QUERY_BUDGET': 2,
+        'QUERY_BUDGETS': {'category:category-list': None},
+        'QUERY_BUDGET_MODE': 'strict',
+    })
+    def test_route_budget_overrides_default(self):
+        """Test a route budget takes precedence over the default one"""
+        res = self.client.get(CATEGORIES_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs statement_timeout')
+class StatementTimeoutTests(CatalogTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def statement_timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            return cursor.fetchone()[0]
+
+    @override_settings(INSTRUMENTATION={
+        'STATEMENT_TIMEOUTS_MS': {'category:category-list': 4000},
+    })
+    def test_route_timeout_applied_and_reset(self):
+        """Test the timeout of a route is only set for its requests"""
+        default = self.statement_timeout()
+
+        self.client.get(CATEGORIES_URL)
+        self.assertEqual(self.statement_timeout(), '4s')
+
+        self.client.get(reverse('category:product-list'))
+        self.assertEqual(self.statement_timeout(), default)
+
+    def test_timeout_logged(self):
+        """Test statements cancelled by the timeout are reported"""
+        metrics = instrumentation.RequestMetrics()
+        metrics.statement_timeout = 1
+        token = instrumentation.current.set(metrics)
+        try:
+            with self.assertRaises(OperationalError), transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(1)')
+        finally:
+            instrumentation.current.reset(token)
+            with connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout TO DEFAULT')
+
+        timeout, = metrics.timeouts
+        self.assertIn('pg_sleep', timeout['sql'])
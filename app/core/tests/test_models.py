@@ -1,14 +1,16 @@
+import hashlib
 from unittest.mock import patch
-from django.test import TestCase
 from django.contrib.auth import get_user_model
 from core import models
+from core.signals import bulk_deleted
+from core.tests.base import CatalogTestCase
 
 def sample_user(email='amin_mohammadi05@yahoo.com', password='1234567aA'):
     """Create a sample user"""
     return get_user_model().objects.create_user(email, password)
 
     
-class ModelTests(TestCase):
+class ModelTests(CatalogTestCase):
     def test_create_user_with_email_successful(self):
         """Test Creating a new User with a email is successful"""
         email = "amin_mohammadi05@yahoo.com"
@@ -48,6 +50,27 @@ class ModelTests(TestCase):
         self.assertTrue(user.is_superuser)
         self.assertTrue(user.is_staff)
 
+    def test_bulk_create_users(self):
+        """Test bulk provisioning hashes passwords and skips taken emails"""
+        get_user_model().objects.create_user('taken@yahoo.com', 'test123')
+
+        with self.settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000}):
+            users = get_user_model().objects.bulk_create_users([
+                ('first@YAHOO.COM', 'pass123', 'First'),
+                ('taken@yahoo.com', 'pass123', 'Taken'),
+                ('second@yahoo.com', 'pass456', ''),
+                ('first@yahoo.com', 'other', 'Duplicate'),
+            ], processes=2)
+
+        self.assertEqual(
+            [user.email for user in users],
+            ['first@yahoo.com', 'second@yahoo.com']
+        )
+        first = get_user_model().objects.get(email='first@yahoo.com')
+        self.assertEqual(first.name, 'First')
+        self.assertTrue(first.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(first.check_password('pass123'))
+
     def test_product_str(self):
         """Test the product string respresentation"""
         user = sample_user()
@@ -69,6 +92,19 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(category), category.name)
 
+    def test_category_persian_title_normalized(self):
+        """Test the normalized persian title is kept up to date"""
+        category = models.Category.objects.create(
+            user=sample_user(), name='Books', persian_title=' كتاب‌ها '
+        )
+        self.assertEqual(category.persian_title_normalized, 'کتابها')
+
+        category.persian_title = 'دفتر ي'
+        category.save(update_fields=['persian_title'])
+
+        category.refresh_from_db()
+        self.assertEqual(category.persian_title_normalized, 'دفتر ی')
+
     @patch('uuid.uuid4')
     def test_product_file_name_uuid(self, mock_uuid):
         """Test that image is saved in the correct location"""
@@ -76,5 +112,57 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = models.product_image_file_path(None, 'myimage.jpg')
 
-        exp_path = f'uploads/product/{uuid}.jpg'
+        digest = hashlib.md5(f'{uuid}.jpg'.encode()).hexdigest()
+        exp_path = f'uploads/product/{digest[:2]}/{digest[2:4]}/{uuid}.jpg'
         self.assertEqual(file_path, exp_path)
+
+    def test_delete_subtree_removes_descendants(self):
+        """Test deleting a subtree removes descendants and links only"""
+        user = sample_user()
+        product = models.Product.objects.create(user=user, name='P')
+        root = models.Category.objects.create(user=user, name='R')
+        child = models.Category.objects.create(
+            user=user, name='C', parent_category=root
+        )
+        models.Category.objects.create(
+            user=user, name='G', parent_category=child
+        )
+        other = models.Category.objects.create(user=user, name='O')
+        child.products.add(product)
+        received = []
+
+        def receiver(sender, ids, **kwargs):
+            received.extend(ids)
+        bulk_deleted.connect(receiver, sender=models.Category)
+        try:
+            deleted = models.Category.objects.delete_subtree(
+                root, batch_size=2
+            )
+        finally:
+            bulk_deleted.disconnect(receiver, sender=models.Category)
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(len(received), 3)
+        self.assertEqual(list(models.Category.objects.all()), [other])
+        self.assertTrue(models.Product.objects.filter(pk=product.pk).exists())
+        self.assertFalse(models.Category.products.through.objects.exists())
+
+    def test_delete_user_with_catalog(self):
+        """Test deleting a user removes their categories and products"""
+        user = sample_user()
+        other = sample_user(email='other@yahoo.com')
+        root = models.Category.objects.create(user=user, name='R')
+        models.Category.objects.create(
+            user=user, name='C', parent_category=root
+        )
+        for i in range(5):
+            root.products.add(
+                models.Product.objects.create(user=user, name=f'P{i}')
+            )
+        kept = models.Product.objects.create(user=other, name='Kept')
+
+        get_user_model().objects.delete_with_catalog(user, batch_size=2)
+
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        self.assertFalse(models.Category.objects.exists())
+        self.assertEqual(list(models.Product.objects.all()), [kept])
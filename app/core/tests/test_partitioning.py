@@ -0,0 +1,140 @@
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import partitioning
+from core.admin import estimated_count
+from core.models import Category, CategoryProduct, Product
+
+
+CATEGORIES_URL = reverse('category:category-list')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+class PartitionTablesTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123', shard='default'
+        )
+        self.tea = Product.objects.create(user=self.user, name='Tea')
+        self.category = Category.objects.create(
+            user=self.user, name='Drinks', persian_title='p'
+        )
+        self.category.set_products([self.tea])
+
+    def partition(self, *args):
+        out = StringIO()
+        call_command(
+            'partition_tables', '--partitions', '4', '--batch-size', '1',
+            *args, stdout=out
+        )
+        return out.getvalue()
+
+    def scanned(self, queryset, table):
+        """Return the partitions of table the plan of queryset scans"""
+        with connection.cursor() as cursor:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return set(re.findall(rf' on ({table}_p\d+)', plan))
+
+    def test_tables_partitioned(self):
+        """Test rows are kept and user queries scan a single partition"""
+        milk = Product.objects.create(user=self.user, name='Milk')
+        self.category.products.add(milk)
+
+        out = self.partition()
+
+        self.assertIn('Swapped in', out)
+        for table in partitioning.TABLES:
+            self.assertTrue(partitioning.is_partitioned(connection, table))
+        self.assertEqual(
+            list(self.category.ordered_products()), [self.tea, milk]
+        )
+        self.assertEqual(len(self.scanned(
+            Product.objects.filter(user=self.user), 'core_product'
+        )), 1)
+        products = self.category.ordered_products()
+        self.assertEqual(len(self.scanned(products, 'core_product')), 1)
+        self.assertEqual(
+            len(self.scanned(products, 'core_category_products')), 1
+        )
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.get(CATEGORIES_URL)
+        self.assertEqual(res.data[0]['products'], [self.tea.id, milk.id])
+
+        self.assertIn('partitioned already', self.partition('--drop-old'))
+
+    def test_owner_backfilled(self):
+        """Test links written before the owner column get it filled in"""
+        CategoryProduct.objects.update(user=None)
+
+        self.partition()
+
+        self.assertEqual(
+            CategoryProduct.objects.get().user_id, self.user.id
+        )
+
+    def test_writes_during_copy_kept(self):
+        """Test rows written while the tables are copied reach the copy"""
+        self.partition('--no-swap')
+        coffee = Product.objects.create(user=self.user, name='Coffee')
+        self.category.products.add(coffee)
+        self.tea.name = 'Green tea'
+        self.tea.save()
+
+        self.partition()
+
+        self.assertEqual(
+            list(self.category.ordered_products().values_list(
+                'name', flat=True
+            )),
+            ['Green tea', 'Coffee']
+        )
+
+    def test_rows_deleted_during_copy_dropped(self):
+        """Test rows the copy raced a delete for are not swapped in"""
+        milk = Product.objects.create(user=self.user, name='Milk')
+        self.partition('--no-swap')
+        new = partitioning.shadow('core_product')
+        with connection.cursor() as cursor:
+            # The batch inserts milk after the trigger deleted it.
+            cursor.execute(
+                'CREATE TEMP TABLE stale AS '
+                'SELECT * FROM core_product WHERE id = %s', [milk.id]
+            )
+            milk.delete()
+            cursor.execute(f'INSERT INTO {new} SELECT * FROM stale')
+
+        self.assertIn('Swapped in', self.partition())
+        self.assertEqual(list(Product.objects.all()), [self.tea])
+
+    def test_product_reference_enforced(self):
+        """Test links keep referencing products by id and owner"""
+        self.partition()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CategoryProduct.objects.update(product_id=-1)
+            connection.check_constraints()
+
+    def test_estimated_count_sums_partitions(self):
+        """Test the admin row estimate covers every partition"""
+        self.partition()
+        for i in range(3):
+            Product.objects.create(user=self.user, name=f'P{i}')
+        # Autovacuum analyzes the partitions only, never their parent.
+        with connection.cursor() as cursor:
+            for i in range(4):
+                cursor.execute(f'ANALYZE core_product_p{i}')
+
+        self.assertEqual(estimated_count(Product, 'default'), 4)
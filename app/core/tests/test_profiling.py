@@ -0,0 +1,126 @@
+import io
+import json
+import tempfile
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Category
+from core.tests.base import CatalogTestCase, CatalogTransactionTestCase
+
+
+CATEGORIES_URL = reverse('category:category-list')
+
+
+class ProfilingTestMixin:
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(PROFILING={'ROOT': root.name})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.staff = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123', is_staff=True
+        )
+        self.token = Token.objects.create(user=self.staff)
+        Category.objects.create(
+            user=self.staff, name='Drinks', persian_title='p'
+        )
+
+    def artifact(self, res):
+        """Return the files of the profile linked by a response"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        download = client.get(
+            reverse('profile', args=[res['X-Profile-Id']])
+        )
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        content = b''.join(download.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as f:
+            return {name: f.read(name) for name in f.namelist()}
+
+
+class ProfilingMiddlewareTests(ProfilingTestMixin, CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_profile_saved_with_sql(self):
+        """Test a staff request with the header gets a cProfile artifact"""
+        res = self.client.get(CATEGORIES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(res['X-Profile-Id'], res['X-Profile-Url'])
+        files = self.artifact(res)
+        self.assertIn('profile.prof', files)
+        self.assertIn(b'cumulative', files['profile.txt'])
+        queries = json.loads(files['sql.json'])
+        self.assertTrue(any(
+            'core_category' in query['sql'] for query in queries
+        ))
+        request = json.loads(files['request.json'])
+        self.assertEqual(request['path'], CATEGORIES_URL)
+        self.assertEqual(request['queries'], len(queries))
+
+    def test_sampling_profile_with_memory(self):
+        """Test the sampling profiler and memory tracking"""
+        res = self.client.get(CATEGORIES_URL, HTTP_X_PROFILE='sample, memory')
+
+        files = self.artifact(res)
+        self.assertIn('profile.collapsed', files)
+        self.assertNotIn('profile.prof', files)
+        self.assertIn('memory.txt', files)
+        self.assertEqual(
+            json.loads(files['request.json'])['profiler'], 'sample'
+        )
+
+    def test_header_ignored_for_other_users(self):
+        """Test users who aren't staff can't profile requests"""
+        user = get_user_model().objects.create_user(
+            'other@example.com', 'password123'
+        )
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(CATEGORIES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', res)
+
+        profile_id = self.client.get(
+            CATEGORIES_URL, HTTP_X_PROFILE='cprofile'
+        )['X-Profile-Id']
+        res = client.get(reverse('profile', args=[profile_id]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_not_profiled_without_header(self):
+        """Test requests without the header are not profiled"""
+        res = self.client.get(CATEGORIES_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls')
+class AsyncProfilingTests(ProfilingTestMixin, CatalogTransactionTestCase):
+    async def test_async_view_profiled(self):
+        """Test the worker threads of async views are profiled"""
+        res = await AsyncClient().get(
+            reverse('category:category-list'),
+            authorization=f'Token {self.token.key}', x_profile='cprofile'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Downloading is a sync view, unaffected by the URLconf.
+        files = await sync_to_async(self.artifact)(res)
+        self.assertIn(b'list_categories', files['profile.txt'])
+        self.assertTrue(json.loads(files['sql.json']))
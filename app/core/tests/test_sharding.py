@@ -0,0 +1,285 @@
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import skipUnless
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import sharding
+from core.models import PRODUCT_IMAGE_DIR, Category, CategoryProduct, \
+    ChangeLog, ChunkedUpload, Product, sharded_path
+
+
+PRODUCTS_URL = reverse('category:product-list')
+CATEGORIES_URL = reverse('category:category-list')
+
+multiple_shards = skipUnless(
+    len(settings.SHARDS) > 1,
+    'needs DB_SHARDS, e.g. shard1=/tmp/shard1.sqlite3,'
+    'shard2=/tmp/shard2.sqlite3'
+)
+
+
+class ShardAssignmentTests(TestCase):
+    def test_pick_shard_is_stable(self):
+        """Test users hash to a configured shard, whatever the case"""
+        shard = sharding.pick_shard('Amin@example.com')
+
+        self.assertIn(shard, settings.SHARDS)
+        self.assertEqual(sharding.pick_shard('amin@example.com'), shard)
+
+    def test_new_user_assigned_shard(self):
+        """Test new users are placed on the shard they hash to"""
+        user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123'
+        )
+
+        self.assertEqual(
+            user.shard, sharding.pick_shard('amin_mohammadi05@yahoo.com')
+        )
+
+
+@multiple_shards
+class ShardedCatalogTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123', shard='shard1'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_catalog(self):
+        with sharding.use_shard(self.user.shard):
+            product = Product.objects.create(user=self.user, name='Tea')
+            parent = Category.objects.create(
+                user=self.user, name='Drinks', persian_title='p'
+            )
+            category = Category.objects.create(
+                user=self.user, name='Hot', persian_title='p',
+                parent_category=parent
+            )
+            category.set_products([product])
+        return product, category
+
+    def test_catalog_stored_on_owner_shard(self):
+        """Test API writes land on the shard of the user"""
+        res = self.client.post(PRODUCTS_URL, {
+            'name': 'Tea', 'description': 'Black tea'
+        })
+        self.client.post(CATEGORIES_URL, {
+            'name': 'Drinks', 'persian_title': 'p',
+            'products': [res.data['id']]
+        })
+
+        product = Product.objects.using('shard1').get()
+        self.assertEqual(product.id, res.data['id'])
+        self.assertGreaterEqual(product.id, sharding.ID_RANGE)
+        self.assertTrue(CategoryProduct.objects.using('shard1').exists())
+        self.assertFalse(Product.objects.using('default').exists())
+        self.assertTrue(ChangeLog.objects.using('default').filter(
+            model=ChangeLog.PRODUCT, object_id=product.id
+        ).exists())
+
+        res = self.client.get(CATEGORIES_URL)
+        self.assertEqual(res.data[0]['products'], [product.id])
+
+    def test_attribute_filters_on_shard(self):
+        """Test attribute filters and facets work without containment"""
+        product, category = self.create_catalog()
+        product.attributes = {'color': 'red', 'size': 42}
+        product.save()
+
+        res = self.client.get(PRODUCTS_URL, {'attr.size': '42'})
+        self.assertEqual([row['id'] for row in res.data], [product.id])
+        res = self.client.get(PRODUCTS_URL, {'attr.color': 'blue'})
+        self.assertEqual(res.data, [])
+
+        res = self.client.get(
+            reverse('category:category-facets', args=[category.id])
+        )
+        self.assertEqual(res.data, {'color': {'red': 1}, 'size': {'42': 1}})
+
+    def test_move_to_shard(self):
+        """Test a move copies every row with its id and cleans up"""
+        product, category = self.create_catalog()
+
+        moved = get_user_model().objects.move_to_shard(self.user, 'shard2')
+
+        self.assertEqual(moved, 4)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shard, 'shard2')
+        self.assertEqual(self.user.moving_to, '')
+        with sharding.use_shard('shard2'):
+            moved_category = Category.objects.get(pk=category.pk)
+            self.assertEqual(moved_category.parent_category.name, 'Drinks')
+            self.assertEqual(list(moved_category.products.all()), [product])
+        for model in (Product, Category, CategoryProduct):
+            self.assertFalse(model.objects.using('shard1').exists())
+
+        res = self.client.get(PRODUCTS_URL)
+        self.assertEqual([row['id'] for row in res.data], [product.id])
+
+    def test_writes_refused_while_moving(self):
+        """Test writes get 503 while the catalog is copied, reads work"""
+        self.create_catalog()
+        self.user.moving_to = 'shard2'
+        self.user.save()
+
+        res = self.client.post(PRODUCTS_URL, {
+            'name': 'Milk', 'description': 'Whole milk'
+        })
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        res = self.client.get(PRODUCTS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_rebalance_command(self):
+        """Test users are moved to the shard they hash to"""
+        self.create_catalog()
+        target = sharding.pick_shard(self.user.email)
+        if target == 'shard1':
+            self.user.email = 'other@example.com'
+            self.user.save()
+            target = sharding.pick_shard(self.user.email)
+
+        out = StringIO()
+        call_command('rebalance_shards', '--drain', '0', stdout=out)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shard, target)
+        self.assertIn('Moved 1 users', out.getvalue())
+        self.assertEqual(Product.objects.using(target).count(), 1)
+
+    def test_media_commands_cover_every_shard(self):
+        """Test image maintenance commands reach products on shards"""
+        with tempfile.TemporaryDirectory() as root, \
+                self.settings(MEDIA_ROOT=root):
+            os.makedirs(os.path.join(root, PRODUCT_IMAGE_DIR))
+            Image.new('RGB', (30, 10), 'red').save(
+                os.path.join(root, PRODUCT_IMAGE_DIR, 'a.png'), format='PNG'
+            )
+            with sharding.use_shard(self.user.shard):
+                product = Product.objects.create(
+                    user=self.user, name='Tea',
+                    image=f'{PRODUCT_IMAGE_DIR}a.png'
+                )
+
+            call_command('shard_media', stdout=StringIO())
+            call_command('backfill_image_metadata', '--processes', '1',
+                         stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(
+            product.image.name, sharded_path(PRODUCT_IMAGE_DIR, 'a.png')
+        )
+        self.assertEqual(product.image_width, 30)
+
+    def test_delete_user_deletes_sharded_catalog(self):
+        """Test deleting a user removes their catalog on their shard"""
+        product, category = self.create_catalog()
+        with tempfile.TemporaryDirectory() as root, \
+                self.settings(CHUNKED_UPLOAD_ROOT=root):
+            with sharding.use_shard(self.user.shard):
+                upload = ChunkedUpload.objects.create(
+                    user=self.user, product=product, filename='a.png',
+                    size=3, checksum='0' * 64
+                )
+            with open(upload.path, 'wb') as f:
+                f.write(b'abc')
+
+            with self.captureOnCommitCallbacks(using='shard1', execute=True):
+                self.user.delete()
+
+            self.assertFalse(os.path.exists(upload.path))
+        for model in (Product, Category, CategoryProduct, ChunkedUpload):
+            self.assertFalse(model.objects.using('shard1').exists())
+
+    def test_bulk_delete_category_on_shard(self):
+        """Test bulk_delete finds categories on the shard of their owner"""
+        product, category = self.create_catalog()
+
+        out = StringIO()
+        call_command('bulk_delete', '--category',
+                     str(category.parent_category_id), stdout=out)
+
+        self.assertIn('Deleted 2 categories', out.getvalue())
+        self.assertFalse(Category.objects.using('shard1').exists())
+
+    def test_admin_on_shard(self):
+        """Test the catalog admin lists and edits rows on other shards"""
+        product, category = self.create_catalog()
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'password123'
+        )
+        self.client.force_login(admin)
+
+        res = self.client.get(
+            reverse('admin:core_category_changelist'), {'shard': 'shard1'}
+        )
+        self.assertContains(res, 'Hot')
+        self.assertContains(res, self.user.email)
+
+        url = reverse('admin:core_category_change', args=[category.id])
+        self.assertContains(self.client.get(url), 'Hot')
+        res = self.client.post(url, {
+            'user': self.user.id, 'name': 'Warm', 'persian_title': 'p',
+            'parent_category': category.parent_category_id,
+            'products': [product.id],
+        })
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        category.refresh_from_db()
+        self.assertEqual(category.name, 'Warm')
+
+
+@multiple_shards
+@skipUnless(connection.vendor == 'postgresql', 'needs advisory locks')
+class ShardMoveFenceTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_move_waits_for_writes_in_flight(self):
+        """Test a write that started before a move is moved with the rest"""
+        user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com', 'password123', shard='default'
+        )
+        written = threading.Event()
+
+        def write():
+            try:
+                with transaction.atomic():
+                    sharding.lock_catalog('default', user.pk, shared=True)
+                    Product.objects.using('default').create(
+                        user=user, name='Tea'
+                    )
+                    written.set()
+                    time.sleep(0.3)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        written.wait(5)
+        moved = get_user_model().objects.move_to_shard(user, 'shard1')
+        writer.join()
+
+        self.assertEqual(moved, 1)
+        self.assertEqual(
+            list(Product.objects.using('shard1').values_list(
+                'name', flat=True
+            )),
+            ['Tea']
+        )
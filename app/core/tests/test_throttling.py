@@ -0,0 +1,182 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.tests.base import CatalogTestCase
+from core.throttling import consume
+
+
+TOKEN_URL = reverse('user:token')
+CREATE_USER_URL = reverse('user:create')
+CATEGORIES_URL = reverse('category:category-list')
+PRODUCTS_URL = reverse('category:product-list')
+
+
+def rest_framework(**rates):
+    """Return REST_FRAMEWORK settings with the given throttle rates"""
+    return dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)
+
+
+class ConsumeTests(CatalogTestCase):
+    def setUp(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.cache.clear()
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def take(self, count, now):
+        return [consume(self.cache, 'bucket', 10, 60, now)
+                for _ in range(count)]
+
+    def test_bucket_empties_and_refills(self):
+        """Test the capacity is available at once and refills over time"""
+        results = self.take(11, now=1000)
+
+        self.assertTrue(all(result.allowed for result in results[:10]))
+        self.assertEqual(results[9].remaining, 0)
+        self.assertFalse(results[10].allowed)
+        self.assertAlmostEqual(results[10].reset, 6)
+
+        self.assertFalse(consume(self.cache, 'bucket', 10, 60, 1005).allowed)
+        self.assertTrue(consume(self.cache, 'bucket', 10, 60, 1006).allowed)
+
+    def test_rejected_requests_are_free(self):
+        """Test hammering an empty bucket does not delay the refill"""
+        self.take(10, now=1000)
+        self.take(50, now=1001)
+
+        self.assertTrue(consume(self.cache, 'bucket', 10, 60, 1006).allowed)
+
+    def test_idle_bucket_is_capped(self):
+        """Test tokens do not pile up past the capacity when idle"""
+        self.take(1, now=1000)
+        results = self.take(15, now=1014)
+        for offset in range(1, 5):
+            results += self.take(15, now=1014 + offset * 15)
+
+        self.assertLessEqual(
+            sum(result.allowed for result in results), 10 + 60 / 6 * 1.25
+        )
+
+    def test_sustained_rate(self):
+        """Test a busy client gets the configured rate across restarts"""
+        allowed = sum(
+            result.allowed
+            for second in range(600)
+            for result in self.take(2, now=1000 + second)
+        )
+
+        self.assertAlmostEqual(allowed, 10 + 100, delta=2)
+
+    def test_consume_is_cheap(self):
+        """Test a throttle check takes well under a millisecond"""
+        start = time.perf_counter()
+        for i in range(1000):
+            consume(self.cache, f'bucket{i % 10}', 1000, 60)
+
+        self.assertLess((time.perf_counter() - start) / 1000, 0.0005)
+
+
+class ThrottleApiTests(CatalogTestCase):
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+
+    def tearDown(self):
+        caches[settings.THROTTLE_CACHE].clear()
+
+    def login(self):
+        return self.client.post(TOKEN_URL, {
+            'email': 'amin_mohammadi05@yahoo.com',
+            'password': 'password123'
+        })
+
+    def test_rate_limit_headers(self):
+        """Test responses carry the limit of the most limiting bucket"""
+        with override_settings(REST_FRAMEWORK=rest_framework(
+            anon='100/min', login='5/min'
+        )):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['RateLimit-Limit'], '5')
+        self.assertEqual(res['RateLimit-Remaining'], '4')
+        self.assertEqual(res['RateLimit-Reset'], '12')
+
+    def test_login_throttled(self):
+        """Test the token endpoint is limited per client address"""
+        with override_settings(REST_FRAMEWORK=rest_framework(login='2/min')):
+            self.login()
+            self.login()
+            res = self.login()
+            other = self.client.post(CREATE_USER_URL, {
+                'email': 'test@londonappdev.com',
+                'password': '1234567aA',
+                'name': 'test',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(res['RateLimit-Remaining'], '0')
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+
+    def test_forwarded_for_not_trusted(self):
+        """Test rotating X-Forwarded-For doesn't get a client new buckets"""
+        with override_settings(REST_FRAMEWORK=rest_framework(login='2/min')):
+            responses = [
+                self.client.post(
+                    TOKEN_URL, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, ' * 50
+                )
+                for i in range(3)
+            ]
+
+        self.assertNotEqual(
+            responses[1].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def test_routes_throttled_separately(self):
+        """Test each catalog route has its own bucket per user"""
+        self.client.force_authenticate(self.user)
+        with override_settings(REST_FRAMEWORK=rest_framework(catalog='1/min')):
+            categories = [self.client.get(CATEGORIES_URL) for _ in range(2)]
+            products = self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(categories[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            categories[1].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(products.status_code, status.HTTP_200_OK)
+
+    def test_tokens_throttled_separately(self):
+        """Test each token of a user has its own bucket"""
+        token = Token.objects.create(user=self.user)
+        with override_settings(REST_FRAMEWORK=rest_framework(token='1/min')):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            first = self.client.get(CATEGORIES_URL)
+            throttled = self.client.get(CATEGORIES_URL)
+            token.delete()
+            token = Token.objects.create(user=self.user)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            other = self.client.get(CATEGORIES_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
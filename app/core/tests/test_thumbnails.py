@@ -0,0 +1,157 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.test import TestCase
+from django.urls import reverse
+
+from core import thumbnails
+
+
+def resize_url(width, height, path):
+    """Return the URL of a resized media image"""
+    return reverse('resize-image', args=[width, height, path])
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.media = os.path.join(root.name, 'media')
+        self.cache = os.path.join(root.name, 'thumbnails')
+        settings = self.settings(
+            MEDIA_ROOT=self.media,
+            THUMBNAILS={
+                'ROOT': self.cache,
+                'MAX_BYTES': 10 ** 6,
+                'SIZES': ((100, 100), (50, 50), (10, 10)),
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.name = 'uploads/product/ab/cd/photo.jpg'
+        self.source = os.path.join(self.media, self.name)
+        os.makedirs(os.path.dirname(self.source))
+        Image.new('RGB', (400, 200), 'red').save(self.source, 'JPEG')
+
+    def test_resize_image(self):
+        """Test the variant fits the box and keeps the aspect ratio"""
+        res = self.client.get(resize_url(100, 100, self.name))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        res.close()
+        variant = thumbnails.variant_path(self.name, 100, 100)
+        with Image.open(variant) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_resize_image_cached(self):
+        """Test repeated requests are served from the cache"""
+        with patch('core.thumbnails.render', wraps=thumbnails.render) as r:
+            for _ in range(3):
+                self.client.get(resize_url(50, 50, self.name)).close()
+
+        self.assertEqual(r.call_count, 1)
+
+    def test_resize_image_evicted(self):
+        """Test a variant evicted before it is opened is rendered again"""
+        thumbnails.get_variant(self.source, self.name, 100, 100)
+        touch = thumbnails._touch
+
+        def touch_then_evict(path):
+            hit = touch(path)
+            if mock.call_count == 1:
+                os.remove(path)
+            return hit
+
+        with patch('core.thumbnails._touch',
+                   side_effect=touch_then_evict) as mock:
+            res = self.client.get(resize_url(100, 100, self.name))
+
+        self.assertEqual(res.status_code, 200)
+        res.close()
+        self.assertTrue(os.path.isfile(
+            thumbnails.variant_path(self.name, 100, 100)
+        ))
+
+    def test_resize_image_invalid(self):
+        """Test unlisted sizes and missing files are not found"""
+        res = self.client.get(resize_url(10000, 10, self.name))
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(resize_url(200, 200, self.name))
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(resize_url(10, 10, 'uploads/missing.jpg'))
+        self.assertEqual(res.status_code, 404)
+
+    def test_resize_image_path_normalized(self):
+        """Test ".." segments can't place variants outside the cache"""
+        root = os.path.dirname(self.media)
+        path = os.path.join(
+            '..', '..', os.path.basename(root), 'media', self.name
+        )
+
+        res = self.client.get(resize_url(100, 100, path))
+
+        self.assertEqual(res.status_code, 200)
+        res.close()
+        with Image.open(self.source) as image:
+            self.assertEqual(image.size, (400, 200))
+        variant = thumbnails.variant_path(self.name, 100, 100)
+        with Image.open(variant) as image:
+            self.assertEqual(image.size, (100, 50))
+        self.assertEqual(sorted(os.listdir(root)), ['media', 'thumbnails'])
+
+    def test_resize_unwritable_format(self):
+        """Test images Pillow can't write are not found, not an error"""
+        with patch.object(Image.Image, 'save', side_effect=KeyError('MPO')):
+            res = self.client.get(resize_url(100, 100, self.name))
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_concurrent_requests_render_once(self):
+        """Test only one of several concurrent misses renders the variant"""
+        def slow_render(*args):
+            time.sleep(0.2)
+            render(*args)
+
+        render = thumbnails.render
+        with patch('core.thumbnails.render', side_effect=slow_render) as r:
+            workers = [
+                threading.Thread(target=thumbnails.get_variant,
+                                 args=(self.source, self.name, 30, 30))
+                for _ in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(r.call_count, 1)
+
+    def test_evict_least_recently_used(self):
+        """Test eviction removes the oldest variants first"""
+        paths = [
+            thumbnails.get_variant(self.source, self.name, size, size)
+            for size in (100, 200, 300)
+        ]
+        for age, path in zip((300, 200, 100), paths):
+            then = time.time() - age
+            os.utime(path, (then, then))
+        sizes = [os.path.getsize(path) for path in paths]
+
+        with self.settings(THUMBNAILS={
+            'ROOT': self.cache, 'MAX_BYTES': sum(sizes) - 1,
+            'LOW_WATER': 1.0
+        }):
+            self.assertEqual(thumbnails.evict(), 1)
+
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.exists(paths[1]))
+        self.assertTrue(os.path.exists(paths[2]))
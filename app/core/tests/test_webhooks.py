@@ -0,0 +1,226 @@
+import hashlib
+import hmac
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from category.views import CategoryViewSet
+from core.models import Category, ChangeLog, Product, WebhookEndpoint
+from core.tests.base import CatalogTestCase
+
+
+PRODUCTS_URL = reverse('category:product-list')
+CATEGORIES_URL = reverse('category:category-list')
+
+
+class StubServer(ThreadingHTTPServer):
+    """HTTP server recording the requests it gets"""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        super().__init__(('127.0.0.1', 0), StubHandler)
+
+    @property
+    def url(self):
+        return 'http://%s:%s/hook' % self.server_address
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.headers, body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class DeliverWebhooksTests(CatalogTestCase):
+    def setUp(self):
+        self.server = StubServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.endpoint = WebhookEndpoint.objects.create(url=self.server.url)
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def deliver(self):
+        out, err = StringIO(), StringIO()
+        call_command('deliver_webhooks', '--once', stdout=out, stderr=err)
+        self.endpoint.refresh_from_db()
+        return err.getvalue()
+
+    def events(self, request):
+        return json.loads(request[1])['events']
+
+    def test_changes_coalesced_and_signed(self):
+        """Test one signed event is posted per changed object"""
+        product = Product.objects.create(user=self.user, name='Tea')
+        product.name = 'Green tea'
+        product.save()
+        product.save()
+        category = Category.objects.create(
+            user=self.user, name='Drinks', persian_title='p'
+        )
+
+        self.deliver()
+
+        self.assertEqual(len(self.server.requests), 1)
+        headers, body = self.server.requests[0]
+        signature = hmac.new(
+            self.endpoint.secret.encode(), body, hashlib.sha256
+        ).hexdigest()
+        self.assertEqual(headers['X-Webhook-Signature'], f'sha256={signature}')
+        events = self.events(self.server.requests[0])
+        self.assertEqual(
+            [(event['model'], event['id'], event['action'])
+             for event in events],
+            [('product', product.id, 'update'),
+             ('category', category.id, 'create')]
+        )
+        self.assertEqual(
+            self.endpoint.cursor, ChangeLog.objects.latest('id').position
+        )
+        self.assertIsNone(self.endpoint.leased_until)
+
+        self.deliver()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_new_endpoint_skips_history(self):
+        """Test endpoints only get changes made after they were added"""
+        Product.objects.create(user=self.user, name='Tea')
+        WebhookEndpoint.objects.all().delete()
+        self.endpoint = WebhookEndpoint.objects.create(url=self.server.url)
+
+        self.deliver()
+
+        self.assertEqual(self.server.requests, [])
+
+    def test_failed_delivery_retried_with_backoff(self):
+        """Test a failing endpoint keeps its cursor and is retried later"""
+        product = Product.objects.create(user=self.user, name='Tea')
+        cursor = self.endpoint.cursor
+        self.server.statuses = [500]
+
+        err = self.deliver()
+
+        self.assertIn('failed', err)
+        self.assertEqual(self.endpoint.cursor, cursor)
+        self.assertEqual(self.endpoint.failures, 1)
+        self.assertGreater(self.endpoint.next_attempt_at, timezone.now() -
+                           timedelta(seconds=1))
+        self.assertIn('500', self.endpoint.last_error)
+
+        self.endpoint.next_attempt_at = timezone.now()
+        self.endpoint.save()
+        self.deliver()
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(
+            self.server.requests[0][1], self.server.requests[1][1]
+        )
+        self.assertEqual(self.events(self.server.requests[1])[0]['id'],
+                         product.id)
+        self.assertEqual(self.endpoint.failures, 0)
+        self.assertIsNone(self.endpoint.next_attempt_at)
+
+    def test_endpoint_not_retried_before_backoff(self):
+        """Test an endpoint waiting for its next attempt is skipped"""
+        Product.objects.create(user=self.user, name='Tea')
+        self.endpoint.next_attempt_at = timezone.now() + timedelta(hours=1)
+        self.endpoint.save()
+
+        self.deliver()
+
+        self.assertEqual(self.server.requests, [])
+
+    @override_settings(WEBHOOKS={'BATCH_SIZE': 2})
+    def test_delivered_in_batches(self):
+        """Test a backlog is posted in batches of BATCH_SIZE changes"""
+        for name in ('Tea', 'Milk', 'Coffee'):
+            Product.objects.create(user=self.user, name=name)
+
+        self.deliver()
+        self.deliver()
+
+        self.assertEqual(
+            [len(self.events(request)) for request in self.server.requests],
+            [2, 1]
+        )
+
+    def test_leased_endpoint_skipped(self):
+        """Test an endpoint another worker delivers to is skipped"""
+        Product.objects.create(user=self.user, name='Tea')
+        self.endpoint.leased_until = timezone.now() + timedelta(minutes=1)
+        self.endpoint.save()
+
+        self.deliver()
+        self.assertEqual(self.server.requests, [])
+
+        # Leases of workers that died run out.
+        self.endpoint.leased_until = timezone.now()
+        self.endpoint.save()
+        self.deliver()
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIsNone(self.endpoint.leased_until)
+
+
+class OutboxTests(CatalogTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            'password123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_change_log_written_with_the_change(self):
+        """Test a write is rolled back if its change log row fails"""
+        with patch('core.receivers._log', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(PRODUCTS_URL, {
+                    'name': 'Tea', 'description': 'Black tea'
+                })
+
+        self.assertFalse(Product.objects.exists())
+
+    def test_error_response_rolls_back(self):
+        """Test writes of a request answered with an error are undone"""
+        def create_then_fail(view, serializer):
+            serializer.save(user=view.request.user)
+            raise ValidationError('Failed after writing')
+
+        with patch.object(
+            CategoryViewSet, 'perform_create', create_then_fail
+        ):
+            res = self.client.post(CATEGORIES_URL, {
+                'name': 'Drinks', 'persian_title': 'p'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Category.objects.exists())
+        self.assertFalse(ChangeLog.objects.exists())
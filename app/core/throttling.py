@@ -0,0 +1,155 @@
+import hashlib
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+from core.middleware import route_name
+
+
+Result = namedtuple('Result', 'allowed limit remaining reset')
+
+
+def consume(cache, key, capacity, duration, now=None):
+    """Take a token from a bucket shared through the cache
+
+    The bucket is stored as the time it was last full and a counter of the
+    tokens taken since, so a request costs a get() and an atomic incr().
+    Buckets are restarted every quarter of their fill time, carrying the
+    tokens left over and capped at capacity, which bounds bursts after an
+    idle period to 1.25 times the capacity.
+    """
+    now = time.time() if now is None else now
+    rate = capacity / duration
+    lifetime = max(duration / 4, 1)
+    timeout = math.ceil(duration + 2 * lifetime)
+
+    origin = cache.get(key)
+    if origin is None:
+        origin = now
+        cache.set(f'{key}:{origin}', 0, timeout)
+        if not cache.add(key, origin, timeout):
+            origin = cache.get(key, origin)
+    elif now - origin >= lifetime and cache.add(
+        f'{key}:{origin}:restart', 1, timeout
+    ):
+        # Only one worker restarts the bucket, the others keep taking
+        # tokens from the previous one until it is replaced.
+        taken = cache.get(f'{key}:{origin}', 0)
+        left = min(capacity, capacity + rate * (now - origin) - taken)
+        origin = now
+        cache.set(f'{key}:{origin}', capacity - left, timeout)
+        cache.set(key, origin, timeout)
+
+    counter = f'{key}:{origin}'
+    try:
+        taken = cache.incr(counter)
+    except ValueError:
+        cache.add(counter, 0, timeout)
+        taken = cache.incr(counter)
+
+    left = capacity + rate * (now - origin) - taken
+    if left < 0:
+        # Rejected requests do not use up tokens.
+        cache.decr(counter)
+        return Result(False, capacity, 0, -left / rate)
+    left = min(left, capacity)
+    return Result(True, capacity, int(left), (capacity - left) / rate)
+
+
+class BucketThrottle(throttling.BaseThrottle):
+    """Token bucket throttle keyed by get_cache_key()
+
+    Rates use the DRF format, '60/min' holds 60 tokens refilled over a
+    minute, and are looked up by scope in DEFAULT_THROTTLE_RATES.
+    """
+    scope = None
+
+    def get_cache_key(self, request, view):
+        """Return the bucket of a request, or None to not throttle it"""
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(
+            self.get_scope(request, view)
+        )
+        key = self.get_cache_key(request, view)
+        if rate is None or key is None:
+            return True
+
+        capacity, duration = throttling.SimpleRateThrottle.parse_rate(
+            None, rate
+        )
+        self.result = consume(
+            caches[settings.THROTTLE_CACHE],
+            f'throttle:{key}',
+            capacity,
+            duration
+        )
+        # Kept on the Django request for the rate limit headers.
+        request = getattr(request, '_request', request)
+        if not hasattr(request, 'rate_limits'):
+            request.rate_limits = []
+        request.rate_limits.append(self.result)
+        return self.result.allowed
+
+    def wait(self):
+        return self.result.reset
+
+    def get_user_key(self, request):
+        """Return the user of a request, or its client address"""
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        # Behind proxies the address comes from X-Forwarded-For, which is
+        # client supplied and of any length, so store a digest.
+        return 'ip:' + hashlib.blake2b(
+            self.get_ident(request).encode(), digest_size=12
+        ).hexdigest()
+
+
+class UserThrottle(BucketThrottle):
+    """Limit the requests of each user, or of each anonymous address"""
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+    def get_cache_key(self, request, view):
+        return self.get_user_key(request)
+
+
+class TokenThrottle(BucketThrottle):
+    """Limit the requests made with each auth token"""
+    scope = 'token'
+
+    def get_cache_key(self, request, view):
+        token = getattr(request, 'auth', None)
+        key = getattr(token, 'key', None)
+        if key is None:
+            return None
+        # Cache keys are not secret, so store a digest of the token.
+        return 'token:' + hashlib.blake2b(
+            key.encode(), digest_size=12
+        ).hexdigest()
+
+
+class RouteThrottle(BucketThrottle):
+    """Limit the requests of each user to each route of a throttle_scope"""
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+    def get_cache_key(self, request, view):
+        if self.get_scope(request, view) is None:
+            return None
+        route = route_name(getattr(request, '_request', request))
+        return f'route:{route}:{self.get_user_key(request)}'
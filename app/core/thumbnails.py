@@ -0,0 +1,179 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils._os import safe_join
+from PIL import Image
+
+from core import metrics
+
+
+DEFAULTS = {
+    'ROOT': '/vol/web/thumbnails',
+    'MAX_BYTES': 1024 * 1024 * 1024,
+    # The (width, height) boxes served, others are not found.
+    'SIZES': ((100, 100), (200, 200), (400, 400), (800, 800)),
+    # Evict down to this fraction of MAX_BYTES so eviction runs rarely.
+    'LOW_WATER': 0.9,
+}
+LOCK_SUFFIX = '.lock'
+
+# Bytes this process rendered since it last checked the cache size.
+_written = 0
+
+
+def get_setting(name):
+    """Return a thumbnail setting, falling back to its default"""
+    return getattr(settings, 'THUMBNAILS', {}).get(name, DEFAULTS[name])
+
+
+@contextmanager
+def locked(path, blocking=True):
+    """Hold an exclusive lock shared by all threads and worker processes
+
+    Yields False if blocking is off and somebody else holds the lock.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def is_served(width, height):
+    """Return whether variants fitting in width x height are served"""
+    return (width, height) in map(tuple, get_setting('SIZES'))
+
+
+def variant_path(source, width, height):
+    """Return where the width x height variant of a media file is cached
+
+    source is relative to MEDIA_ROOT, paths escaping the cache raise
+    SuspiciousFileOperation.
+    """
+    return safe_join(get_setting('ROOT'), f'{width}x{height}', source)
+
+
+def get_variant(source_path, source, width, height):
+    """Return the path of a cached variant, rendering it on a miss
+
+    Concurrent requests for the same missing variant wait for the one
+    rendering it instead of rendering it again.
+    """
+    path = variant_path(source, width, height)
+    if _touch(path):
+        metrics.observe_cache_lookup('thumbnails', True)
+        return path
+
+    with locked(path + LOCK_SUFFIX):
+        # Somebody else may have rendered it while we were waiting.
+        hit = _touch(path)
+        if not hit:
+            size = render(source_path, path, width, height)
+    metrics.observe_cache_lookup('thumbnails', hit)
+    if not hit:
+        _account(size)
+    return path
+
+
+def open_variant(source_path, source, width, height):
+    """Open a cached variant for reading, rendering it on a miss"""
+    while True:
+        path = get_variant(source_path, source, width, height)
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            # Evicted since it was looked up, a miss after all.
+            continue
+
+
+def render(source_path, path, width, height):
+    """Write a copy of the image fitting in width x height to path
+
+    Returns the size of the copy.
+    """
+    with Image.open(source_path) as image:
+        image_format = image.format
+        image.thumbnail((width, height))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # Render next to the target and rename, so readers never see a
+        # partially written file.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                try:
+                    image.save(f, format=image_format)
+                except KeyError:
+                    # Formats Pillow reads but can't write, e.g. MPO.
+                    raise OSError(f'Cannot write {image_format} images')
+                size = f.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return size
+
+
+def evict():
+    """Delete least recently used variants until under the low water mark"""
+    root = get_setting('ROOT')
+    entries = []
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(LOCK_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total <= get_setting('MAX_BYTES'):
+        return 0
+    target = get_setting('MAX_BYTES') * get_setting('LOW_WATER')
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= target:
+            break
+        for stale in (path, path + LOCK_SUFFIX):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _touch(path):
+    """Mark a cached variant as recently used, False if it is not cached"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _account(size):
+    """Evict once this process has written a slice of the cache budget"""
+    global _written
+    _written += size
+    if _written < get_setting('MAX_BYTES') * (1 - get_setting('LOW_WATER')):
+        return
+    _written = 0
+    lock = os.path.join(get_setting('ROOT'), 'evict' + LOCK_SUFFIX)
+    with locked(lock, blocking=False) as acquired:
+        if acquired:
+            evict()
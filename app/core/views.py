@@ -0,0 +1,112 @@
+import mimetypes
+import os
+import stat
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, \
+                        HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from PIL import Image
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework import permissions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import batch, metrics as prometheus, profiling, thumbnails
+from core.serializers import BatchSerializer
+
+
+def metrics(request):
+    """Expose request, database and cache metrics to Prometheus"""
+    return HttpResponse(prometheus.render(), content_type=CONTENT_TYPE_LATEST)
+
+
+async def serve_media(request, path):
+    """Serve an uploaded file, doing the disk I/O off the event loop"""
+    fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    try:
+        info = await sync_to_async(fullpath.stat, thread_sensitive=False)()
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('"%s" does not exist' % path)
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404('"%s" does not exist' % path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              info.st_mtime, info.st_size):
+        return HttpResponseNotModified()
+
+    content_type, encoding = mimetypes.guess_type(str(fullpath))
+    handle = await sync_to_async(fullpath.open, thread_sensitive=False)('rb')
+    response = FileResponse(
+        handle, content_type=content_type or 'application/octet-stream'
+    )
+    response['Last-Modified'] = http_date(info.st_mtime)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+@require_safe
+def resize_image(request, width, height, path):
+    """Serve a media image resized to fit in width x height"""
+    if not thumbnails.is_served(width, height):
+        raise Http404(f'{width}x{height} is not a served size')
+    source = safe_join(settings.MEDIA_ROOT, path)
+    if not os.path.isfile(source):
+        raise Http404('"%s" does not exist' % path)
+
+    # The normalized name, path may hold ".." segments.
+    name = os.path.relpath(source, os.path.abspath(settings.MEDIA_ROOT))
+    try:
+        variant = thumbnails.open_variant(source, name, width, height)
+    except (OSError, Image.DecompressionBombError):
+        raise Http404('"%s" is not an image' % path)
+    content_type, encoding = mimetypes.guess_type(variant.name)
+    response = FileResponse(
+        variant, content_type=content_type or 'application/octet-stream'
+    )
+    # Uploads get unique names, so a variant never changes.
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60)
+    return response
+
+
+class BatchView(APIView):
+    """Run several API requests with a single round trip
+
+    The user is authenticated once for the whole batch. Results are
+    returned in the order of the requests, whatever their status.
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(batch.run(
+            request,
+            serializer.validated_data['requests'],
+            serializer.validated_data['concurrent']
+        ))
+
+
+class ProfileView(APIView):
+    """Download a request profile saved by the ProfilingMiddleware"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, profile_id):
+        path = profiling.artifact_path(profile_id)
+        if not os.path.isfile(path):
+            raise Http404('No such profile')
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True,
+            filename=f'profile-{profile_id}.zip',
+            content_type='application/zip'
+        )
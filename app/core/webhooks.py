@@ -0,0 +1,150 @@
+import hashlib
+import hmac
+import json
+import random
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import ChangeLog, WebhookEndpoint
+
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'TIMEOUT': 10,
+    'INITIAL_BACKOFF': 10,
+    'MAX_BACKOFF': 3600,
+    # How long a worker owns an endpoint it is delivering to, longer than
+    # a delivery can take.
+    'LEASE_SECONDS': 60,
+}
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+
+class DeliveryError(Exception):
+    """An endpoint did not accept a batch of changes"""
+
+
+def get_setting(name):
+    """Return a webhook setting, falling back to its default"""
+    return getattr(settings, 'WEBHOOKS', {}).get(name, DEFAULTS[name])
+
+
+def coalesce(changes):
+    """Return one event per object, for its latest change"""
+    latest = {}
+    for change in changes:
+        key = (change.model, change.object_id)
+        latest.pop(key, None)
+        latest[key] = change
+    return [
+        {
+            'cursor': change.position,
+            'model': change.model,
+            'id': change.object_id,
+            'user': change.user_id,
+            'action': change.action,
+            'changed_at': change.created_at.isoformat(),
+        }
+        for change in latest.values()
+    ]
+
+
+def sign(secret, body):
+    """Return the signature header value of a request body"""
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+def pending_changes(endpoint):
+    """Return the next batch of changes after the endpoint cursor
+
+    Only sequenced changes are sent, see ChangeLogManager.sequence().
+    """
+    return list(ChangeLog.objects.filter(
+        position__gt=endpoint.cursor
+    ).order_by('position')[:get_setting('BATCH_SIZE')])
+
+
+def claim(pk, now=None):
+    """Lease an endpoint for a delivery, None if another worker holds it
+
+    The lease is committed right away, so no transaction stays open while
+    the changes are posted.
+    """
+    now = timezone.now() if now is None else now
+    claimed = WebhookEndpoint.objects.filter(pk=pk).filter(
+        Q(leased_until__isnull=True) | Q(leased_until__lte=now)
+    ).update(
+        leased_until=now + timedelta(seconds=get_setting('LEASE_SECONDS'))
+    )
+    return WebhookEndpoint.objects.get(pk=pk) if claimed else None
+
+
+def deliver(endpoint):
+    """Post the next batch of changes and advance the endpoint cursor
+
+    Returns the number of changes delivered, or raises DeliveryError
+    leaving the endpoint unchanged. Releases the lease of the endpoint.
+    """
+    changes = pending_changes(endpoint)
+    if not changes:
+        release(endpoint)
+        return 0
+    cursor = changes[-1].position
+    body = json.dumps({
+        'cursor': cursor,
+        'events': coalesce(changes),
+    }).encode()
+    request = urllib.request.Request(endpoint.url, data=body, headers={
+        'Content-Type': 'application/json',
+        # Lets receivers drop a batch they got before a lost response.
+        'Idempotency-Key': f'{endpoint.pk}-{cursor}',
+        SIGNATURE_HEADER: sign(endpoint.secret, body),
+    })
+    try:
+        with urllib.request.urlopen(
+            request, timeout=get_setting('TIMEOUT')
+        ) as response:
+            response.read()
+    except (urllib.error.URLError, OSError) as exc:
+        raise DeliveryError(str(exc)) from exc
+
+    # Should the lease have run out, the batch was posted twice and the
+    # cursor only moves once.
+    WebhookEndpoint.objects.filter(
+        pk=endpoint.pk, cursor=endpoint.cursor
+    ).update(
+        cursor=cursor, failures=0, next_attempt_at=None, last_error='',
+        leased_until=None
+    )
+    endpoint.cursor = cursor
+    return len(changes)
+
+
+def release(endpoint):
+    """Give up the lease of an endpoint"""
+    endpoint.leased_until = None
+    endpoint.save(update_fields=['leased_until'])
+
+
+def retry_later(endpoint, error, now=None):
+    """Schedule the next attempt of a failing endpoint, returning the delay"""
+    now = timezone.now() if now is None else now
+    endpoint.failures += 1
+    # Full jitter spreads the retries of endpoints that failed together.
+    delay = random.uniform(0, min(
+        get_setting('MAX_BACKOFF'),
+        get_setting('INITIAL_BACKOFF') * 2 ** endpoint.failures
+    ))
+    endpoint.next_attempt_at = now + timedelta(seconds=delay)
+    endpoint.last_error = str(error)
+    endpoint.leased_until = None
+    endpoint.save(update_fields=[
+        'failures', 'next_attempt_at', 'last_error', 'leased_until'
+    ])
+    return delay
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from user import async_views, urls
+
+
+# Same namespace and names as user.urls, see category.async_urls.
+app_name = 'user'
+
+urlpatterns = [
+    path('token/', async_views.create_token, name='token'),
+] + urls.urlpatterns
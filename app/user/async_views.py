@@ -0,0 +1,48 @@
+from django.http import JsonResponse
+
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core.aio import database_sync_to_async, error_response, throttle
+from user.serializers import AuthTokenSerializer
+from user.views import CreateTokenView
+
+
+@database_sync_to_async
+def obtain_token(request):
+    """Check the credentials and return the response status and data"""
+    request = Request(request, parsers=[
+        parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+    ])
+    serializer = AuthTokenSerializer(
+        data=request.data, context={'request': request}
+    )
+    if not serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
+    token, created = Token.objects.get_or_create(
+        user=serializer.validated_data['user']
+    )
+    return status.HTTP_200_OK, {'token': token.key}
+
+
+async def create_token(request):
+    """Create a new auth token for user
+
+    Password hashing releases the GIL, so verifying on the shared worker
+    threads lets concurrent logins use several cores without blocking the
+    event loop.
+    """
+    if request.method != 'POST':
+        return error_response(exceptions.MethodNotAllowed(request.method))
+    try:
+        await throttle(request, CreateTokenView)
+        code, data = await obtain_token(request)
+    except exceptions.APIException as exc:
+        return error_response(exc)
+    return JsonResponse(data, status=code)
+
+
+create_token.csrf_exempt = True
+create_token.sync_view = CreateTokenView.as_view()
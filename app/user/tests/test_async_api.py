@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+
+TOKEN_URL = reverse('user:token', urlconf='app.asgi_urls')
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls')
+class AsyncTokenApiTests(TransactionTestCase):
+    """Test the async token endpoint served over ASGI"""
+
+    def setUp(self):
+        self.client = AsyncClient()
+        self.user = get_user_model().objects.create_user(
+            'amin_mohammadi05@yahoo.com',
+            '1234567aA'
+        )
+
+    async def test_create_token(self):
+        """Test a token is returned for valid credentials"""
+        res = await self.client.post(TOKEN_URL, {
+            'email': 'amin_mohammadi05@yahoo.com',
+            'password': '1234567aA'
+        }, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        token = await sync_to_async(Token.objects.get)(user=self.user)
+        self.assertEqual(res.json(), {'token': token.key})
+
+    async def test_create_token_invalid_credentials(self):
+        """Test that token is not created if invalid credentials are given"""
+        res = await self.client.post(TOKEN_URL, {
+            'email': 'amin_mohammadi05@yahoo.com',
+            'password': 'wrong'
+        }, content_type='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', res.json())
+
+    async def test_get_not_allowed(self):
+        """Test the token endpoint only accepts POST"""
+        res = await self.client.get(TOKEN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_create_token_throttled(self):
+        """Test the async token endpoint shares the login throttle"""
+        rest_framework = dict(
+            settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'login': '1/min'}
+        )
+        cache = caches[settings.THROTTLE_CACHE]
+        cache.clear()
+        try:
+            with override_settings(REST_FRAMEWORK=rest_framework):
+                await self.client.post(
+                    TOKEN_URL, {}, content_type='application/json'
+                )
+                res = await self.client.post(
+                    TOKEN_URL, {}, content_type='application/json'
+                )
+        finally:
+            cache.clear()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '60')
+        self.assertEqual(res['RateLimit-Remaining'], '0')
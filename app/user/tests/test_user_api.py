@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -113,4 +113,44 @@ class PrivateUserApiTests(TestCase):
         
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+ARGON2_FIRST = [
+    'core.hashers.Argon2PasswordHasher',
+    'core.hashers.PBKDF2PasswordHasher',
+]
+CHEAP_ARGON2 = {'ARGON2_TIME_COST': 1, 'ARGON2_MEMORY_COST': 64,
+                'ARGON2_PARALLELISM': 1}
+
+
+class PasswordRehashTests(TestCase):
+    """Test password hashes are upgraded on login"""
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {
+            'email': 'amin_mohammadi05@yahoo.com',
+            'password': '1234567aA'
+        }
+        with self.settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000}):
+            self.user = create_user(**self.payload)
+
+    def test_rehash_with_new_work_factor(self):
+        """Test a changed iteration count is applied on login"""
+        with self.settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 2000}):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASHERS=ARGON2_FIRST,
+                       PASSWORD_HASHING=CHEAP_ARGON2)
+    def test_rehash_with_new_hasher(self):
+        """Test switching the preferred hasher upgrades old hashes"""
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+        self.assertIn('m=64,t=1,p=1', self.user.password)